@@ -0,0 +1,232 @@
+# backend/alerts.py
+"""Streaming alert engine.
+
+Keeps a small, bounded window of recent samples per patient in memory and
+evaluates each new reading against it in O(1): static ranges (backend.rules),
+rate of change, predicted hypoglycaemia, sustained excursions, plus heart
+rate and blood pressure thresholds. Nothing here touches the database; the
+caller persists the returned alert rows.
+
+State is per process and starts empty, so trend rules need a few samples
+after a restart before they can fire. With several workers, backend.bus
+relays every evaluated sample to the others, which replay it through
+observe() so their windows and cooldowns stay in step.
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from backend import rules
+from backend.metrics import rule_timer
+from backend.timeutil import to_utc
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Samples kept per patient (a CGM at 5 min intervals -> one hour).
+WINDOW_SIZE = int(_env_float("CAREPLUS_ALERT_WINDOW", 12))
+# Upper bound on patients tracked; least recently seen are evicted.
+MAX_PATIENTS = int(_env_float("CAREPLUS_ALERT_MAX_PATIENTS", 100000))
+
+ROC_SPAN = timedelta(minutes=_env_float("CAREPLUS_ALERT_ROC_SPAN_MIN", 15))
+ROC_LIMIT = _env_float("CAREPLUS_ALERT_ROC_LIMIT", 3.0)  # mg/dL/min
+# Shortest span a rate of change is measured over; closer samples are noise.
+ROC_MIN_SPAN = timedelta(minutes=_env_float("CAREPLUS_ALERT_ROC_MIN_SPAN_MIN", 5))
+HYPO_LEVEL = _env_float("CAREPLUS_ALERT_HYPO_LEVEL", 70.0)  # mg/dL
+HYPO_HORIZON_MIN = _env_float("CAREPLUS_ALERT_HYPO_HORIZON_MIN", 30)
+SUSTAINED = timedelta(minutes=_env_float("CAREPLUS_ALERT_SUSTAINED_MIN", 120))
+COOLDOWN = timedelta(minutes=_env_float("CAREPLUS_ALERT_COOLDOWN_MIN", 30))
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+
+class PatientState:
+    __slots__ = ("glucose", "excursion_start", "excursion_alerted", "last_fired")
+
+    def __init__(self, size: int):
+        self.glucose: Deque[Tuple[datetime, float]] = deque(maxlen=size)
+        self.excursion_start: Optional[datetime] = None
+        self.excursion_alerted = False
+        # (alert type, direction) -> (time it last fired, severity)
+        self.last_fired: Dict[Tuple[str, Optional[str]], Tuple[datetime, str]] = {}
+
+
+class AlertEngine:
+    def __init__(self, window_size: int = WINDOW_SIZE, max_patients: int = MAX_PATIENTS):
+        self.window_size = window_size
+        self.max_patients = max_patients
+        self._states: "OrderedDict[int, PatientState]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Set by backend.bus: called with (kind, samples) after evaluation.
+        self.relay: Optional[Callable[[str, list], None]] = None
+
+    # ---------------- STATE -------------------
+    def _state(self, patient_id: int) -> PatientState:
+        st = self._states.get(patient_id)
+        if st is None:
+            st = self._states[patient_id] = PatientState(self.window_size)
+            if len(self._states) > self.max_patients:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(patient_id)
+        return st
+
+    def forget(self, patient_id: int) -> None:
+        with self._lock:
+            self._states.pop(patient_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+    def _fire(self, st: PatientState, out: List[dict], patient_id: int, ts: datetime,
+              type_: str, severity: str, message: str, direction: Optional[str] = None) -> None:
+        """Append an alert unless the same (type, direction) fired within
+        COOLDOWN at the same or a higher severity."""
+        key = (type_, direction)
+        last = st.last_fired.get(key)
+        if (last is not None and timedelta(0) <= ts - last[0] < COOLDOWN
+                and SEVERITY_RANK[severity] <= SEVERITY_RANK[last[1]]):
+            return
+        # A back-filled sample can still fire, but never winds the cooldown back.
+        if last is None or ts >= last[0]:
+            st.last_fired[key] = (ts, severity)
+        out.append({
+            "patient_id": patient_id,
+            "timestamp": ts,
+            "severity": severity,
+            "type": type_,
+            "message": message,
+        })
+
+    # ---------------- GLUCOSE -------------------
+    def reading(self, patient_id: int, target: Optional[dict], context: Optional[str],
+                value: float, ts: datetime) -> List[dict]:
+        ts = to_utc(ts)
+        with rule_timer("glucose"), self._lock:
+            out = self._reading(patient_id, target, context, value, ts)
+        if self.relay is not None:
+            self.relay("reading", [[patient_id, target, context, value, ts]])
+        return out
+
+    def readings(self, targets: Dict[int, Optional[dict]], rows: Iterable[dict]) -> List[dict]:
+        """Evaluate a batch of reading rows, oldest first per patient."""
+        out: List[dict] = []
+        with rule_timer("glucose_batch"), self._lock:
+            samples = sorted((
+                [r["patient_id"], targets.get(r["patient_id"]), r.get("context"), r["value_mgdl"], to_utc(r["timestamp"])]
+                for r in rows
+            ), key=lambda s: (s[0], s[4]))
+            for sample in samples:
+                out.extend(self._reading(*sample))
+        if self.relay is not None and samples:
+            self.relay("reading", samples)
+        return out
+
+    def _reading(self, patient_id, target, context, value, ts) -> List[dict]:
+        st = self._state(patient_id)
+        out: List[dict] = []
+        low, high = rules.target_range(target, context)
+
+        hit = rules.classify_glucose(value, low, high)
+        if hit:
+            self._fire(st, out, patient_id, ts, "reading_range", *hit)
+
+        # Late (back-filled) samples are range-checked only.
+        if st.glucose and ts <= st.glucose[-1][0]:
+            return out
+
+        # Sustained excursion: one alert per continuous out-of-range run.
+        if hit:
+            if st.excursion_start is None:
+                st.excursion_start, st.excursion_alerted = ts, False
+            elif not st.excursion_alerted and ts - st.excursion_start >= SUSTAINED:
+                st.excursion_alerted = True
+                minutes = int((ts - st.excursion_start).total_seconds() // 60)
+                side = "below" if value < low else "above"
+                self._fire(st, out, patient_id, ts, "sustained_excursion", "high",
+                           f"Glucose {side} target for {minutes} min", hit[2])
+        else:
+            st.excursion_start, st.excursion_alerted = None, False
+
+        # Rate of change against the oldest sample inside ROC_SPAN. The window
+        # is bounded, so this scan is constant time. Under ROC_MIN_SPAN the
+        # slope is mostly sensor noise, so neither trend rule runs.
+        base = None
+        for sample in st.glucose:
+            if ts - sample[0] <= ROC_SPAN:
+                base = sample
+                break
+        st.glucose.append((ts, value))
+        if base is None:
+            return out
+
+        if ts - base[0] < ROC_MIN_SPAN:
+            return out
+        minutes = (ts - base[0]).total_seconds() / 60.0
+        roc = (value - base[1]) / minutes
+
+        if abs(roc) >= ROC_LIMIT:
+            direction = "rising" if roc > 0 else "falling"
+            self._fire(st, out, patient_id, ts, "glucose_rate", "medium",
+                       f"Glucose {direction} fast ({roc:+.1f} mg/dL/min)", direction)
+
+        if roc < 0 and value >= HYPO_LEVEL:
+            projected = value + roc * HYPO_HORIZON_MIN
+            if projected < HYPO_LEVEL:
+                eta = int((value - HYPO_LEVEL) / -roc)
+                self._fire(st, out, patient_id, ts, "predicted_hypo", "high",
+                           f"Glucose predicted below {HYPO_LEVEL:g} mg/dL in ~{eta} min")
+        return out
+
+    # ---------------- VITALS -------------------
+    # Vitals keep no window, only cooldowns, so only hits are relayed.
+    def heart_rate(self, patient_id: int, bpm: int, ts: datetime) -> List[dict]:
+        ts = to_utc(ts)
+        out: List[dict] = []
+        with rule_timer("heart_rate"):
+            hit = rules.classify_heart_rate(bpm)
+            if hit:
+                with self._lock:
+                    self._fire(self._state(patient_id), out, patient_id, ts, "heart_rate", *hit)
+        if hit and self.relay is not None:
+            self.relay("heart_rate", [[patient_id, bpm, ts]])
+        return out
+
+    def blood_pressure(self, patient_id: int, systolic: int, diastolic: int, ts: datetime) -> List[dict]:
+        ts = to_utc(ts)
+        out: List[dict] = []
+        with rule_timer("blood_pressure"):
+            hit = rules.classify_blood_pressure(systolic, diastolic)
+            if hit:
+                with self._lock:
+                    self._fire(self._state(patient_id), out, patient_id, ts, "blood_pressure", *hit)
+        if hit and self.relay is not None:
+            self.relay("blood_pressure", [[patient_id, systolic, diastolic, ts]])
+        return out
+
+    # ---------------- REPLAY -------------------
+    def observe(self, kind: str, samples: Iterable[list]) -> None:
+        """Apply samples another worker evaluated (same argument order as
+        reading/heart_rate/blood_pressure). State moves on exactly as it did
+        there; the alerts were already raised by that worker."""
+        discard: List[dict] = []
+        with self._lock:
+            for s in samples:
+                if kind == "reading":
+                    self._reading(*s[:-1], to_utc(s[-1]))
+                    continue
+                if kind == "heart_rate":
+                    pid, ts, hit = s[0], to_utc(s[-1]), rules.classify_heart_rate(s[1])
+                else:
+                    pid, ts, hit = s[0], to_utc(s[-1]), rules.classify_blood_pressure(s[1], s[2])
+                if hit:
+                    self._fire(self._state(pid), discard, pid, ts, kind, *hit)
+
+
+alert_engine = AlertEngine()
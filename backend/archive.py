@@ -0,0 +1,413 @@
+# backend/archive.py
+"""Retention: move old raw readings and vitals out of the database into
+per-patient, per-month NumPy files, keeping hourly/daily rollups behind.
+
+Layout under CAREPLUS_ARCHIVE_DIR:
+
+    readings/<patient_id>/2025-03.npy         structured array, sorted by (timestamp, id)
+    readings/<patient_id>/2025-03.notes.json  context/notes that don't fit a code
+    heartrate/<patient_id>/2025-03.npy
+    bloodpressure/<patient_id>/2025-03.npy
+
+.npy files are opened with mmap_mode="r", so a history page only touches
+the pages it reads. With CAREPLUS_ARCHIVE_COMPRESS=1 months are written as
+compressed .npz instead (smaller, but loaded whole).
+
+The job only archives whole calendar months that end before now minus
+CAREPLUS_RETENTION_DAYS. Each (patient, month) is written to the archive
+first and deleted from the database second; the write merges with any
+existing file and dedupes by id, so a crash in between, or late back-filled
+samples, are picked up by the next run.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from backend import jobs, models, rollups
+
+ARCHIVE_DIR = os.getenv("CAREPLUS_ARCHIVE_DIR", "./archive")
+# Raw samples older than this many days are archived; unset/0 disables the job.
+RETENTION_DAYS = int(os.getenv("CAREPLUS_RETENTION_DAYS") or 0)
+RETENTION_INTERVAL_S = float(os.getenv("CAREPLUS_RETENTION_INTERVAL_S", "3600"))
+COMPRESS = os.getenv("CAREPLUS_ARCHIVE_COMPRESS", "").lower() in ("1", "true", "yes", "on")
+# Reclaim the freed pages of a SQLite file after a run that moved rows.
+VACUUM = os.getenv("CAREPLUS_RETENTION_VACUUM", "").lower() in ("1", "true", "yes", "on")
+
+CONTEXTS = ("random", "fasting", "post_meal")
+SIDECAR_CODE = 255  # context/notes live in the .notes.json sidecar
+
+log = logging.getLogger("careplus.retention")
+
+# kind -> (model, value fields, structured dtype)
+KINDS: Dict[str, Tuple[type, Tuple[str, ...], np.dtype]] = {
+    "readings": (models.Reading, ("value_mgdl",), np.dtype([
+        ("id", "<i8"), ("timestamp", "<M8[us]"), ("value_mgdl", "<f8"), ("context", "u1"),
+    ])),
+    "heartrate": (models.HeartRate, ("bpm",), np.dtype([
+        ("id", "<i8"), ("timestamp", "<M8[us]"), ("bpm", "<f4"),
+    ])),
+    "bloodpressure": (models.BloodPressure, ("systolic", "diastolic"), np.dtype([
+        ("id", "<i8"), ("timestamp", "<M8[us]"), ("systolic", "<f4"), ("diastolic", "<f4"),
+    ])),
+}
+
+
+# ---------------- FILES -------------------
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(ts: datetime) -> datetime:
+    return (month_start(ts) + timedelta(days=32)).replace(day=1)
+
+
+def _dir(kind: str, patient_id: int, root: str = None) -> str:
+    return os.path.join(root or ARCHIVE_DIR, kind, str(patient_id))
+
+
+def months(kind: str, patient_id: int, root: str = None) -> List[datetime]:
+    """Archived months for a patient, oldest first."""
+    try:
+        names = os.listdir(_dir(kind, patient_id, root))
+    except FileNotFoundError:
+        return []
+    found = set()
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext in (".npy", ".npz"):
+            found.add(datetime.strptime(stem, "%Y-%m"))
+    return sorted(found)
+
+
+def _path(kind: str, patient_id: int, month: datetime, ext: str, root: str = None) -> str:
+    return os.path.join(_dir(kind, patient_id, root), f"{month:%Y-%m}{ext}")
+
+
+def load_month(kind: str, patient_id: int, month: datetime, root: str = None) -> np.ndarray:
+    dtype = KINDS[kind][2]
+    path = _path(kind, patient_id, month, ".npy", root)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r")
+    path = _path(kind, patient_id, month, ".npz", root)
+    if os.path.exists(path):
+        with np.load(path) as z:
+            return z["rows"]
+    return np.empty(0, dtype=dtype)
+
+
+def load_sidecar(patient_id: int, month: datetime, root: str = None) -> Dict[int, list]:
+    path = _path("readings", patient_id, month, ".notes.json", root)
+    try:
+        with open(path) as f:
+            return {int(k): v for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def _replace(path: str, write: Callable) -> None:
+    """Write via a temp file and rename, so readers never see a partial file."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def write_month(kind: str, patient_id: int, month: datetime, rows: np.ndarray,
+                sidecar: Optional[Dict[int, list]] = None, root: str = None) -> np.ndarray:
+    """Merge `rows` into the month's file (dedupe by id, sort by time) and
+    return the full merged array."""
+    os.makedirs(_dir(kind, patient_id, root), exist_ok=True)
+    merged = np.concatenate([np.asarray(load_month(kind, patient_id, month, root)), rows])
+    _, first = np.unique(merged["id"], return_index=True)
+    merged = merged[first]
+    merged = merged[np.lexsort((merged["id"], merged["timestamp"]))]
+
+    npy, npz = _path(kind, patient_id, month, ".npy", root), _path(kind, patient_id, month, ".npz", root)
+    if COMPRESS:
+        _replace(npz, lambda f: np.savez_compressed(f, rows=merged))
+        stale = npy
+    else:
+        _replace(npy, lambda f: np.save(f, merged))
+        stale = npz
+    if os.path.exists(stale):
+        os.remove(stale)
+
+    if kind == "readings":
+        notes = load_sidecar(patient_id, month, root)
+        notes.update(sidecar or {})
+        if notes:
+            path = _path(kind, patient_id, month, ".notes.json", root)
+            _replace(path, lambda f: f.write(json.dumps({str(k): v for k, v in notes.items()}).encode()))
+    return merged
+
+
+def forget(patient_id: int, root: str = None) -> None:
+    """Remove every archived sample of a patient (on patient delete)."""
+    for kind in KINDS:
+        shutil.rmtree(_dir(kind, patient_id, root), ignore_errors=True)
+
+
+# ---------------- READ -------------------
+def _to_python(arr: np.ndarray, field: str) -> list:
+    col = arr[field]
+    if col.dtype.kind == "M":
+        return col.astype("datetime64[us]").tolist()
+    if col.dtype.kind == "f":
+        # NaN marks a NULL; vitals are integers in the database.
+        cast = float if field == "value_mgdl" else int
+        return [None if v != v else cast(v) for v in col.tolist()]
+    return col.tolist()
+
+
+def _reading_extras(patient_id: int, month: datetime, rows: np.ndarray, root: str) -> Tuple[list, list]:
+    codes = rows["context"].tolist()
+    contexts = [CONTEXTS[c] if c < len(CONTEXTS) else None for c in codes]
+    notes = [None] * len(codes)
+    if SIDECAR_CODE in codes:
+        side = load_sidecar(patient_id, month, root)
+        for i, rid in enumerate(rows["id"].tolist()):
+            if rid in side:
+                contexts[i], notes[i] = side[rid]
+    return contexts, notes
+
+
+def page(kind: str, patient_id: int, names: Sequence[str], since: Optional[datetime],
+         until: Optional[datetime], cursor: Optional[Tuple[datetime, int]], n: int,
+         newer_than: Optional[datetime] = None, root: str = None) -> List[tuple]:
+    """Up to `n` archived rows, newest first, as tuples in `names` order.
+
+    Same window and keyset semantics as backend.history.page. Months that
+    end at or before `newer_than` are skipped (the caller already has `n`
+    rows newer than that from the database).
+    """
+    if kind not in KINDS:
+        return []
+    upper = min((t for t in (until, cursor and cursor[0]) if t is not None), default=None)
+    out: List[tuple] = []
+    for month in reversed(months(kind, patient_id, root)):
+        if len(out) >= n:
+            break
+        end = next_month(month)
+        if since is not None and end <= since:
+            break
+        if newer_than is not None and end <= newer_than:
+            break
+        if upper is not None and month > upper:
+            continue
+
+        rows = load_month(kind, patient_id, month, root)
+        ts = rows["timestamp"]
+        lo = 0 if since is None else int(np.searchsorted(ts, np.datetime64(since, "us"), "left"))
+        hi = len(rows)
+        if until is not None:
+            hi = int(np.searchsorted(ts, np.datetime64(until, "us"), "left"))
+        if cursor is not None:
+            hi = min(hi, int(np.searchsorted(ts, np.datetime64(cursor[0], "us"), "right")))
+        idx = np.arange(hi - 1, lo - 1, -1)
+        if cursor is not None and idx.size:
+            # Rows at exactly the cursor time are kept only below its id.
+            at_cursor = (ts[idx] == np.datetime64(cursor[0], "us")) & (rows["id"][idx] >= cursor[1])
+            idx = idx[~at_cursor]
+        idx = idx[: n - len(out)]
+        if not idx.size:
+            continue
+        chunk = np.asarray(rows[idx])
+
+        cols = {f: _to_python(chunk, f) for f in chunk.dtype.names if f != "context"}
+        if kind == "readings":
+            cols["context"], cols["notes"] = _reading_extras(patient_id, month, chunk, root)
+        cols["patient_id"] = [patient_id] * idx.size
+        out.extend(zip(*(cols.get(name, [None] * idx.size) for name in names)))
+    return out
+
+
+def series(kind: str, patient_id: int, start: datetime, end: datetime,
+           fields: Sequence[str], root: str = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Archived (timestamps, values) in [start, end), oldest first."""
+    ts_parts, value_parts = [], {f: [] for f in fields}
+    for month in months(kind, patient_id, root):
+        if next_month(month) <= start or month >= end:
+            continue
+        rows = load_month(kind, patient_id, month, root)
+        ts = rows["timestamp"]
+        lo = int(np.searchsorted(ts, np.datetime64(start, "us"), "left"))
+        hi = int(np.searchsorted(ts, np.datetime64(end, "us"), "left"))
+        ts_parts.append(np.asarray(ts[lo:hi]))
+        for f in fields:
+            value_parts[f].append(np.asarray(rows[f][lo:hi], dtype=np.float64))
+    if not ts_parts:
+        return np.empty(0, dtype="datetime64[us]"), {f: np.empty(0) for f in fields}
+    return np.concatenate(ts_parts), {f: np.concatenate(v) for f, v in value_parts.items()}
+
+
+# ---------------- RETENTION JOB -------------------
+def cutoff(now: Optional[datetime] = None, days: int = RETENTION_DAYS) -> datetime:
+    """Start of the month containing now - days: everything before it goes."""
+    return month_start((now or datetime.utcnow()) - timedelta(days=days))
+
+
+def _to_array(kind: str, rows) -> Tuple[np.ndarray, Dict[int, list]]:
+    model, fields, dtype = KINDS[kind]
+    arr = np.empty(len(rows), dtype=dtype)
+    arr["id"] = [r.id for r in rows]
+    arr["timestamp"] = np.array([r.timestamp for r in rows], dtype="datetime64[us]")
+    sidecar: Dict[int, list] = {}
+    if kind == "readings":
+        arr["value_mgdl"] = [np.nan if r.value_mgdl is None else r.value_mgdl for r in rows]
+        codes = []
+        for r in rows:
+            if r.notes is None and r.context in CONTEXTS:
+                codes.append(CONTEXTS.index(r.context))
+            else:
+                codes.append(SIDECAR_CODE)
+                sidecar[r.id] = [r.context, r.notes]
+        arr["context"] = codes
+    else:
+        for f in fields:
+            arr[f] = [np.nan if getattr(r, f) is None else getattr(r, f) for r in rows]
+    return arr, sidecar
+
+
+def _rollup_month(db: Session, kind: str, patient_id: int, month: datetime, merged: np.ndarray) -> None:
+    """Replace the month's rollups with ones computed from the full archive
+    plus whatever of the month is still in the database (the row kept back
+    for its id, or rows at or after `before`). Runs after the move."""
+    model, fields, _ = KINDS[kind]
+    ts = merged["timestamp"].astype("datetime64[us]").tolist()
+    rows = [
+        {"patient_id": patient_id, "timestamp": t,
+         **{f: (None if v != v else float(v)) for f, v in zip(fields, vals)}}
+        for t, *vals in zip(ts, *(merged[f].tolist() for f in fields))
+    ]
+    end = next_month(month)
+    rows += [
+        {"patient_id": patient_id, **r._mapping}
+        for r in db.execute(
+            select(model.timestamp, *(getattr(model, f) for f in fields))
+            .where(model.patient_id == patient_id, model.timestamp >= month, model.timestamp < end)
+        )
+    ]
+    if kind == "readings":
+        R = models.GlucoseRollup
+        db.execute(delete(R).where(R.patient_id == patient_id, R.bucket_start >= month, R.bucket_start < end))
+        rollups.apply(db, [r for r in rows if r["value_mgdl"] is not None])
+    else:
+        V = models.VitalsRollup
+        db.execute(delete(V).where(
+            V.patient_id == patient_id, V.kind == kind, V.bucket_start >= month, V.bucket_start < end,
+        ))
+        parts = rollups.aggregate_vitals(kind, rows, fields)
+        if parts:
+            db.execute(V.__table__.insert(), parts)
+
+
+def archive_patient(db: Session, kind: str, patient_id: int, before: datetime, root: str = None) -> int:
+    """Move one patient's rows older than `before` to the archive. The caller commits."""
+    model, fields, _ = KINDS[kind]
+    cols = [model.id, model.timestamp, *(getattr(model, f) for f in fields)]
+    if kind == "readings":
+        cols += [model.context, model.notes]
+    # SQLite hands out max(rowid) + 1 for new rows, so moving the row with
+    # the highest id would let its id be reused by the next insert. It waits
+    # for the next run instead.
+    max_id = db.scalar(select(func.max(model.id)))
+    rows = db.execute(
+        select(*cols)
+        .where(model.patient_id == patient_id, model.timestamp < before, model.id < max_id)
+        .order_by(model.timestamp, model.id)
+    ).all()
+    if not rows:
+        return 0
+
+    by_month: Dict[datetime, list] = {}
+    for r in rows:
+        by_month.setdefault(month_start(r.timestamp), []).append(r)
+    merged = {}
+    for month, chunk in by_month.items():
+        arr, sidecar = _to_array(kind, chunk)
+        merged[month] = write_month(kind, patient_id, month, arr, sidecar, root)
+
+    ids = [r.id for r in rows]
+    for i in range(0, len(ids), 10000):
+        db.execute(delete(model).where(model.id.in_(ids[i:i + 10000])))
+    for month, archived in merged.items():
+        _rollup_month(db, kind, patient_id, month, archived)
+    return len(rows)
+
+
+@contextmanager
+def _job_lock(root: str):
+    """One retention run at a time across worker processes."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def run_once(session_factory, days: int = RETENTION_DAYS, root: str = None,
+             now: Optional[datetime] = None) -> Dict[str, int]:
+    """Archive every patient's rows older than the retention cutoff.
+
+    One transaction per patient and kind, so the database lock is held
+    briefly and readers keep going. Returns rows moved per kind.
+    """
+    root = root or ARCHIVE_DIR
+    before = cutoff(now, days)
+    moved = {kind: 0 for kind in KINDS}
+    with _job_lock(root) as acquired:
+        if not acquired:
+            return moved
+        with session_factory() as db:
+            patient_ids = db.scalars(select(models.Patient.id).order_by(models.Patient.id)).all()
+        for pid in patient_ids:
+            for kind in KINDS:
+                with session_factory() as db:
+                    n = archive_patient(db, kind, pid, before, root)
+                    if n:
+                        db.commit()
+                        moved[kind] += n
+
+        if VACUUM and any(moved.values()):
+            with session_factory() as db:
+                if db.get_bind().dialect.name == "sqlite":
+                    db.connection().exec_driver_sql("VACUUM")
+    return moved
+
+
+async def retention_loop(session_factory, interval: float = RETENTION_INTERVAL_S) -> None:
+    """Background task started from the app lifespan when retention is on."""
+    def report(moved: Dict[str, int], seconds: float) -> None:
+        if any(moved.values()):
+            log.info("archived %s in %.1fs", moved, seconds)
+
+    await jobs.loop(log, "retention run", lambda due: run_once(session_factory, now=due),
+                    jobs.every(interval), report)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from backend.db import SessionLocal, engine
+    from backend.migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Archive raw samples older than the retention window")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS or 180)
+    args = parser.parse_args()
+    migrate(engine)
+    print(run_once(SessionLocal, days=args.days))
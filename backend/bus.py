@@ -0,0 +1,415 @@
+# backend/bus.py
+"""Keeps per-process state coherent across workers and replicas.
+
+Each worker keeps a response cache, an alert-engine window per patient, a
+search index and a few lookups in memory. In a single process that is all
+there is. Behind several uvicorn/gunicorn workers or container replicas,
+every change one worker makes to that state is also published on a bus, and
+the others apply it to their own copy:
+
+    cache     tags dropped by MemoryCache.invalidate()
+    event     broker events, so SSE/WebSocket clients on any worker see
+              readings and alerts committed by any other
+    alerts    samples run through the alert engine, replayed by the others
+              so trend windows and cooldowns match
+    patient   patient upserts and deletes (search index, ingest lookups,
+              alert state)
+
+CAREPLUS_BUS_URL picks the transport:
+
+    memory://               one process; nothing is sent (default)
+    redis://host:6379/0     Redis pub/sub (needs the `redis` package)
+    postgresql://...        LISTEN/NOTIFY on the database server (needs
+                            `psycopg`); no extra service to run
+
+Delivery is best effort and asynchronous: a worker may serve a cached read
+for a few milliseconds after another one committed a change, and messages
+sent while the connection is down are lost. After reconnecting, a worker
+clears its memory cache, since it may have missed invalidations.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import make_url
+
+from backend import metrics
+from backend.alerts import alert_engine
+from backend.cache import cache
+from backend.events import Event, broker
+from backend.search import patient_index
+from backend.serialization import dumps
+from backend.writer import patient_meta
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - optional speedup
+    import json
+
+    loads = json.loads
+
+BUS_URL = os.getenv("CAREPLUS_BUS_URL", "memory://")
+BUS_CHANNEL = os.getenv("CAREPLUS_BUS_CHANNEL", "careplus")
+# Messages waiting to be sent; beyond this they are dropped, never blocking
+# the request that produced them.
+QUEUE_SIZE = int(os.getenv("CAREPLUS_BUS_QUEUE_SIZE", "10000"))
+# Messages per transport send.
+BATCH_MESSAGES = int(os.getenv("CAREPLUS_BUS_BATCH", "200"))
+RECONNECT_MAX_S = float(os.getenv("CAREPLUS_BUS_RECONNECT_MAX_S", "30"))
+
+log = logging.getLogger("careplus.bus")
+
+
+class Bus(ABC):
+    """Base for the transports: queueing, batching, reconnects and dispatch
+    to HANDLERS. Subclasses supply _connect/_listen/_send (and _close)."""
+
+    backend: str
+
+    def __init__(self, channel: str = BUS_CHANNEL):
+        self.channel = channel
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.connected = False
+        self.sent = self.received = self.dropped = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[int] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def remote(self) -> bool:
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "worker": self.origin,
+            "connected": self.connected,
+            "sent": self.sent,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+    # ---------------- LIFECYCLE -------------------
+    async def start(self) -> None:
+        if not self.remote:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+        self._outbox = asyncio.Queue(QUEUE_SIZE)
+        self._attach()
+        self._tasks = [asyncio.create_task(self._listen_loop()), asyncio.create_task(self._send_loop())]
+
+    async def stop(self) -> None:
+        if not self._tasks:
+            return
+        self._detach()
+        # Whatever the drained write queue just published still goes out.
+        if self.connected:
+            await self._flush()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._close()
+        self.connected = False
+
+    def _attach(self) -> None:
+        if cache.backend == "memory":  # Redis is already shared
+            cache.relay = lambda tags: self.publish("cache", tags)
+        broker.relay = lambda e: self.publish("event", [e.type, e.patient_id, e.ward, e.json])
+        alert_engine.relay = lambda kind, samples: self.publish("alerts", [kind, samples])
+        patient_index.relay = lambda pid, row: self.publish("patient", [pid, row])
+
+    def _detach(self) -> None:
+        for obj in (cache, broker, alert_engine, patient_index):
+            obj.relay = None
+
+    # ---------------- SENDING -------------------
+    def publish(self, topic: str, data) -> None:
+        """Queue a message for the other workers. Safe from any thread."""
+        if self._outbox is None:
+            return
+        if threading.get_ident() == self._thread:
+            self._enqueue((topic, data))
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, (topic, data))
+
+    def _enqueue(self, message: Tuple[str, object]) -> None:
+        try:
+            self._outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.BUS_MESSAGES.labels("dropped", message[0]).inc()
+
+    def _take(self, first: Tuple[str, object]) -> List[Tuple[str, object]]:
+        batch = [first]
+        while len(batch) < BATCH_MESSAGES and not self._outbox.empty():
+            batch.append(self._outbox.get_nowait())
+        return batch
+
+    async def _send_batch(self, batch: List[Tuple[str, object]]) -> None:
+        if not self.connected:
+            self.dropped += len(batch)
+            return
+        try:
+            await self._send(dumps({"o": self.origin, "m": batch}))
+        except Exception as exc:
+            log.warning("bus send of %d messages failed: %s", len(batch), exc)
+            self.dropped += len(batch)
+            return
+        self.sent += len(batch)
+        for topic, _ in batch:
+            metrics.BUS_MESSAGES.labels("sent", topic).inc()
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self._send_batch(self._take(await self._outbox.get()))
+
+    async def _flush(self) -> None:
+        while not self._outbox.empty():
+            await self._send_batch(self._take(self._outbox.get_nowait()))
+
+    # ---------------- RECEIVING -------------------
+    async def _listen_loop(self) -> None:
+        delay, reconnect = 0.5, False
+        while True:
+            try:
+                await self._connect()
+                self.connected = True
+                delay = 0.5
+                if reconnect and cache.backend == "memory":
+                    cache.clear()
+                log.info("bus connected (%s, worker %s)", self.backend, self.origin)
+                await self._listen()
+                raise ConnectionError("listener stopped")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.warning("bus connection lost (%s); retrying in %.1fs", exc, delay)
+            self.connected, reconnect = False, True
+            await self._close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_S)
+
+    def _received(self, payload) -> None:
+        """Apply a batch from the transport (on the event loop thread)."""
+        try:
+            batch = loads(payload)
+        except ValueError:
+            log.warning("undecodable bus payload dropped")
+            return
+        if batch.get("o") == self.origin:
+            return
+        for topic, data in batch["m"]:
+            handler = HANDLERS.get(topic)
+            if handler is None:
+                continue
+            try:
+                handler(data)
+            except Exception:
+                log.exception("bus message %r failed", topic)
+                continue
+            self.received += 1
+            metrics.BUS_MESSAGES.labels("received", topic).inc()
+
+    # ---------------- TRANSPORT -------------------
+    @abstractmethod
+    async def _connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def _listen(self) -> None:
+        """Feed payloads to _received() until the connection drops."""
+
+    @abstractmethod
+    async def _send(self, payload: bytes) -> None:
+        ...
+
+    async def _close(self) -> None:
+        pass
+
+
+class MemoryBus(Bus):
+    """A single process has nobody to tell: start() does nothing, so none
+    of the transport is ever used."""
+
+    backend = "memory"
+
+    @property
+    def remote(self) -> bool:
+        return False
+
+    async def _connect(self) -> None:
+        pass
+
+    async def _listen(self) -> None:
+        pass
+
+    async def _send(self, payload: bytes) -> None:
+        pass
+
+
+class RedisBus(Bus):
+    backend = "redis"
+
+    def __init__(self, url: str, channel: str = BUS_CHANNEL):
+        super().__init__(channel)
+        self.url = url
+        self.client = None
+        self.pubsub = None
+
+    async def _connect(self) -> None:
+        import redis.asyncio as aioredis  # optional dependency
+
+        self.client = aioredis.Redis.from_url(self.url)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel)
+
+    async def _listen(self) -> None:
+        async for message in self.pubsub.listen():
+            if message.get("type") == "message":
+                self._received(message["data"])
+
+    async def _send(self, payload: bytes) -> None:
+        await self.client.publish(self.channel, payload)
+
+    async def _close(self) -> None:
+        for conn in (self.pubsub, self.client):
+            if conn is not None:
+                try:
+                    await (getattr(conn, "aclose", None) or conn.close)()
+                except Exception:
+                    pass
+        self.pubsub = self.client = None
+
+
+class PostgresBus(Bus):
+    """LISTEN/NOTIFY. A NOTIFY payload is capped at 8000 bytes, so larger
+    batches go out as fragments "<id>:<i>:<n>|<text>" in one transaction and
+    are reassembled on arrival."""
+
+    backend = "postgresql"
+    FRAGMENT_BYTES = 7800
+    PENDING_MAX = 256
+
+    def __init__(self, url: str, channel: str = BUS_CHANNEL):
+        super().__init__(channel)
+        # Whatever driver the SQLAlchemy URL names, psycopg wants plain libpq.
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.listen_conn = None
+        self.send_conn = None
+        self._pending: "OrderedDict[str, Dict[int, str]]" = OrderedDict()
+
+    async def _connect(self) -> None:
+        import psycopg  # optional dependency
+
+        self.listen_conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+        self.send_conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+        await self.listen_conn.execute(f'LISTEN "{self.channel}"')
+
+    async def _listen(self) -> None:
+        async for notify in self.listen_conn.notifies():
+            self._fragment(notify.payload)
+
+    def _fragment(self, text: str) -> None:
+        head, _, body = text.partition("|")
+        msg_id, index, count = head.split(":")
+        if count == "1":
+            self._received(body)
+            return
+        parts = self._pending.setdefault(msg_id, {})
+        parts[int(index)] = body
+        if len(parts) == int(count):
+            del self._pending[msg_id]
+            self._received("".join(parts[i] for i in range(len(parts))))
+        while len(self._pending) > self.PENDING_MAX:
+            self._pending.popitem(last=False)
+
+    @classmethod
+    def _chunks(cls, payload: bytes) -> List[str]:
+        """Split on UTF-8 character boundaries."""
+        out, i = [], 0
+        while i < len(payload):
+            j = min(i + cls.FRAGMENT_BYTES, len(payload))
+            while j < len(payload) and (payload[j] & 0xC0) == 0x80:
+                j -= 1
+            out.append(payload[i:j].decode())
+            i = j
+        return out
+
+    async def _send(self, payload: bytes) -> None:
+        chunks = self._chunks(payload)
+        msg_id = uuid.uuid4().hex[:12]
+        async with self.send_conn.transaction():
+            for i, chunk in enumerate(chunks):
+                await self.send_conn.execute(
+                    "SELECT pg_notify(%s, %s)", (self.channel, f"{msg_id}:{i}:{len(chunks)}|{chunk}")
+                )
+
+    async def _close(self) -> None:
+        for conn in (self.listen_conn, self.send_conn):
+            if conn is not None:
+                try:
+                    await conn.close()
+                except Exception:
+                    pass
+        self.listen_conn = self.send_conn = None
+        self._pending.clear()
+
+
+def make_bus(url: str = BUS_URL) -> Bus:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBus(url)
+    if url.startswith(("postgres://", "postgresql://", "postgresql+")):
+        return PostgresBus(url)
+    return MemoryBus()
+
+
+bus = make_bus()
+
+
+# ---------------- HANDLERS -------------------
+def _on_cache(tags: List[str]) -> None:
+    if cache.backend == "memory":
+        cache.invalidate_local(*tags)
+
+
+def _on_event(data: list) -> None:
+    type_, patient_id, ward, encoded = data
+    broker.deliver(Event(type_, patient_id, ward, None, encoded))
+
+
+def _on_alerts(data: list) -> None:
+    kind, samples = data
+    for s in samples:
+        s[-1] = datetime.fromisoformat(s[-1])
+    alert_engine.observe(kind, samples)
+
+
+def _on_patient(data: list) -> None:
+    patient_id, row = data
+    patient_meta.forget(patient_id)
+    if row is None:
+        patient_index.unindex(patient_id)
+        alert_engine.forget(patient_id)
+        return
+    dob = date.fromisoformat(row[3]) if row[3] else None
+    patient_index.index_row((row[0], row[1], row[2], dob))
+
+
+HANDLERS: Dict[str, Callable[[object], None]] = {
+    "cache": _on_cache,
+    "event": _on_event,
+    "alerts": _on_alerts,
+    "patient": _on_patient,
+}
@@ -0,0 +1,278 @@
+# backend/cache.py
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple, Union
+
+from fastapi import Request, Response
+
+# CAREPLUS_CACHE_URL: "memory://" (default), "redis://host:port/db", or "none".
+CACHE_URL = os.getenv("CAREPLUS_CACHE_URL", "memory://")
+CACHE_MAX_ENTRIES = int(os.getenv("CAREPLUS_CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_S = float(os.getenv("CAREPLUS_CACHE_TTL_S", "300"))
+
+# (etag, body, extra headers)
+Entry = Tuple[str, bytes, Dict[str, str]]
+
+
+class CacheStats:
+    # stale: responses not stored because a tag was invalidated while they
+    # were being built.
+    __slots__ = ("hits", "misses", "evictions", "expirations", "invalidations", "stale")
+
+    def __init__(self):
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = self.stale = 0
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class MemoryCache:
+    """Size-bounded LRU with a TTL and tag-based invalidation.
+
+    Every invalidation bumps a generation counter and stamps its tags with
+    it. A reader takes generation() before building a response and passes
+    it to set(), which refuses the entry if any of its tags was stamped
+    later: the body may predate the write. Stamps are kept for the most
+    recently invalidated tags only; a set() older than the oldest dropped
+    stamp is refused too.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: "OrderedDict[str, Tuple[float, Entry, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stamps: "OrderedDict[str, int]" = OrderedDict()
+        self._max_stamps = max(4 * max_entries, 1024)
+        self._forgotten = 0  # newest generation dropped from _stamps
+        # Set by backend.bus so other workers drop the same tags.
+        self.relay: Optional[Callable[[Tuple[str, ...]], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _drop(self, key: str) -> None:
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return None
+            if item[0] < time.monotonic():
+                self._drop(key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return item[1]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def _stale(self, tags: Tuple[str, ...], since: int) -> bool:
+        return since < self._forgotten or any(self._stamps.get(t, -1) > since for t in tags)
+
+    def set(self, key: str, entry: Entry, tags: Iterable[str], since: Optional[int] = None) -> None:
+        """Store `entry`; with `since` (a generation()), only if none of
+        `tags` was invalidated after it."""
+        tags = tuple(tags)
+        with self._lock:
+            if since is not None and self._stale(tags, since):
+                self.stats.stale += 1
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, entry, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+                self.stats.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        self.invalidate_local(*tags)
+        if self.relay is not None:
+            self.relay(tags)
+
+    def invalidate_local(self, *tags: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._stamps[tag] = self._generation
+                self._stamps.move_to_end(tag)
+            while len(self._stamps) > self._max_stamps:
+                _, self._forgotten = self._stamps.popitem(last=False)
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+                    self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+
+class RedisCache:
+    """Same interface backed by Redis (or anything speaking its protocol).
+
+    Tags are Redis sets of keys, so invalidation from one worker is seen by
+    all of them. Generations are a shared counter and per-tag stamps that
+    expire with the entries. Counters are per process.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, ttl: float = CACHE_TTL_S, prefix: str = "careplus:"):
+        import redis  # optional dependency
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(f"{self.prefix}k:*"))
+
+    def get(self, key: str) -> Optional[Entry]:
+        raw = self.client.get(f"{self.prefix}k:{key}")
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return pickle.loads(raw)
+
+    def generation(self) -> int:
+        return int(self.client.get(f"{self.prefix}gen") or 0)
+
+    def set(self, key: str, entry: Entry, tags: Iterable[str], since: Optional[int] = None) -> None:
+        tags = tuple(tags)
+        if since is not None and tags:
+            stamps = self.client.mget([f"{self.prefix}g:{tag}" for tag in tags])
+            if any(int(s) > since for s in stamps if s is not None):
+                self.stats.stale += 1
+                return
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}k:{key}", pickle.dumps(entry), ex=self.ttl)
+        for tag in tags:
+            pipe.sadd(f"{self.prefix}t:{tag}", key)
+            pipe.expire(f"{self.prefix}t:{tag}", self.ttl)
+        pipe.execute()
+
+    def invalidate(self, *tags: str) -> None:
+        generation = self.client.incr(f"{self.prefix}gen")
+        for tag in tags:
+            self.client.set(f"{self.prefix}g:{tag}", generation, ex=self.ttl)
+            tkey = f"{self.prefix}t:{tag}"
+            keys = self.client.smembers(tkey)
+            if keys:
+                self.client.delete(*(f"{self.prefix}k:{k.decode()}" for k in keys))
+                self.stats.invalidations += len(keys)
+            self.client.delete(tkey)
+
+    def clear(self) -> None:
+        for k in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(k)
+
+
+class NullCache(MemoryCache):
+    backend = "none"
+
+    def get(self, key: str) -> Optional[Entry]:
+        self.stats.misses += 1
+        return None
+
+    def set(self, key: str, entry: Entry, tags: Iterable[str], since: Optional[int] = None) -> None:
+        pass
+
+
+def make_cache(url: str = CACHE_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    if url in ("none", "off", ""):
+        return NullCache()
+    return MemoryCache()
+
+
+cache = make_cache()
+
+
+# ---------------- TAGS -------------------
+def patient_tag(patient_id: int, kind: Optional[str] = None) -> str:
+    """kind: profile | readings | alerts | heartrate | bloodpressure | medications"""
+    return f"patient:{patient_id}" if kind is None else f"patient:{patient_id}:{kind}"
+
+
+PATIENT_LIST_TAG = "patients"
+
+
+def invalidate_patient(patient_id: int, *kinds: str) -> None:
+    """Drop the given kinds of a patient's cached reads, or all of them."""
+    if kinds:
+        cache.invalidate(*(patient_tag(patient_id, k) for k in kinds))
+    else:
+        cache.invalidate(patient_tag(patient_id))
+
+
+# ---------------- HTTP -------------------
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _key(request: Request) -> str:
+    query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+    return f"{request.url.path}?{query}"
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip() for t in header.split(","))
+
+
+async def cached(
+    request: Request,
+    tags: Union[Iterable[str], Callable[[], Iterable[str]]],
+    produce: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]],
+) -> Response:
+    """Serve a JSON GET from the cache, filling it from `produce` on a miss.
+
+    `produce` returns the encoded body and any headers to replay with it.
+    `tags` may be a callable, evaluated after `produce`, for responses whose
+    dependencies are only known once built. A write that invalidates one of
+    the tags while `produce` runs keeps its result out of the cache (it is
+    still returned). Conditional requests whose If-None-Match matches get a
+    bodiless 304.
+    """
+    key = _key(request)
+    entry = cache.get(key)
+    if entry is None:
+        generation = cache.generation()
+        body, headers = await produce()
+        entry = (make_etag(body), body, headers)
+        cache.set(key, entry, tags() if callable(tags) else tags, since=generation)
+
+    etag, body, headers = entry
+    headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
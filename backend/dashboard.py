@@ -0,0 +1,120 @@
+# backend/dashboard.py
+"""Nurse-station view: the latest glucose and vitals, open alerts and
+medications for every patient in a ward or cohort.
+
+Three statements regardless of how many patients match:
+
+1. patients, each LEFT JOINed to its latest reading, heart rate and blood
+   pressure row. "Latest" is a correlated `ORDER BY timestamp DESC LIMIT 1`
+   subquery, which the (patient_id, timestamp) indexes answer with one
+   index seek per patient instead of scanning their history;
+2. open (unacknowledged) alert counts, GROUP BY patient over the partial
+   open-alerts index;
+3. medications for all the patients in one IN query.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import aliased
+
+from backend import models
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# Cache tags a dashboard entry depends on, per listed patient.
+KINDS = ("profile", "readings", "alerts", "heartrate", "bloodpressure", "medications")
+
+
+def _latest(model):
+    """Alias of `model` joined on the id of each patient's newest row."""
+    inner = aliased(model)
+    newest = (
+        select(inner.id)
+        .where(inner.patient_id == models.Patient.id)
+        .order_by(inner.timestamp.desc(), inner.id.desc())
+        .limit(1)
+        .correlate(models.Patient)
+        .scalar_subquery()
+    )
+    outer = aliased(model)
+    return outer, outer.id == newest
+
+
+async def ward_dashboard(db, ward: Optional[str] = None, cohort: Optional[str] = None,
+                         limit: int = DEFAULT_LIMIT, offset: int = 0) -> dict:
+    P = models.Patient
+    R, r_on = _latest(models.Reading)
+    H, h_on = _latest(models.HeartRate)
+    B, b_on = _latest(models.BloodPressure)
+
+    stmt = (
+        select(
+            P.id, P.name, P.diabetes_type, P.ward, P.cohort,
+            R.timestamp, R.value_mgdl, R.context,
+            H.timestamp, H.bpm,
+            B.timestamp, B.systolic, B.diastolic,
+        )
+        .select_from(P)
+        .outerjoin(R, r_on)
+        .outerjoin(H, h_on)
+        .outerjoin(B, b_on)
+        .order_by(P.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    if ward is not None:
+        stmt = stmt.where(P.ward == ward)
+    if cohort is not None:
+        stmt = stmt.where(P.cohort == cohort)
+    rows = (await db.execute(stmt)).all()
+
+    patients: List[dict] = []
+    by_id: Dict[int, dict] = {}
+    for (pid, name, dtype, p_ward, p_cohort, r_ts, value, context,
+         h_ts, bpm, b_ts, systolic, diastolic) in rows:
+        entry = {
+            "id": pid,
+            "name": name,
+            "diabetes_type": dtype,
+            "ward": p_ward,
+            "cohort": p_cohort,
+            "latest_reading": None if r_ts is None else
+                {"timestamp": r_ts, "value_mgdl": value, "context": context},
+            "latest_heart_rate": None if h_ts is None else {"timestamp": h_ts, "bpm": bpm},
+            "latest_blood_pressure": None if b_ts is None else
+                {"timestamp": b_ts, "systolic": systolic, "diastolic": diastolic},
+            "open_alerts": 0,
+            "open_high_alerts": 0,
+            "medications": [],
+        }
+        patients.append(entry)
+        by_id[pid] = entry
+
+    if by_id:
+        A = models.Alert
+        counts = await db.execute(
+            select(
+                A.patient_id,
+                func.count(),
+                func.sum(case((A.severity == "high", 1), else_=0)),
+            )
+            .where(A.patient_id.in_(by_id), A.acknowledged_at.is_(None))
+            .group_by(A.patient_id)
+        )
+        for pid, n, high in counts:
+            by_id[pid]["open_alerts"] = n
+            by_id[pid]["open_high_alerts"] = int(high or 0)
+
+        M = models.Medication
+        meds = await db.execute(
+            select(M.patient_id, M.id, M.name, M.dosage, M.frequency)
+            .where(M.patient_id.in_(by_id))
+            .order_by(M.patient_id, M.id)
+        )
+        for pid, mid, name, dosage, frequency in meds:
+            by_id[pid]["medications"].append(
+                {"id": mid, "name": name, "dosage": dosage, "frequency": frequency}
+            )
+
+    return {"ward": ward, "cohort": cohort, "count": len(patients), "patients": patients}
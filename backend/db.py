@@ -1,20 +1,217 @@
 # backend/db.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Generator
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncGenerator, Generator, Optional
 
-DATABASE_URL = "sqlite:///./careplus.db"
+from backend import metrics
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+DATABASE_URL = os.getenv("CAREPLUS_DATABASE_URL", "sqlite:///./careplus.db")
+
+# "async": handlers talk to an async engine (aiosqlite for SQLite).
+# "sync":  the blocking engine, with each call pushed to the threadpool.
+DB_MODE = os.getenv("CAREPLUS_DB_MODE", "async").lower()
+
+# Pool settings; unset values keep SQLAlchemy's defaults.
+POOL_SIZE = _env_int("CAREPLUS_DB_POOL_SIZE")
+MAX_OVERFLOW = _env_int("CAREPLUS_DB_MAX_OVERFLOW")
+POOL_TIMEOUT = _env_int("CAREPLUS_DB_POOL_TIMEOUT")
+POOL_RECYCLE = _env_int("CAREPLUS_DB_POOL_RECYCLE")
+POOL_PRE_PING = _env_bool("CAREPLUS_DB_POOL_PRE_PING")
+# Connections opened per pool at startup, so first requests don't pay for it.
+WARM_CONNECTIONS = _env_int("CAREPLUS_WARM_CONNECTIONS", 2)
+
+# "tuned" applies SQLITE_PRAGMAS on every new connection; "default" leaves
+# SQLite's stock rollback journal and full fsync per commit.
+SQLITE_PROFILE = os.getenv("CAREPLUS_SQLITE_PROFILE", "tuned").lower()
+SQLITE_PRAGMAS = {
+    # Readers no longer block on the writer, and commits append to the WAL.
+    "journal_mode": os.getenv("CAREPLUS_SQLITE_JOURNAL_MODE", "WAL"),
+    # In WAL mode NORMAL only fsyncs at checkpoints; still crash-safe.
+    "synchronous": os.getenv("CAREPLUS_SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Wait for the write lock instead of failing with "database is locked".
+    "busy_timeout": _env_int("CAREPLUS_SQLITE_BUSY_TIMEOUT_MS", 5000),
+    "mmap_size": _env_int("CAREPLUS_SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    # Negative means KiB rather than pages.
+    "cache_size": -_env_int("CAREPLUS_SQLITE_CACHE_SIZE_KB", 64 * 1024),
+    "temp_store": "MEMORY",
+}
+
+# Async driver used for each backend when the URL doesn't name one.
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def to_async_url(url: str) -> str:
+    u = make_url(url)
+    if "+" in u.drivername:
+        return url
+    driver = ASYNC_DRIVERS.get(u.get_backend_name())
+    if not driver:
+        raise ValueError(f"No async driver known for {u.drivername!r}")
+    return u.set(drivername=f"{u.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("CAREPLUS_ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+
+def _apply_sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cur.execute(f"PRAGMA {name}={value}")
+    cur.close()
+
+
+def engine_options(url: str) -> dict:
+    opts: dict = {}
+    if make_url(url).get_backend_name() == "sqlite":
+        opts["connect_args"] = {"check_same_thread": False}
+    for key, value in (
+        ("pool_size", POOL_SIZE),
+        ("max_overflow", MAX_OVERFLOW),
+        ("pool_timeout", POOL_TIMEOUT),
+        ("pool_recycle", POOL_RECYCLE),
+    ):
+        if value is not None:
+            opts[key] = value
+    if POOL_PRE_PING:
+        opts["pool_pre_ping"] = True
+    return opts
+
+
+def tune_engine(sync_engine: Engine, profile: str = SQLITE_PROFILE) -> Engine:
+    """Install the per-connection SQLite pragmas for the "tuned" profile."""
+    if sync_engine.dialect.name == "sqlite" and profile == "tuned":
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    return sync_engine
+
+
+def make_engine(url: str = DATABASE_URL, profile: str = SQLITE_PROFILE) -> Engine:
+    return tune_engine(create_engine(url, **engine_options(url)), profile)
+
+
+engine = metrics.instrument_engine(make_engine(), "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+    metrics.instrument_engine(tune_engine(async_engine.sync_engine), "async")
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
 
-def get_db() -> Generator:
+
+class ThreadedSession:
+    """AsyncSession-shaped wrapper that runs a blocking Session in the threadpool.
+
+    Lets the `async def` handlers run unchanged when DB_MODE is "sync".
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None):
+        def run():
+            result = self.sync_session.execute(statement, params)
+            return result.freeze()() if getattr(result, "returns_rows", True) else result
+        return await run_in_threadpool(run)
+
+    async def scalars(self, statement, params=None):
+        return (await self.execute(statement, params)).scalars()
+
+    async def scalar(self, statement, params=None):
+        return (await self.execute(statement, params)).scalar()
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+def _warm_sync(n: int) -> None:
+    conns = [engine.connect() for _ in range(n)]
+    for conn in conns:
+        conn.exec_driver_sql("SELECT 1")
+    for conn in conns:
+        conn.close()
+
+
+async def warm_pools(n: int = WARM_CONNECTIONS) -> None:
+    """Open `n` connections in each pool and hand them back to it."""
+    if n <= 0:
+        return
+    await run_in_threadpool(_warm_sync, n)
+    if async_engine is not None:
+        conns = [await async_engine.connect() for _ in range(n)]
+        for conn in conns:
+            await conn.exec_driver_sql("SELECT 1")
+        for conn in conns:
+            await conn.close()
+
+
+def get_sync_db() -> Generator:
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_db() -> AsyncGenerator:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(SessionLocal(expire_on_commit=False))
+        try:
+            yield db
+        finally:
+            await db.close()
@@ -0,0 +1,421 @@
+# backend/doses.py
+"""Medication schedules, dose events and adherence.
+
+A MedicationSchedule says when a medication is due. Its dose slots are
+materialized into dose_events only HORIZON_H ahead of now: expand() tops
+every schedule up to the horizon in one executemany, either from the
+background loop or lazily when a due-dose query looks past what has been
+expanded. Further-out slots are computed on the fly for timelines and
+never stored.
+
+A pending dose is "due" from slightly before its time until `late_at`
+(scheduled_at + grace), "overdue" after that, and is swept to "missed"
+MISSED_AFTER_H later, which keeps the partial pending index (and so every
+reminder poll) small no matter how much history there is. Adherence counts
+come from the (patient_id, scheduled_at) index.
+"""
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend import jobs, models
+from backend.timeutil import to_utc
+
+# Dose slots are written this far ahead of now.
+HORIZON_H = float(os.getenv("CAREPLUS_DOSE_HORIZON_H", "48"))
+# Overdue doses become "missed" this long after their grace period ends.
+MISSED_AFTER_H = float(os.getenv("CAREPLUS_DOSE_MISSED_AFTER_H", "12"))
+# Background expand + sweep interval; 0 = only expand lazily, never sweep.
+SWEEP_INTERVAL_S = float(os.getenv("CAREPLUS_DOSE_SWEEP_S", "300"))
+# Longest timeline a single request may ask for.
+MAX_TIMELINE = timedelta(days=92)
+MIN_EVERY_HOURS = 0.25
+
+log = logging.getLogger("careplus.doses")
+
+# How far this process knows every schedule has been expanded.
+_expanded_until: Optional[datetime] = None
+
+
+# ---------------- SCHEDULES -------------------
+def _zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(400, f"unknown timezone {name!r}")
+
+
+def _parse_time(text: str):
+    try:
+        return datetime.strptime(text, "%H:%M").time()
+    except (TypeError, ValueError):
+        raise HTTPException(400, f"times must be HH:MM, got {text!r}")
+
+
+def validate(data) -> None:
+    """400 unless `data` (a ScheduleCreate) describes exactly one pattern."""
+    if bool(data.times) == (data.every_hours is not None):
+        raise HTTPException(400, "give either times or every_hours")
+    if data.times:
+        for t in data.times:
+            _parse_time(t)
+    if data.every_hours is not None and data.every_hours < MIN_EVERY_HOURS:
+        raise HTTPException(400, f"every_hours must be at least {MIN_EVERY_HOURS}")
+    if data.days and not all(0 <= d <= 6 for d in data.days):
+        raise HTTPException(400, "days are 0 (Monday) to 6 (Sunday)")
+    if not 0 <= data.grace_minutes <= 24 * 60:
+        raise HTTPException(400, "grace_minutes must be between 0 and 1440")
+    if data.start_at and data.end_at and data.end_at <= data.start_at:
+        raise HTTPException(400, "end_at must be after start_at")
+    _zone(data.timezone)
+
+
+def slots(sched, start: datetime, end: datetime) -> List[datetime]:
+    """UTC dose times of `sched` in [start, end), ascending."""
+    start = max(start, sched.start_at)
+    if sched.end_at is not None:
+        end = min(end, sched.end_at)
+    if start >= end:
+        return []
+
+    if sched.every_hours:
+        step = timedelta(hours=sched.every_hours)
+        k = max(0, math.ceil((start - sched.start_at) / step))
+        out = []
+        t = sched.start_at + k * step
+        while t < end:
+            out.append(t)
+            t += step
+        return out
+
+    zone = ZoneInfo(sched.timezone or "UTC")
+    times = sorted(_parse_time(t) for t in sched.times)
+    days = set(sched.days or range(7))
+    # One day either side covers any UTC offset.
+    day = start.date() - timedelta(days=1)
+    last = end.date() + timedelta(days=1)
+    out = []
+    while day <= last:
+        if day.weekday() in days:
+            for t in times:
+                at = to_utc(datetime.combine(day, t), zone)
+                if start <= at < end:
+                    out.append(at)
+        day += timedelta(days=1)
+    out.sort()
+    return out
+
+
+def _insert_slots(db: Session, rows: List[dict]) -> None:
+    if not rows:
+        return
+    table = models.DoseEvent.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        # Two workers expanding the same window race harmlessly.
+        db.execute(upsert(table).on_conflict_do_nothing(index_elements=["schedule_id", "scheduled_at"]), rows)
+    else:
+        db.execute(insert(table), rows)
+
+
+def _expand_schedules(db: Session, schedules: Iterable, until: datetime) -> int:
+    rows = []
+    ids = []
+    for s in schedules:
+        grace = timedelta(minutes=s.grace_minutes)
+        for at in slots(s, s.materialized_until, until):
+            rows.append({
+                "schedule_id": s.id,
+                "medication_id": s.medication_id,
+                "patient_id": s.patient_id,
+                "scheduled_at": at,
+                "late_at": at + grace,
+                "status": "pending",
+            })
+        ids.append(s.id)
+    _insert_slots(db, rows)
+    if ids:
+        S = models.MedicationSchedule
+        db.execute(
+            update(S).where(S.id.in_(ids), S.materialized_until < until).values(materialized_until=until)
+        )
+    return len(rows)
+
+
+def expand(db: Session, until: datetime) -> int:
+    """Materialize every schedule's slots up to `until`; returns rows added.
+    Runs inside the caller's transaction."""
+    S = models.MedicationSchedule
+    lagging = db.execute(
+        select(S).where(
+            S.materialized_until < until,
+            or_(S.end_at.is_(None), S.end_at > S.materialized_until),
+        )
+    ).scalars().all()
+    return _expand_schedules(db, lagging, until)
+
+
+def create_schedule(db: Session, med: models.Medication, data, now: datetime) -> models.MedicationSchedule:
+    start_at = data.start_at or now
+    sched = models.MedicationSchedule(
+        medication_id=med.id,
+        patient_id=med.patient_id,
+        times=data.times or None,
+        days=data.days or None,
+        every_hours=data.every_hours,
+        timezone=data.timezone,
+        grace_minutes=data.grace_minutes,
+        start_at=start_at,
+        end_at=data.end_at,
+        # No back-filling: slots before now would only count as missed.
+        materialized_until=max(start_at, now),
+    )
+    db.add(sched)
+    db.flush()
+    _expand_schedules(db, [sched], now + timedelta(hours=HORIZON_H))
+    return sched
+
+
+def end_schedule(db: Session, sched: models.MedicationSchedule, now: datetime) -> None:
+    """Stop a schedule now. Past doses stay for adherence; future ones go."""
+    sched.end_at = now if sched.end_at is None else min(sched.end_at, now)
+    E = models.DoseEvent
+    db.execute(delete(E).where(E.schedule_id == sched.id, E.status == "pending", E.scheduled_at >= now))
+
+
+def delete_for(db: Session, medication_id: Optional[int] = None, patient_id: Optional[int] = None) -> None:
+    """Drop the schedules and dose events of a medication or a patient."""
+    E, S = models.DoseEvent, models.MedicationSchedule
+    if medication_id is not None:
+        db.execute(delete(E).where(E.medication_id == medication_id))
+        db.execute(delete(S).where(S.medication_id == medication_id))
+    if patient_id is not None:
+        db.execute(delete(E).where(E.patient_id == patient_id))
+        db.execute(delete(S).where(S.patient_id == patient_id))
+
+
+# ---------------- BACKGROUND -------------------
+def sweep(db: Session, now: datetime) -> int:
+    """Mark pending doses missed MISSED_AFTER_H after their grace ran out."""
+    E = models.DoseEvent
+    cutoff = now - timedelta(hours=MISSED_AFTER_H)
+    result = db.execute(
+        update(E)
+        .where(E.status == "pending", E.scheduled_at < cutoff, E.late_at < cutoff)
+        .values(status="missed")
+    )
+    return result.rowcount or 0
+
+
+def run_once(session_factory, now: Optional[datetime] = None) -> dict:
+    global _expanded_until
+    now = now or datetime.utcnow()
+    until = now + timedelta(hours=HORIZON_H)
+    with session_factory() as db:
+        added = expand(db, until)
+        missed = sweep(db, now)
+        db.commit()
+    _expanded_until = until
+    return {"added": added, "missed": missed}
+
+
+async def dose_loop(session_factory, interval: float = SWEEP_INTERVAL_S) -> None:
+    """Background task started from the app lifespan."""
+    def report(done: dict, seconds: float) -> None:
+        if any(done.values()):
+            log.info("dose slots %s in %.2fs", done, seconds)
+
+    await jobs.loop(log, "dose expansion", lambda due: run_once(session_factory, due),
+                    jobs.every(interval), report)
+
+
+async def ensure_expanded(db, until: datetime) -> None:
+    """Expand lazily before a query that looks up to `until`. Goes a full
+    horizon ahead, so consecutive polls don't each pay for it."""
+    global _expanded_until
+    if _expanded_until is not None and until <= _expanded_until:
+        return
+    target = max(until, datetime.utcnow() + timedelta(hours=HORIZON_H))
+    await db.run_sync(expand, target)
+    await db.commit()
+    _expanded_until = target
+
+
+# ---------------- QUERIES -------------------
+def _dose_query(ward: Optional[str], cohort: Optional[str]):
+    E, M, P = models.DoseEvent, models.Medication, models.Patient
+    stmt = (
+        select(
+            E.id, E.patient_id, P.name, P.ward, E.medication_id, M.name, M.dosage,
+            E.schedule_id, E.scheduled_at, E.late_at, E.status, E.taken_at,
+        )
+        .select_from(E)
+        .join(M, M.id == E.medication_id)
+        .join(P, P.id == E.patient_id)
+    )
+    if ward is not None:
+        stmt = stmt.where(P.ward == ward)
+    if cohort is not None:
+        stmt = stmt.where(P.cohort == cohort)
+    return stmt
+
+
+def _dose_rows(rows) -> List[dict]:
+    return [
+        {
+            "id": did, "patient_id": pid, "patient_name": pname, "ward": ward,
+            "medication_id": mid, "medication": mname, "dosage": dosage,
+            "schedule_id": sid, "scheduled_at": at, "late_at": late, "status": status,
+            "taken_at": taken,
+        }
+        for did, pid, pname, ward, mid, mname, dosage, sid, at, late, status, taken in rows
+    ]
+
+
+async def get(db, dose_id: int) -> Optional[dict]:
+    E = models.DoseEvent
+    rows = _dose_rows((await db.execute(_dose_query(None, None).where(E.id == dose_id))).all())
+    return rows[0] if rows else None
+
+
+async def due(db, now: datetime, within: timedelta, ward: Optional[str] = None,
+              cohort: Optional[str] = None, limit: int = 500) -> List[dict]:
+    """Pending doses scheduled by now + `within` and not yet late."""
+    await ensure_expanded(db, now + within)
+    E = models.DoseEvent
+    stmt = (
+        _dose_query(ward, cohort)
+        .where(E.status == "pending", E.scheduled_at <= now + within, E.late_at >= now)
+        .order_by(E.scheduled_at, E.id)
+        .limit(limit)
+    )
+    return _dose_rows((await db.execute(stmt)).all())
+
+
+async def overdue(db, now: datetime, ward: Optional[str] = None,
+                  cohort: Optional[str] = None, limit: int = 500) -> List[dict]:
+    """Pending doses past their grace period that haven't been swept yet."""
+    E = models.DoseEvent
+    stmt = (
+        _dose_query(ward, cohort)
+        .where(E.status == "pending", E.scheduled_at < now, E.late_at < now)
+        .order_by(E.scheduled_at, E.id)
+        .limit(limit)
+    )
+    return _dose_rows((await db.execute(stmt)).all())
+
+
+async def timeline(db, patient_id: int, start: datetime, end: datetime) -> List[dict]:
+    """Stored dose events in [start, end) plus, past each schedule's
+    materialized horizon, computed slots with status "scheduled"."""
+    if end - start > MAX_TIMELINE:
+        raise HTTPException(400, f"timeline window is limited to {MAX_TIMELINE.days} days")
+    E = models.DoseEvent
+    stmt = (
+        _dose_query(None, None)
+        .where(E.patient_id == patient_id, E.scheduled_at >= start, E.scheduled_at < end)
+        .order_by(E.scheduled_at, E.id)
+    )
+    out = _dose_rows((await db.execute(stmt)).all())
+
+    S, M = models.MedicationSchedule, models.Medication
+    future = (await db.execute(
+        select(S, M.name, M.dosage)
+        .join(M, M.id == S.medication_id)
+        .where(S.patient_id == patient_id, S.materialized_until < end,
+               or_(S.end_at.is_(None), S.end_at > start))
+    )).all()
+    for sched, mname, dosage in future:
+        grace = timedelta(minutes=sched.grace_minutes)
+        for at in slots(sched, max(start, sched.materialized_until), end):
+            out.append({
+                "id": None, "patient_id": patient_id, "patient_name": None, "ward": None,
+                "medication_id": sched.medication_id, "medication": mname, "dosage": dosage,
+                "schedule_id": sched.id, "scheduled_at": at, "late_at": at + grace,
+                "status": "scheduled", "taken_at": None,
+            })
+    out.sort(key=lambda d: (d["scheduled_at"], d["schedule_id"]))
+    return out
+
+
+async def record(db, event: models.DoseEvent, status: str, taken_at: Optional[datetime], now: datetime) -> None:
+    if status not in ("taken", "skipped"):
+        raise HTTPException(400, 'status must be "taken" or "skipped"')
+    event.status = status
+    event.taken_at = (taken_at or now) if status == "taken" else None
+    await db.commit()
+
+
+def _percent(taken: int, skipped: int, missed: int) -> Optional[float]:
+    counted = taken + skipped + missed
+    return round(100.0 * taken / counted, 1) if counted else None
+
+
+async def adherence(db, start: datetime, now: datetime, patient_id: Optional[int] = None,
+                    ward: Optional[str] = None, cohort: Optional[str] = None,
+                    by_medication: bool = False) -> dict:
+    """Taken / (taken + skipped + missed) over doses scheduled in [start, now).
+
+    Pending doses past their grace period count as missed; ones still
+    within it are reported but not counted.
+    """
+    E, P = models.DoseEvent, models.Patient
+    missed = or_(E.status == "missed", and_(E.status == "pending", E.late_at < now))
+    waiting = and_(E.status == "pending", E.late_at >= now)
+    group = [E.patient_id, E.medication_id] if by_medication else [E.patient_id]
+    stmt = (
+        select(
+            *group,
+            func.sum(case((E.status == "taken", 1), else_=0)),
+            func.sum(case((E.status == "skipped", 1), else_=0)),
+            func.sum(case((missed, 1), else_=0)),
+            func.sum(case((waiting, 1), else_=0)),
+        )
+        .where(E.scheduled_at >= start, E.scheduled_at < now)
+        .group_by(*group)
+        .order_by(*group)
+    )
+    if patient_id is not None:
+        stmt = stmt.where(E.patient_id == patient_id)
+    if ward is not None or cohort is not None:
+        stmt = stmt.join(P, P.id == E.patient_id)
+        if ward is not None:
+            stmt = stmt.where(P.ward == ward)
+        if cohort is not None:
+            stmt = stmt.where(P.cohort == cohort)
+
+    entries = []
+    totals = [0, 0, 0, 0]
+    for row in (await db.execute(stmt)).all():
+        keys, counts = row[:len(group)], [int(c or 0) for c in row[len(group):]]
+        entry = {"patient_id": keys[0]}
+        if by_medication:
+            entry["medication_id"] = keys[1]
+        taken, skipped, missed_n, pending = counts
+        entry.update(taken=taken, skipped=skipped, missed=missed_n, pending=pending,
+                     adherence_percent=_percent(taken, skipped, missed_n))
+        entries.append(entry)
+        totals = [a + b for a, b in zip(totals, counts)]
+
+    taken, skipped, missed_n, pending = totals
+    return {
+        "start": start,
+        "end": now,
+        "taken": taken,
+        "skipped": skipped,
+        "missed": missed_n,
+        "pending": pending,
+        "adherence_percent": _percent(taken, skipped, missed_n),
+        "entries": entries,
+    }
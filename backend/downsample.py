@@ -0,0 +1,120 @@
+# backend/downsample.py
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+
+from backend import archive, models
+
+METHODS = ("minmax", "mean", "lttb")
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+
+# kind -> (model, value columns); the first column drives LTTB selection.
+SERIES: Dict[str, Tuple[type, Tuple[str, ...]]] = {
+    "readings": (models.Reading, ("value_mgdl",)),
+    "heartrate": (models.HeartRate, ("bpm",)),
+    "bloodpressure": (models.BloodPressure, ("systolic", "diastolic")),
+}
+
+
+def _iso(ts: np.ndarray) -> List[str]:
+    return np.datetime_as_string(ts.astype("datetime64[s]"), unit="s").tolist()
+
+
+def _round(a: np.ndarray) -> List[float]:
+    return np.round(a.astype(np.float64), 1).tolist()
+
+
+def bucketize(t: np.ndarray, values: Dict[str, np.ndarray], start: np.datetime64,
+              end: np.datetime64, points: int) -> dict:
+    """Fixed-width time buckets with count/mean/min/max per value column.
+
+    `t` must be sorted ascending. Empty buckets are left out, so the result
+    never has more than `points` entries.
+    """
+    width = max((end - start) / points, np.timedelta64(1, "us"))
+    idx = np.minimum(((t - start) // width).astype(np.int64), points - 1)
+    # idx is non-decreasing: each bucket is a contiguous run of samples.
+    firsts = np.flatnonzero(np.r_[True, idx[1:] != idx[:-1]])
+    counts = np.diff(np.r_[firsts, t.size])
+    out = {
+        "bucket_seconds": float(width / np.timedelta64(1, "s")),
+        "timestamp": _iso(start + idx[firsts] * width),
+        "n": counts.tolist(),
+    }
+    for name, v in values.items():
+        out[f"{name}_mean"] = _round(np.add.reduceat(v, firsts) / counts)
+        out[f"{name}_min"] = _round(np.minimum.reduceat(v, firsts))
+        out[f"{name}_max"] = _round(np.maximum.reduceat(v, firsts))
+    return out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `points` samples that keep
+    the visual shape of (x, y). Each bucket is scored with one vector op."""
+    n = x.size
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    chosen = np.empty(points, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        nhi = max(nhi, nlo + 1)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        chosen[i + 1] = a
+    return chosen
+
+
+async def series(db, kind: str, patient_id: int, start: datetime, end: datetime,
+                 points: int = DEFAULT_POINTS, method: str = "minmax") -> dict:
+    """Bounded-size series of one patient's readings/heart rate/blood pressure.
+
+    Fetches the window as plain (timestamp, value...) tuples and reduces it
+    with NumPy, so the payload is at most `points` entries whatever the
+    history length.
+    """
+    model, fields = SERIES[kind]
+    # Timestamps skip SQLAlchemy's per-row datetime parsing: SQLite hands
+    # back ISO text, which NumPy converts in one vectorised call.
+    stmt = (
+        select(type_coerce(model.timestamp, String), *(getattr(model, f) for f in fields))
+        .where(model.patient_id == patient_id, model.timestamp >= start, model.timestamp < end)
+        .order_by(model.timestamp)
+    )
+    rows = (await db.execute(stmt)).all()
+
+    cols = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+    t = np.array(cols[0], dtype="datetime64[us]")
+    values = {f: np.array(c, dtype=np.float64) for f, c in zip(fields, cols[1:])}
+
+    # Older samples may have moved to the archive; it's cheap to ask.
+    cold_t, cold_values = archive.series(kind, patient_id, start, end, fields)
+    if cold_t.size:
+        t = np.concatenate([cold_t, t])
+        values = {f: np.concatenate([cold_values[f], v]) for f, v in values.items()}
+        order = np.argsort(t, kind="stable")
+        t, values = t[order], {f: v[order] for f, v in values.items()}
+
+    n = int(t.size)
+    out = {"kind": kind, "patient_id": patient_id, "start": start, "end": end, "raw_count": n}
+    if n <= points:
+        return {**out, "method": "raw", "count": n, "timestamp": _iso(t),
+                **{f: _round(v) for f, v in values.items()}}
+
+    if method == "lttb":
+        x = (t - t[0]) / np.timedelta64(1, "s")
+        keep = lttb_indices(x, values[fields[0]], points)
+        return {**out, "method": method, "count": int(keep.size), "timestamp": _iso(t[keep]),
+                **{f: _round(v[keep]) for f, v in values.items()}}
+
+    b = bucketize(t, values, np.datetime64(start, "us"), np.datetime64(end, "us"), points)
+    if method == "mean":
+        b = {k: v for k, v in b.items() if not k.endswith(("_min", "_max"))}
+    return {**out, "method": method, "count": len(b["n"]), **b}
@@ -0,0 +1,141 @@
+# backend/events.py
+import asyncio
+import os
+from typing import Any, Callable, Iterable, Optional, Set
+
+from backend.serialization import dumps
+
+# Events buffered per subscriber before the oldest are dropped.
+QUEUE_SIZE = int(os.getenv("CAREPLUS_EVENTS_QUEUE_SIZE", "256"))
+# A subscriber that has dropped this many events in a row is disconnected.
+MAX_DROPPED = int(os.getenv("CAREPLUS_EVENTS_MAX_DROPPED", str(QUEUE_SIZE * 8)))
+# Idle connections get a keep-alive after this many seconds.
+HEARTBEAT_S = float(os.getenv("CAREPLUS_EVENTS_HEARTBEAT_S", "15"))
+
+
+class Event:
+    __slots__ = ("type", "patient_id", "ward", "data", "_json")
+
+    def __init__(self, type: str, patient_id: int, ward: Optional[str], data: Any,
+                 encoded: Optional[str] = None):
+        self.type = type
+        self.patient_id = patient_id
+        self.ward = ward
+        self.data = data
+        # Events relayed from another worker arrive already encoded.
+        self._json: Optional[str] = encoded
+
+    @property
+    def json(self) -> str:
+        # Encoded once, however many subscribers receive it, and the same
+        # way as the REST responses.
+        if self._json is None:
+            self._json = dumps({
+                "type": self.type,
+                "patient_id": self.patient_id,
+                "ward": self.ward,
+                "data": self.data,
+            }).decode()
+        return self._json
+
+
+class Subscription:
+    def __init__(self, patient_ids: Iterable[int] = (), wards: Iterable[str] = (),
+                 maxsize: int = QUEUE_SIZE):
+        self.patient_ids: Set[int] = set(patient_ids)
+        self.wards: Set[str] = set(wards)
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize)
+        self.dropped = 0  # since the last lag notice
+        self.closed = False
+
+    def matches(self, event: Event) -> bool:
+        if not self.patient_ids and not self.wards:
+            return True
+        return event.patient_id in self.patient_ids or (
+            event.ward is not None and event.ward in self.wards
+        )
+
+    def offer(self, event: Event) -> None:
+        """Enqueue without blocking; a full queue sheds its oldest event."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped >= MAX_DROPPED:
+                self.closed = True
+        self.queue.put_nowait(event)
+
+    def lag_notice(self) -> Optional[str]:
+        if not self.dropped:
+            return None
+        notice = dumps({"type": "lagged", "dropped": self.dropped}).decode()
+        self.dropped = 0
+        return notice
+
+    async def next(self, timeout: float = HEARTBEAT_S) -> Optional[Event]:
+        """Next event, or None if nothing arrived within `timeout`."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """In-process fan-out of committed readings, vitals and alerts.
+
+    publish() never blocks the request that produced the event: each
+    subscriber has its own bounded queue and slow consumers lose their
+    oldest events (and are told so) instead of holding up writers.
+    Must be called from the event loop thread.
+
+    With several workers, backend.bus sets `relay` so every published event
+    also reaches subscribers connected to the other workers.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[Subscription] = set()
+        self.relay: Optional[Callable[[Event], None]] = None
+
+    def subscribe(self, patient_ids: Iterable[int] = (), wards: Iterable[str] = ()) -> Subscription:
+        sub = Subscription(patient_ids, wards)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self.subscribers.discard(sub)
+
+    def publish(self, type: str, patient_id: int, ward: Optional[str], data: Any) -> None:
+        if not self.subscribers and self.relay is None:
+            return
+        event = Event(type, patient_id, ward, data)
+        self.deliver(event)
+        if self.relay is not None:
+            self.relay(event)
+
+    def deliver(self, event: Event) -> None:
+        """Hand an event to this process's subscribers only."""
+        for sub in list(self.subscribers):
+            if sub.matches(event):
+                sub.offer(event)
+
+    def publish_alerts(self, alert_rows: Iterable[dict], wards: dict) -> None:
+        for a in alert_rows:
+            self.publish("alert", a["patient_id"], wards.get(a["patient_id"]), a)
+
+    def publish_batch(self, rows: Iterable[dict], alert_rows: Iterable[dict], wards: dict) -> None:
+        """One "readings" event per patient for a bulk insert, then its alerts."""
+        if not self.subscribers and self.relay is None:
+            return
+        per_patient: dict = {}
+        for r in rows:
+            per_patient.setdefault(r["patient_id"], []).append(r)
+        for pid, items in per_patient.items():
+            self.publish("readings", pid, wards.get(pid), items)
+        self.publish_alerts(alert_rows, wards)
+
+
+def row_dict(obj) -> dict:
+    """Column values of an ORM instance, for event payloads."""
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+broker = EventBroker()
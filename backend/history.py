@@ -0,0 +1,83 @@
+# backend/history.py
+import base64
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, or_
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+async def page(
+    db,
+    stmt: Select,
+    model,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    cold: Optional[Callable] = None,
+) -> Tuple[List, Optional[str]]:
+    """Newest-first keyset page of a per-patient history query.
+
+    `stmt` selects plain columns (including timestamp and id), not
+    entities, so rows come back as tuples.
+
+    Rows are ordered by (timestamp, id) descending, which the composite
+    (patient_id, timestamp) indexes serve directly, so the cost of a page
+    does not depend on how much history sits behind it. Returns the rows
+    and, when more remain, the cursor for the next page (sent to clients in
+    the X-Next-Cursor header).
+
+    `cold(names, since, until, cursor, n, newer_than)` optionally supplies
+    rows from outside the database (the archive) under the same window and
+    cursor, as tuples in the select's column order; the two sources are
+    merged on (timestamp, id).
+    """
+    ts, pk = model.timestamp, model.id
+    decoded = decode_cursor(cursor) if cursor else None
+    if since is not None:
+        stmt = stmt.where(ts >= since)
+    if until is not None:
+        stmt = stmt.where(ts < until)
+    if decoded:
+        c_ts, c_id = decoded
+        stmt = stmt.where(or_(ts < c_ts, and_(ts == c_ts, pk < c_id)))
+
+    stmt = stmt.order_by(ts.desc(), pk.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    names = [c.key for c in stmt.selected_columns]
+    ts_i, id_i = names.index("timestamp"), names.index("id")
+    if cold is not None:
+        newer_than = rows[-1][ts_i] if len(rows) > limit else None
+        extra = await run_in_threadpool(cold, names, since, until, decoded, limit + 1, newer_than)
+        if extra:
+            # Keyed by id: a row caught mid-archive may briefly be in both.
+            merged = {r[id_i]: r for r in (*extra, *rows)}
+            rows = sorted(merged.values(), key=lambda r: (r[ts_i], r[id_i]), reverse=True)
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(last[ts_i], last[id_i])
+    return rows, None
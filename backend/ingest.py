@@ -0,0 +1,319 @@
+# backend/ingest.py
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from backend import models, schemas, rollups
+from backend.cache import invalidate_patient
+from backend.alerts import alert_engine
+from backend.timeutil import to_utc
+
+# Anything outside this range is a sensor fault, not a glucose value.
+MIN_PLAUSIBLE_MGDL = 10.0
+MAX_PLAUSIBLE_MGDL = 1000.0
+
+# NDJSON uploads are flushed to the database in chunks of this many lines.
+STREAM_CHUNK_SIZE = 5000
+
+# Binary record uploads larger than this are refused with 413.
+MAX_RECORDS = int(os.getenv("CAREPLUS_INGEST_MAX_RECORDS", "100000"))
+
+
+def _error_text(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors()
+    )
+
+
+def _parse_item(item: Any) -> schemas.ReadingCreate:
+    if not isinstance(item, dict):
+        raise ValueError("item must be a JSON object")
+    r = schemas.ReadingCreate(**item)
+    if not math.isfinite(r.value_mgdl) or not (
+        MIN_PLAUSIBLE_MGDL <= r.value_mgdl <= MAX_PLAUSIBLE_MGDL
+    ):
+        raise ValueError(f"implausible glucose value {r.value_mgdl}")
+    return r
+
+
+def parse_ndjson_line(line: bytes) -> Any:
+    """Decode one NDJSON line; undecodable lines come back as the error."""
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"invalid JSON: {exc}")
+
+
+def ingest_readings(db: Session, items: Iterable[Any], offset: int = 0) -> Dict[str, Any]:
+    """Validate, rule-check and bulk insert a batch of reading payloads.
+
+    Each patient is looked up once, all samples go through the streaming
+    alert engine in a single pass, and readings, rollups and
+    alerts are written with one executemany each. The caller owns the
+    commit.
+    """
+    results: List[Dict[str, Any]] = []
+    valid: List[Tuple[int, schemas.ReadingCreate]] = []
+
+    for i, item in enumerate(items, start=offset):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            valid.append((i, _parse_item(item)))
+        except ValidationError as exc:
+            results.append({"index": i, "status": "rejected", "error": _error_text(exc)})
+        except (TypeError, ValueError) as exc:
+            results.append({"index": i, "status": "rejected", "error": str(exc)})
+
+    patient_ids = {r.patient_id for _, r in valid}
+    targets, wards = {}, {}
+    if patient_ids:
+        for pid, target, ward in (
+            db.query(models.Patient.id, models.Patient.target, models.Patient.ward)
+            .filter(models.Patient.id.in_(patient_ids))
+        ):
+            targets[pid], wards[pid] = target, ward
+
+    now = datetime.utcnow()
+    rows: List[dict] = []
+    row_index: List[int] = []
+    for i, r in valid:
+        if r.patient_id not in targets:
+            results.append({"index": i, "status": "rejected", "error": "Patient not found"})
+            continue
+        rows.append({
+            "patient_id": r.patient_id,
+            "timestamp": to_utc(r.timestamp) or now,
+            "value_mgdl": r.value_mgdl,
+            "context": r.context,
+            "notes": r.notes,
+        })
+        row_index.append(i)
+
+    alert_rows: List[dict] = []
+    if rows:
+        # Plain executemany on the Table. Asking for RETURNING ids in
+        # parameter order makes SQLAlchemy fall back to one statement per
+        # row on SQLite, so accepted items are reported without their ids.
+        db.execute(insert(models.Reading.__table__), rows)
+        rollups.apply(db, rows)
+        results.extend({"index": i, "status": "accepted"} for i in row_index)
+
+        alert_rows = alert_engine.readings(targets, rows)
+        if alert_rows:
+            db.execute(insert(models.Alert.__table__), alert_rows)
+
+    results.sort(key=lambda x: x["index"])
+    return {
+        "accepted": len(rows),
+        "rejected": len(results) - len(rows),
+        "alerts": len(alert_rows),
+        "results": results,
+        # Not part of the response; used to publish the committed batch.
+        "rows": rows,
+        "alert_rows": alert_rows,
+        "wards": wards,
+    }
+
+
+def empty_result() -> Dict[str, Any]:
+    return {"accepted": 0, "rejected": 0, "alerts": 0, "results": [],
+            "rows": [], "alert_rows": [], "wards": {}}
+
+
+def merge_results(total: Dict[str, Any], part: Dict[str, Any]) -> Dict[str, Any]:
+    total["accepted"] += part["accepted"]
+    total["rejected"] += part["rejected"]
+    total["alerts"] += part["alerts"]
+    total["results"].extend(part["results"])
+    total["rows"].extend(part["rows"])
+    total["alert_rows"].extend(part["alert_rows"])
+    total["wards"].update(part["wards"])
+    return total
+
+
+def invalidate(result: Dict[str, Any]) -> None:
+    """Drop cached reads made stale by a committed batch."""
+    touched: Dict[int, set] = {}
+    for pid in {r["patient_id"] for r in result["rows"]}:
+        touched.setdefault(pid, set()).add("readings")
+    for kind, rows in result.get("vitals", {}).items():
+        for pid in {r["patient_id"] for r in rows}:
+            touched.setdefault(pid, set()).add(VITALS[kind][1])
+    for pid in {a["patient_id"] for a in result["alert_rows"]}:
+        touched.setdefault(pid, set()).add("alerts")
+    for pid, kinds in touched.items():
+        invalidate_patient(pid, *kinds)
+
+
+# ---------------- BINARY RECORDS -------------------
+# application/vnd.careplus.records: a bare sequence of 24-byte little-endian
+# records, no header or framing. kind 0 is glucose (v1 = mg/dL, context
+# from CONTEXTS), 1 heart rate (v1 = bpm), 2 blood pressure (v1/v2 =
+# systolic/diastolic). ts_ms 0 means "now"; reserved must be 0.
+RECORDS_MEDIA_TYPE = "application/vnd.careplus.records"
+RECORD = np.dtype([
+    ("patient_id", "<u4"),
+    ("ts_ms", "<i8"),
+    ("kind", "u1"),
+    ("context", "u1"),
+    ("reserved", "<u2"),
+    ("v1", "<f4"),
+    ("v2", "<f4"),
+])
+KIND_GLUCOSE, KIND_HEART_RATE, KIND_BLOOD_PRESSURE = 0, 1, 2
+CONTEXTS = ("random", "fasting", "post_meal")
+# kind -> (table, cache kind)
+VITALS = {
+    "heart_rate": (models.HeartRate.__table__, "heartrate"),
+    "blood_pressure": (models.BloodPressure.__table__, "bloodpressure"),
+}
+# Sensor-fault bounds for vitals, like MIN/MAX_PLAUSIBLE_MGDL for glucose.
+PLAUSIBLE_BPM = (20, 300)
+PLAUSIBLE_SYSTOLIC = (40, 300)
+PLAUSIBLE_DIASTOLIC = (20, 200)
+# Timestamps further ahead of the server clock than this are rejected.
+MAX_CLOCK_SKEW_MS = 24 * 3600 * 1000
+
+# Rejection reasons; the first failing check is reported.
+RECORD_ERRORS = (
+    None,
+    "unknown kind",
+    "reserved bytes must be zero",
+    "timestamp out of range",
+    "unknown context",
+    "implausible glucose value",
+    "implausible heart rate",
+    "implausible blood pressure",
+    "Patient not found",
+)
+
+
+def parse_records(body: bytes) -> np.ndarray:
+    """View an upload as a record array; no copy is made."""
+    if len(body) % RECORD.itemsize:
+        raise HTTPException(400, f"body is not a whole number of {RECORD.itemsize}-byte records")
+    if len(body) // RECORD.itemsize > MAX_RECORDS:
+        raise HTTPException(413, f"at most {MAX_RECORDS} records per upload")
+    return np.frombuffer(body, dtype=RECORD)
+
+
+def encode_records(records: Iterable[tuple]) -> bytes:
+    """(patient_id, ts_ms, kind, context, v1, v2) tuples -> upload body."""
+    rows = [(pid, ts, kind, ctx, 0, v1, v2) for pid, ts, kind, ctx, v1, v2 in records]
+    return np.array(rows, dtype=RECORD).tobytes()
+
+
+def _between(values: np.ndarray, bounds: Tuple[float, float]) -> np.ndarray:
+    # NaN compares false, so non-finite values fail too.
+    return (values >= bounds[0]) & (values <= bounds[1])
+
+
+def check_records(recs: np.ndarray, now_ms: int) -> np.ndarray:
+    """Reason code per record (index into RECORD_ERRORS; 0 = valid), in
+    one vectorized pass. Patients are checked by the caller."""
+    kind, v1, v2 = recs["kind"], recs["v1"], recs["v2"]
+    glucose = kind == KIND_GLUCOSE
+    heart = kind == KIND_HEART_RATE
+    pressure = kind == KIND_BLOOD_PRESSURE
+    checks = (
+        ~(glucose | heart | pressure),
+        recs["reserved"] != 0,
+        (recs["ts_ms"] < 0) | (recs["ts_ms"] > now_ms + MAX_CLOCK_SKEW_MS),
+        glucose & (recs["context"] >= len(CONTEXTS)),
+        glucose & ~_between(v1, (MIN_PLAUSIBLE_MGDL, MAX_PLAUSIBLE_MGDL)),
+        heart & ~_between(v1, PLAUSIBLE_BPM),
+        pressure & ~(_between(v1, PLAUSIBLE_SYSTOLIC) & _between(v2, PLAUSIBLE_DIASTOLIC) & (v1 > v2)),
+    )
+    reason = np.zeros(len(recs), dtype=np.uint8)
+    for code, failed in reversed(list(enumerate(checks, start=1))):
+        reason[failed] = code
+    return reason
+
+
+def ingest_records(db: Session, recs: np.ndarray) -> Dict[str, Any]:
+    """Validate and bulk insert a binary upload of mixed readings and vitals.
+
+    Same contract as ingest_readings (one executemany per table, alerts in
+    one pass, caller commits), but only rejected records are listed in
+    `results`: the point of the format is a small response as well.
+    """
+    now = datetime.utcnow()
+    now_ms = int((now - datetime(1970, 1, 1)).total_seconds() * 1000)
+    reason = check_records(recs, now_ms)
+
+    patient_ids = np.unique(recs["patient_id"][reason == 0]).tolist()
+    targets, wards = {}, {}
+    if patient_ids:
+        for pid, target, ward in (
+            db.query(models.Patient.id, models.Patient.target, models.Patient.ward)
+            .filter(models.Patient.id.in_(patient_ids))
+        ):
+            targets[pid], wards[pid] = target, ward
+    missing = ~np.isin(recs["patient_id"], np.fromiter(targets, dtype=np.int64, count=len(targets)))
+    reason[(reason == 0) & missing] = RECORD_ERRORS.index("Patient not found")
+
+    ok = reason == 0
+    ts_ms = np.where(recs["ts_ms"] == 0, now_ms, recs["ts_ms"])
+    timestamps = ts_ms.astype("datetime64[ms]")
+
+    def select(kind: int):
+        m = ok & (recs["kind"] == kind)
+        return recs[m], timestamps[m].tolist()
+
+    sel, ts = select(KIND_GLUCOSE)
+    rows = [
+        {"patient_id": pid, "timestamp": t, "value_mgdl": round(v, 1), "context": CONTEXTS[c], "notes": None}
+        for pid, t, v, c in zip(sel["patient_id"].tolist(), ts, sel["v1"].tolist(), sel["context"].tolist())
+    ]
+    sel, ts = select(KIND_HEART_RATE)
+    heart_rate = [
+        {"patient_id": pid, "bpm": bpm, "timestamp": t}
+        for pid, bpm, t in zip(sel["patient_id"].tolist(), np.rint(sel["v1"]).astype(int).tolist(), ts)
+    ]
+    sel, ts = select(KIND_BLOOD_PRESSURE)
+    blood_pressure = [
+        {"patient_id": pid, "systolic": s, "diastolic": d, "timestamp": t}
+        for pid, s, d, t in zip(sel["patient_id"].tolist(), np.rint(sel["v1"]).astype(int).tolist(),
+                                np.rint(sel["v2"]).astype(int).tolist(), ts)
+    ]
+
+    alert_rows: List[dict] = []
+    if rows:
+        db.execute(insert(models.Reading.__table__), rows)
+        rollups.apply(db, rows)
+        alert_rows = alert_engine.readings(targets, rows)
+    for r in heart_rate:
+        alert_rows.extend(alert_engine.heart_rate(r["patient_id"], r["bpm"], r["timestamp"]))
+    for r in blood_pressure:
+        alert_rows.extend(alert_engine.blood_pressure(r["patient_id"], r["systolic"], r["diastolic"], r["timestamp"]))
+    vitals = {"heart_rate": heart_rate, "blood_pressure": blood_pressure}
+    for kind, vrows in vitals.items():
+        if vrows:
+            db.execute(insert(VITALS[kind][0]), vrows)
+    if alert_rows:
+        db.execute(insert(models.Alert.__table__), alert_rows)
+
+    rejected = np.flatnonzero(reason)
+    accepted = len(recs) - len(rejected)
+    return {
+        "accepted": accepted,
+        "rejected": len(rejected),
+        "alerts": len(alert_rows),
+        "results": [
+            {"index": i, "status": "rejected", "error": RECORD_ERRORS[code]}
+            for i, code in zip(rejected.tolist(), reason[rejected].tolist())
+        ],
+        "rows": rows,
+        "vitals": vitals,
+        "alert_rows": alert_rows,
+        "wards": wards,
+    }
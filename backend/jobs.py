@@ -0,0 +1,60 @@
+# backend/jobs.py
+"""Background job loops started from the app lifespan.
+
+A job is a blocking function of the time it was due, run in the
+threadpool. A schedule maps "now" to the next due time: every() for
+interval jobs, daily() for a fixed UTC time of day. A failed run is logged
+and the loop carries on with the next one.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+Schedule = Callable[[datetime], datetime]
+
+
+def every(seconds: float) -> Schedule:
+    """Due straight away, then `seconds` after each run finishes."""
+    started = False
+
+    def next_at(now: datetime) -> datetime:
+        nonlocal started
+        if not started:
+            started = True
+            return now
+        return now + timedelta(seconds=seconds)
+
+    return next_at
+
+
+def daily(at: str) -> Schedule:
+    """Due at `at` ("HH:MM", UTC) every day."""
+    hour, minute = (int(x) for x in at.split(":"))
+
+    def next_at(now: datetime) -> datetime:
+        when = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return when if when > now else when + timedelta(days=1)
+
+    return next_at
+
+
+async def loop(log: logging.Logger, name: str, job: Callable[[datetime], Any], schedule: Schedule,
+               done: Optional[Callable[[Any, float], None]] = None) -> None:
+    """Run `job(due)` whenever `schedule` says, forever. `done(result,
+    seconds)` runs on the event loop after each successful run."""
+    while True:
+        now = datetime.utcnow()
+        due = schedule(now)
+        if due > now:
+            await asyncio.sleep((due - now).total_seconds())
+        t0 = time.perf_counter()
+        try:
+            result = await run_in_threadpool(job, due)
+            if done is not None:
+                done(result, time.perf_counter() - t0)
+        except Exception:
+            log.exception("%s failed", name)
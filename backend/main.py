@@ -1,14 +1,83 @@
 # backend/main.py
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from fastapi import FastAPI, Depends, HTTPException, Path, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
-from sqlalchemy.orm import Session
-from typing import List
-
-from backend.db import Base, engine, get_db
-from backend import models, schemas, rules
-
-app = FastAPI(title="Care+ API", version="1.0")
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Set
+
+from backend.db import SessionLocal, engine, get_db, warm_pools
+from backend.history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from backend import models, schemas, ingest, history, rollups, downsample, metrics, dashboard, archive, writer, doses, migrations, risk
+from backend.search import WARM_ON_STARTUP as WARM_SEARCH, age_bounds, patient_index
+from backend.alerts import alert_engine
+from backend.bus import bus
+from backend.events import broker, row_dict
+from backend.cache import cache, cached, invalidate_patient, patient_tag, PATIENT_LIST_TAG
+from backend.serialization import dumps, encode_rows, schema_columns
+from backend.timeutil import to_utc
+
+log = logging.getLogger("careplus.app")
+
+# Fire-and-forget tasks. The event loop only keeps weak references, so they
+# are held here until they finish; a failure is logged instead of lost.
+_background: Set[asyncio.Task] = set()
+
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_reap)
+    return task
+
+
+def _reap(task: asyncio.Task) -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.error("background task failed", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema first: nothing below may touch a table that isn't there yet.
+    if migrations.ON_STARTUP == "upgrade":
+        await run_in_threadpool(migrations.migrate, engine)
+    elif migrations.ON_STARTUP == "check":
+        await run_in_threadpool(migrations.check, engine)
+    await warm_pools()
+    await bus.start()
+    if WARM_SEARCH:
+        # In the background: the first search waits for it, nothing else does.
+        spawn(patient_index.ensure_fresh(SessionLocal))
+
+    retention = None
+    if archive.RETENTION_DAYS:
+        retention = asyncio.create_task(archive.retention_loop(SessionLocal))
+    dose_sweeper = None
+    if doses.SWEEP_INTERVAL_S:
+        dose_sweeper = asyncio.create_task(doses.dose_loop(SessionLocal))
+    risk_nightly = None
+    if risk.RUN_AT:
+        risk_nightly = asyncio.create_task(risk.risk_loop(SessionLocal))
+    if writer.MODE == "queued":
+        writer.write_queue.start()
+    yield
+    # Drain queued samples before the engine goes away, and tell the other
+    # workers about them before the bus does.
+    await writer.write_queue.stop()
+    await bus.stop()
+    for task in (retention, dose_sweeper, risk_nightly, *_background):
+        if task is not None:
+            task.cancel()
+
+
+app = FastAPI(title="Care+ API", version="1.0", lifespan=lifespan)
 
 # ---------------- CORS MIDDLEWARE ----------------
 app.add_middleware(
@@ -17,10 +86,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+FORMAT_QUERY = Query("rows", pattern="^(rows|columnar)$")
+QUEUED_RESPONSES = {202: {"model": schemas.IngestStatusOut, "description": "Queued for write-behind"}}
+
+
+async def select_encoded(db, model, schema, stmt_filter=None, order_by=None, format="rows") -> bytes:
+    """Run a column-tuple SELECT for `schema` and encode it straight to JSON."""
+    cols = schema_columns(model, schema)
+    stmt = select(*cols)
+    if stmt_filter is not None:
+        stmt = stmt.where(stmt_filter)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    rows = (await db.execute(stmt)).all()
+    return encode_rows(list(schema.model_fields), rows, format)
+
 
-# ---------------- CREATE TABLES ------------------
-Base.metadata.create_all(bind=engine)
+async def history_response(request, db, model, schema, kind, patient_id, since, until, limit, cursor, format):
+    """Cached, ETag-aware keyset page of one patient's history table."""
+    since, until = to_utc(since), to_utc(until)
+
+    async def produce():
+        stmt = select(*schema_columns(model, schema)).where(model.patient_id == patient_id)
+        cold = partial(archive.page, kind, patient_id) if kind in archive.KINDS else None
+        rows, next_cursor = await history.page(db, stmt, model, since, until, limit, cursor, cold)
+        body = encode_rows(list(schema.model_fields), rows, format)
+        return body, ({NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {})
+
+    tags = (patient_tag(patient_id), patient_tag(patient_id, kind))
+    return await cached(request, tags, produce)
+
+
+async def enqueue(kind, row, alert_rows, ward) -> Response:
+    """Hand a validated sample to the write-behind queue; 202 with its ingest id."""
+    try:
+        ingest_id = await writer.write_queue.submit(kind, row, alert_rows, ward)
+    except writer.QueueFull as exc:
+        raise HTTPException(503, str(exc), headers={"Retry-After": "1"})
+    except writer.WriteFailed as exc:
+        raise HTTPException(503, str(exc))
+    return Response(dumps(writer.status(ingest_id)), status_code=202, media_type="application/json")
+
+
+async def queued_patient(db, patient_id):
+    meta = await writer.patient_meta.get(db, patient_id)
+    if meta is None:
+        raise HTTPException(404, "Patient not found")
+    return meta
 
 
 # ---------------- HEALTH CHECK -------------------
@@ -31,10 +147,12 @@ def health():
 
 # ---------------- PATIENT CRUD -------------------
 @app.post("/patients", response_model=schemas.PatientOut)
-def create_patient(payload: schemas.PatientCreate, db: Session = Depends(get_db)):
+async def create_patient(payload: schemas.PatientCreate, db: AsyncSession = Depends(get_db)):
     p = models.Patient(
         name=payload.name,
         diabetes_type=payload.diabetes_type,
+        ward=payload.ward,
+        cohort=payload.cohort,
         date_of_birth=payload.date_of_birth,
         blood_pressure=payload.blood_pressure,
         heart_rate=payload.heart_rate,
@@ -43,137 +161,466 @@ def create_patient(payload: schemas.PatientCreate, db: Session = Depends(get_db)
         emergency=payload.emergency,
     )
     db.add(p)
-    db.commit()
-    db.refresh(p)
+    await db.commit()
+    await db.refresh(p)
+    patient_index.add(p)
+    cache.invalidate(PATIENT_LIST_TAG)
     return p
 
 
 @app.get("/patients", response_model=List[schemas.PatientOut])
-def list_patients(db: Session = Depends(get_db)):
-    return db.query(models.Patient).order_by(models.Patient.id.desc()).all()
+async def list_patients(request: Request, format: str = FORMAT_QUERY, db: AsyncSession = Depends(get_db)):
+    async def produce():
+        body = await select_encoded(
+            db, models.Patient, schemas.PatientOut, order_by=models.Patient.id.desc(), format=format
+        )
+        return body, {}
+
+    return await cached(request, (PATIENT_LIST_TAG,), produce)
+
+
+@app.get("/patients/search", response_model=schemas.PatientSearchOut)
+async def search_patients(
+    q: str = "",
+    diabetes_type: Optional[str] = None,
+    age_min: Optional[int] = Query(None, ge=0, le=150),
+    age_max: Optional[int] = Query(None, ge=0, le=150),
+    alerts: Optional[str] = Query(None, pattern="^(open|high|none)$"),
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """Name search over the in-memory index: every word must match exactly,
+    as a prefix (the last word) or within one or two typos. Filters on
+    diabetes type, age (from date_of_birth) and open alerts ("open", "high"
+    or "none")."""
+    await patient_index.ensure_fresh(SessionLocal)
+
+    include = exclude = None
+    if alerts is not None:
+        A = models.Alert
+        stmt = select(A.patient_id).where(A.acknowledged_at.is_(None)).distinct()
+        if alerts == "high":
+            stmt = stmt.where(A.severity == "high")
+        flagged = (await db.execute(stmt)).scalars().all()
+        if alerts == "none":
+            exclude = flagged
+        else:
+            include = flagged
+
+    dob_min, dob_max = age_bounds(age_min, age_max, datetime.utcnow().date())
+    total, hits = patient_index.search(q, diabetes_type, dob_min, dob_max, include, exclude, limit, offset)
+
+    results = []
+    if hits:
+        cols = schema_columns(models.Patient, schemas.PatientOut)
+        names = list(schemas.PatientOut.model_fields)
+        rows = await db.execute(select(*cols).where(models.Patient.id.in_([pid for pid, _ in hits])))
+        by_id = {row[names.index("id")]: dict(zip(names, row)) for row in rows}
+        # A hit can be gone from the table if another process deleted it.
+        results = [{**by_id[pid], "score": score} for pid, score in hits if pid in by_id]
+    body = {"total": total, "limit": limit, "offset": offset, "results": results}
+    return Response(dumps(body), media_type="application/json")
 
 
 @app.get("/patients/{patient_id}", response_model=schemas.PatientOut)
-def get_patient(patient_id: int, db: Session = Depends(get_db)):
-    p = db.query(models.Patient).get(patient_id)
-    if not p:
-        raise HTTPException(404, "Patient not found")
-    return p
+async def get_patient(patient_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def produce():
+        p = await db.get(models.Patient, patient_id)
+        if not p:
+            raise HTTPException(404, "Patient not found")
+        return schemas.PatientOut.model_validate(p, from_attributes=True).model_dump_json().encode(), {}
+
+    tags = (patient_tag(patient_id), patient_tag(patient_id, "profile"))
+    return await cached(request, tags, produce)
 
 
 @app.put("/patients/{patient_id}", response_model=schemas.PatientOut)
-def update_patient(patient_id: int, payload: schemas.PatientCreate, db: Session = Depends(get_db)):
-    patient = db.query(models.Patient).get(patient_id)
+async def update_patient(patient_id: int, payload: schemas.PatientCreate, db: AsyncSession = Depends(get_db)):
+    patient = await db.get(models.Patient, patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
 
     for key, value in payload.dict().items():
         setattr(patient, key, value)
 
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
+    await db.refresh(patient)
+    patient_index.add(patient)
+    writer.patient_meta.forget(patient_id)
+    cache.invalidate(PATIENT_LIST_TAG)
+    invalidate_patient(patient_id, "profile")
     return patient
 
 
 @app.delete("/patients/{patient_id}")
-def delete_patient(patient_id: int, db: Session = Depends(get_db)):
-    patient = db.query(models.Patient).get(patient_id)
+async def delete_patient(patient_id: int, db: AsyncSession = Depends(get_db)):
+    patient = await db.get(models.Patient, patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
 
-    db.delete(patient)
-    db.commit()
+    await db.run_sync(doses.delete_for, None, patient_id)
+    await db.delete(patient)
+    await db.commit()
+    alert_engine.forget(patient_id)
+    await run_in_threadpool(archive.forget, patient_id)
+    writer.patient_meta.forget(patient_id)
+    patient_index.remove(patient_id)
+    cache.invalidate(PATIENT_LIST_TAG)
+    invalidate_patient(patient_id)
     return {"detail": "Patient deleted"}
 
 
 # ---------------- READINGS -------------------
-@app.post("/readings", response_model=schemas.ReadingOut)
-def add_reading(payload: schemas.ReadingCreate, db: Session = Depends(get_db)):
-    patient = db.query(models.Patient).get(payload.patient_id)
+@app.post("/readings", response_model=schemas.ReadingOut, responses=QUEUED_RESPONSES)
+async def add_reading(payload: schemas.ReadingCreate, db: AsyncSession = Depends(get_db)):
+    if writer.enabled():
+        target, ward = await queued_patient(db, payload.patient_id)
+        row = {
+            "patient_id": payload.patient_id,
+            "timestamp": to_utc(payload.timestamp) or datetime.utcnow(),
+            "value_mgdl": payload.value_mgdl,
+            "context": payload.context,
+            "notes": payload.notes,
+        }
+        alert_rows = alert_engine.reading(
+            row["patient_id"], target, row["context"], row["value_mgdl"], row["timestamp"]
+        )
+        return await enqueue("reading", row, alert_rows, ward)
+
+    patient = await db.get(models.Patient, payload.patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
 
     r = models.Reading(
         patient_id=payload.patient_id,
+        timestamp=to_utc(payload.timestamp) or datetime.utcnow(),
         value_mgdl=payload.value_mgdl,
         context=payload.context,
         notes=payload.notes,
     )
     db.add(r)
+    await db.run_sync(rollups.apply, [{
+        "patient_id": r.patient_id, "timestamp": r.timestamp, "value_mgdl": r.value_mgdl,
+    }])
+
+    # Streaming alert engine (in-memory, no queries)
+    new_alerts = [
+        models.Alert(**a)
+        for a in alert_engine.reading(patient.id, patient.target, r.context, r.value_mgdl, r.timestamp)
+    ]
+    db.add_all(new_alerts)
+
+    await db.commit()
+    await db.refresh(r)
+    invalidate_patient(patient.id, "readings", *(["alerts"] if new_alerts else []))
+    broker.publish("reading", patient.id, patient.ward, row_dict(r))
+    broker.publish_alerts([row_dict(a) for a in new_alerts], {patient.id: patient.ward})
+    return r
 
-    # Rule-based alert engine
-    alerts_from_reading = rules.evaluate_reading(patient, r)
-    for a in alerts_from_reading:
-        db.add(a)
 
-    db.commit()
-    db.refresh(r)
-    return r
+@app.post("/readings/batch", response_model=schemas.ReadingBatchResult)
+async def add_readings_batch(payload: schemas.ReadingBatchCreate, db: AsyncSession = Depends(get_db)):
+    result = await db.run_sync(ingest.ingest_readings, payload.readings)
+    await db.commit()
+    ingest.invalidate(result)
+    broker.publish_batch(result["rows"], result["alert_rows"], result["wards"])
+    return result
+
+
+@app.post("/readings/stream", response_model=schemas.ReadingBatchResult)
+async def add_readings_stream(request: Request, db: AsyncSession = Depends(get_db)):
+    """NDJSON upload: one ReadingCreate object per line, one transaction."""
+    total = ingest.empty_result()
+    chunk: list = []
+    seen = 0
+    buf = b""
+
+    async for part in request.stream():
+        buf += part
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                chunk.append(ingest.parse_ndjson_line(line))
+        if len(chunk) >= ingest.STREAM_CHUNK_SIZE:
+            ingest.merge_results(total, await db.run_sync(ingest.ingest_readings, chunk, seen))
+            seen += len(chunk)
+            chunk = []
+
+    if buf.strip():
+        chunk.append(ingest.parse_ndjson_line(buf))
+    if chunk:
+        ingest.merge_results(total, await db.run_sync(ingest.ingest_readings, chunk, seen))
+
+    await db.commit()
+    ingest.invalidate(total)
+    broker.publish_batch(total["rows"], total["alert_rows"], total["wards"])
+    return total
+
+
+@app.post(
+    "/ingest/records",
+    response_model=schemas.ReadingBatchResult,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        ingest.RECORDS_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+    }}},
+)
+async def add_records(request: Request, db: AsyncSession = Depends(get_db)):
+    """Binary device upload of readings and vitals (layout: ingest.RECORD).
+    Only rejected records are listed in `results`."""
+    if request.headers.get("content-type", "").split(";")[0].strip() != ingest.RECORDS_MEDIA_TYPE:
+        raise HTTPException(415, f"Expected {ingest.RECORDS_MEDIA_TYPE}")
+    recs = ingest.parse_records(await request.body())
+    result = await db.run_sync(ingest.ingest_records, recs)
+    await db.commit()
+    ingest.invalidate(result)
+    broker.publish_batch(result["rows"], result["alert_rows"], result["wards"])
+    for kind, rows in result["vitals"].items():
+        for r in rows:
+            broker.publish(kind, r["patient_id"], result["wards"].get(r["patient_id"]), r)
+    return result
 
 
 @app.get("/patients/{patient_id}/readings", response_model=List[schemas.ReadingOut])
-def list_readings(patient_id: int, db: Session = Depends(get_db)):
-    return (
-        db.query(models.Reading)
-        .filter(models.Reading.patient_id == patient_id)
-        .order_by(models.Reading.timestamp.desc())
-        .all()
+async def list_readings(
+    patient_id: int,
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_db),
+):
+    return await history_response(
+        request, db, models.Reading, schemas.ReadingOut, "readings",
+        patient_id, since, until, limit, cursor, format,
     )
 
 
+@app.get("/patients/{patient_id}/glucose/summary", response_model=schemas.GlucoseSummaryOut)
+async def glucose_summary(
+    patient_id: int,
+    window: str = "14d",
+    source: str = Query("auto", pattern="^(auto|rollup|raw)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    if not await db.get(models.Patient, patient_id):
+        raise HTTPException(404, "Patient not found")
+    return await rollups.summary(db, patient_id, rollups.parse_window(window), source)
+
+
+# ---------------- CHART SERIES -------------------
+@app.get("/patients/{patient_id}/series/{kind}")
+async def get_series(
+    patient_id: int,
+    request: Request,
+    kind: str = Path(..., pattern="^(readings|heartrate|bloodpressure)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    points: int = Query(downsample.DEFAULT_POINTS, ge=10, le=downsample.MAX_POINTS),
+    method: str = Query("minmax", pattern="^(minmax|mean|lttb)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Downsampled series for charts: at most `points` entries per response.
+
+    minmax/mean return fixed-width time buckets (count, mean and, for
+    minmax, min/max per value); lttb returns the subset of raw samples that
+    best preserves the curve's shape. Windows default to the last 14 days.
+    """
+    end = to_utc(until) or datetime.utcnow()
+    start = to_utc(since) or end - timedelta(days=14)
+    if start >= end:
+        raise HTTPException(400, "since must be before until")
+
+    async def produce():
+        data = await downsample.series(db, kind, patient_id, start, end, points, method)
+        return dumps(data), {}
+
+    return await cached(request, (patient_tag(patient_id), patient_tag(patient_id, kind)), produce)
+
+
 # ---------------- ALERTS -------------------
 @app.get("/patients/{patient_id}/alerts", response_model=List[schemas.AlertOut])
-def list_alerts(patient_id: int, db: Session = Depends(get_db)):
-    return (
-        db.query(models.Alert)
-        .filter(models.Alert.patient_id == patient_id)
-        .order_by(models.Alert.timestamp.desc())
-        .all()
+async def list_alerts(
+    patient_id: int,
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_db),
+):
+    return await history_response(
+        request, db, models.Alert, schemas.AlertOut, "alerts",
+        patient_id, since, until, limit, cursor, format,
     )
 
 
+@app.post("/alerts/{alert_id}/ack", response_model=schemas.AlertOut)
+async def acknowledge_alert(alert_id: int, db: AsyncSession = Depends(get_db)):
+    alert = await db.get(models.Alert, alert_id)
+    if not alert:
+        raise HTTPException(404, "Alert not found")
+    if alert.acknowledged_at is None:
+        alert.acknowledged_at = datetime.utcnow()
+        await db.commit()
+        invalidate_patient(alert.patient_id, "alerts")
+    return alert
+
+
+# ---------------- WARD DASHBOARD -------------------
+@app.get("/dashboard", response_model=schemas.DashboardOut)
+async def ward_dashboard(
+    request: Request,
+    ward: Optional[str] = None,
+    cohort: Optional[str] = None,
+    limit: int = Query(dashboard.DEFAULT_LIMIT, ge=1, le=dashboard.MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """Latest reading and vitals, open alert counts and medications for
+    every patient in a ward and/or cohort, in a fixed number of queries."""
+    patient_ids: List[int] = []
+
+    async def produce():
+        data = await dashboard.ward_dashboard(db, ward, cohort, limit, offset)
+        patient_ids.extend(p["id"] for p in data["patients"])
+        return dumps(data), {}
+
+    # Any write to a listed patient, or a change in who is on the ward,
+    # drops the cached view.
+    def tags():
+        return [PATIENT_LIST_TAG] + [
+            patient_tag(pid, kind) for pid in patient_ids for kind in dashboard.KINDS
+        ]
+
+    return await cached(request, tags, produce)
+
+
 # ---------------- HEART RATE -------------------
 @app.get("/patients/{patient_id}/heartrate", response_model=List[schemas.HeartRateOut])
-def get_heart_rate(patient_id: int, db: Session = Depends(get_db)):
-    return db.query(models.HeartRate).filter(models.HeartRate.patient_id == patient_id).all()
+async def get_heart_rate(
+    patient_id: int,
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_db),
+):
+    return await history_response(
+        request, db, models.HeartRate, schemas.HeartRateOut, "heartrate",
+        patient_id, since, until, limit, cursor, format,
+    )
+
 
+@app.post("/patients/{patient_id}/heartrate", response_model=schemas.HeartRateOut, responses=QUEUED_RESPONSES)
+async def add_heart_rate(patient_id: int, data: schemas.HeartRateCreate, db: AsyncSession = Depends(get_db)):
+    if writer.enabled():
+        _, ward = await queued_patient(db, patient_id)
+        row = {"patient_id": patient_id, "bpm": data.bpm, "timestamp": datetime.utcnow()}
+        alert_rows = alert_engine.heart_rate(patient_id, row["bpm"], row["timestamp"])
+        return await enqueue("heart_rate", row, alert_rows, ward)
 
-@app.post("/patients/{patient_id}/heartrate", response_model=schemas.HeartRateOut)
-def add_heart_rate(patient_id: int, data: schemas.HeartRateCreate, db: Session = Depends(get_db)):
-    hr = models.HeartRate(patient_id=patient_id, bpm=data.bpm)
+    patient = await db.get(models.Patient, patient_id)
+    if not patient:
+        raise HTTPException(404, "Patient not found")
+
+    hr = models.HeartRate(patient_id=patient_id, bpm=data.bpm, timestamp=datetime.utcnow())
     db.add(hr)
-    db.commit()
-    db.refresh(hr)
+    new_alerts = [models.Alert(**a) for a in alert_engine.heart_rate(patient_id, hr.bpm, hr.timestamp)]
+    db.add_all(new_alerts)
+    await db.commit()
+    await db.refresh(hr)
+    invalidate_patient(patient_id, "heartrate", *(["alerts"] if new_alerts else []))
+    broker.publish("heart_rate", patient_id, patient.ward, row_dict(hr))
+    broker.publish_alerts([row_dict(a) for a in new_alerts], {patient_id: patient.ward})
     return hr
 
 
 # ---------------- BLOOD PRESSURE -------------------
 @app.get("/patients/{patient_id}/bloodpressure", response_model=List[schemas.BloodPressureOut])
-def get_blood_pressure(patient_id: int, db: Session = Depends(get_db)):
-    return db.query(models.BloodPressure).filter(models.BloodPressure.patient_id == patient_id).all()
+async def get_blood_pressure(
+    patient_id: int,
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = FORMAT_QUERY,
+    db: AsyncSession = Depends(get_db),
+):
+    return await history_response(
+        request, db, models.BloodPressure, schemas.BloodPressureOut, "bloodpressure",
+        patient_id, since, until, limit, cursor, format,
+    )
+
 
+@app.post("/patients/{patient_id}/bloodpressure", response_model=schemas.BloodPressureOut,
+          responses=QUEUED_RESPONSES)
+async def add_blood_pressure(patient_id: int, data: schemas.BloodPressureCreate, db: AsyncSession = Depends(get_db)):
+    if writer.enabled():
+        _, ward = await queued_patient(db, patient_id)
+        row = {
+            "patient_id": patient_id,
+            "systolic": data.systolic,
+            "diastolic": data.diastolic,
+            "timestamp": datetime.utcnow(),
+        }
+        alert_rows = alert_engine.blood_pressure(patient_id, row["systolic"], row["diastolic"], row["timestamp"])
+        return await enqueue("blood_pressure", row, alert_rows, ward)
+
+    patient = await db.get(models.Patient, patient_id)
+    if not patient:
+        raise HTTPException(404, "Patient not found")
 
-@app.post("/patients/{patient_id}/bloodpressure", response_model=schemas.BloodPressureOut)
-def add_blood_pressure(patient_id: int, data: schemas.BloodPressureCreate, db: Session = Depends(get_db)):
     bp = models.BloodPressure(
         patient_id=patient_id,
         systolic=data.systolic,
-        diastolic=data.diastolic
+        diastolic=data.diastolic,
+        timestamp=datetime.utcnow(),
     )
     db.add(bp)
-    db.commit()
-    db.refresh(bp)
+    new_alerts = [
+        models.Alert(**a)
+        for a in alert_engine.blood_pressure(patient_id, bp.systolic, bp.diastolic, bp.timestamp)
+    ]
+    db.add_all(new_alerts)
+    await db.commit()
+    await db.refresh(bp)
+    invalidate_patient(patient_id, "bloodpressure", *(["alerts"] if new_alerts else []))
+    broker.publish("blood_pressure", patient_id, patient.ward, row_dict(bp))
+    broker.publish_alerts([row_dict(a) for a in new_alerts], {patient_id: patient.ward})
     return bp
 
 
+# ---------------- WRITE-BEHIND INGEST -------------------
+@app.get("/ingest/{ingest_id}", response_model=schemas.IngestStatusOut)
+def ingest_status(ingest_id: str):
+    status = writer.status(ingest_id)
+    if status is None:
+        raise HTTPException(404, "Unknown or expired ingest id")
+    return status
+
+
 # ---------------- MEDICATIONS -------------------
 @app.get("/patients/{patient_id}/medications", response_model=List[schemas.MedicationOut])
-def list_meds(patient_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Medication).filter(models.Medication.patient_id == patient_id).all()
+async def list_meds(patient_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def produce():
+        body = await select_encoded(
+            db, models.Medication, schemas.MedicationOut, models.Medication.patient_id == patient_id
+        )
+        return body, {}
+
+    tags = (patient_tag(patient_id), patient_tag(patient_id, "medications"))
+    return await cached(request, tags, produce)
 
 
 @app.post("/patients/{patient_id}/medications", response_model=schemas.MedicationOut)
-def add_med(patient_id: int, data: schemas.MedicationCreate, db: Session = Depends(get_db)):
+async def add_med(patient_id: int, data: schemas.MedicationCreate, db: AsyncSession = Depends(get_db)):
     m = models.Medication(
         patient_id=patient_id,
         name=data.name,
@@ -181,22 +628,259 @@ def add_med(patient_id: int, data: schemas.MedicationCreate, db: Session = Depen
         frequency=data.frequency
     )
     db.add(m)
-    db.commit()
-    db.refresh(m)
+    await db.commit()
+    await db.refresh(m)
+    invalidate_patient(patient_id, "medications")
     return m
 
 
 @app.delete("/medications/{med_id}")
-def delete_med(med_id: int, db: Session = Depends(get_db)):
-    m = db.query(models.Medication).get(med_id)
+async def delete_med(med_id: int, db: AsyncSession = Depends(get_db)):
+    m = await db.get(models.Medication, med_id)
     if not m:
         raise HTTPException(404, "Medication not found")
 
-    db.delete(m)
-    db.commit()
+    await db.run_sync(doses.delete_for, med_id)
+    await db.delete(m)
+    await db.commit()
+    invalidate_patient(m.patient_id, "medications")
     return {"detail": "Medication deleted"}
 
 
+# ---------------- SCHEDULES & DOSES -------------------
+@app.post("/medications/{med_id}/schedules", response_model=schemas.ScheduleOut)
+async def add_schedule(med_id: int, data: schemas.ScheduleCreate, db: AsyncSession = Depends(get_db)):
+    m = await db.get(models.Medication, med_id)
+    if not m:
+        raise HTTPException(404, "Medication not found")
+    data.start_at, data.end_at = to_utc(data.start_at), to_utc(data.end_at)
+    doses.validate(data)
+
+    sched = await db.run_sync(doses.create_schedule, m, data, datetime.utcnow())
+    await db.commit()
+    await db.refresh(sched)
+    return sched
+
+
+@app.get("/patients/{patient_id}/schedules", response_model=List[schemas.ScheduleOut])
+async def list_schedules(patient_id: int, db: AsyncSession = Depends(get_db)):
+    S = models.MedicationSchedule
+    return (await db.execute(select(S).where(S.patient_id == patient_id).order_by(S.id))).scalars().all()
+
+
+@app.delete("/schedules/{schedule_id}")
+async def end_schedule(schedule_id: int, db: AsyncSession = Depends(get_db)):
+    sched = await db.get(models.MedicationSchedule, schedule_id)
+    if not sched:
+        raise HTTPException(404, "Schedule not found")
+
+    await db.run_sync(doses.end_schedule, sched, datetime.utcnow())
+    await db.commit()
+    return {"detail": "Schedule ended"}
+
+
+@app.get("/patients/{patient_id}/doses", response_model=List[schemas.DoseOut])
+async def dose_timeline(
+    patient_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Dose events in [since, until), default the last and next 24 hours.
+    Slots past the materialized horizon come back with status "scheduled"."""
+    now = datetime.utcnow()
+    since = to_utc(since) or now - timedelta(days=1)
+    until = to_utc(until) or now + timedelta(days=1)
+    return Response(dumps(await doses.timeline(db, patient_id, since, until)), media_type="application/json")
+
+
+@app.post("/doses/{dose_id}", response_model=schemas.DoseOut)
+async def record_dose(dose_id: int, data: schemas.DoseUpdate, db: AsyncSession = Depends(get_db)):
+    event = await db.get(models.DoseEvent, dose_id)
+    if not event:
+        raise HTTPException(404, "Dose not found")
+
+    await doses.record(db, event, data.status, to_utc(data.taken_at), datetime.utcnow())
+    return await doses.get(db, dose_id)
+
+
+@app.get("/doses/due", response_model=List[schemas.DoseOut])
+async def due_doses(
+    within_minutes: int = Query(30, ge=0, le=int(doses.HORIZON_H * 60)),
+    ward: Optional[str] = None,
+    cohort: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Pending doses due within the next `within_minutes` (or already due
+    and still inside their grace period). Cheap enough to poll."""
+    rows = await doses.due(db, datetime.utcnow(), timedelta(minutes=within_minutes), ward, cohort, limit)
+    return Response(dumps(rows), media_type="application/json")
+
+
+@app.get("/doses/overdue", response_model=List[schemas.DoseOut])
+async def overdue_doses(
+    ward: Optional[str] = None,
+    cohort: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    rows = await doses.overdue(db, datetime.utcnow(), ward, cohort, limit)
+    return Response(dumps(rows), media_type="application/json")
+
+
+@app.get("/patients/{patient_id}/adherence", response_model=schemas.AdherenceOut)
+async def patient_adherence(patient_id: int, window: str = "30d", db: AsyncSession = Depends(get_db)):
+    """Adherence over `window`, overall and per medication."""
+    now = datetime.utcnow()
+    start = now - rollups.parse_window(window)
+    return await doses.adherence(db, start, now, patient_id=patient_id, by_medication=True)
+
+
+@app.get("/adherence", response_model=schemas.AdherenceOut)
+async def cohort_adherence(
+    window: str = "30d",
+    ward: Optional[str] = None,
+    cohort: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Adherence over `window` for a ward and/or cohort, per patient."""
+    now = datetime.utcnow()
+    start = now - rollups.parse_window(window)
+    return await doses.adherence(db, start, now, ward=ward, cohort=cohort)
+
+
+# ---------------- RISK SCORES -------------------
+async def _risk_run(run_id: int, now: datetime):
+    try:
+        await run_in_threadpool(risk.compute, SessionLocal, run_id, now)
+    except Exception:
+        risk.log.exception("risk run %d failed", run_id)
+    finally:
+        cache.invalidate(risk.RISK_TAG)
+
+
+@app.post("/risk/runs", response_model=schemas.RiskRunOut, status_code=202)
+async def start_risk_run(db: AsyncSession = Depends(get_db)):
+    """Score every patient now, in the background. Poll GET /risk/runs/{id}."""
+    now = datetime.utcnow()
+    run_id = await run_in_threadpool(risk.claim, SessionLocal, "manual", now)
+    if run_id is None:
+        raise HTTPException(409, "A risk run is already in progress")
+    spawn(_risk_run(run_id, now))
+    return risk.run_dict(await db.get(models.RiskRun, run_id))
+
+
+@app.get("/risk/runs", response_model=List[schemas.RiskRunOut])
+async def list_risk_runs(limit: int = Query(20, ge=1, le=500), db: AsyncSession = Depends(get_db)):
+    return await risk.runs(db, limit)
+
+
+@app.get("/risk/runs/{run_id}", response_model=schemas.RiskRunOut)
+async def get_risk_run(run_id: int, db: AsyncSession = Depends(get_db)):
+    run = await db.get(models.RiskRun, run_id)
+    if not run:
+        raise HTTPException(404, "Risk run not found")
+    return risk.run_dict(run)
+
+
+@app.get("/risk/scores", response_model=schemas.RiskRankOut)
+async def rank_risk(
+    request: Request,
+    ward: Optional[str] = None,
+    cohort: Optional[str] = None,
+    sort: str = "score",
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    """Patients ranked by their latest risk score (or one of its indices),
+    highest first; patients without data for `sort` come last."""
+    async def produce():
+        data = await risk.ranking(db, ward, cohort, sort, limit, offset)
+        return dumps(data), {}
+
+    return await cached(request, (risk.RISK_TAG, PATIENT_LIST_TAG), produce)
+
+
+@app.get("/patients/{patient_id}/risk", response_model=schemas.RiskScoreOut)
+async def patient_risk(patient_id: int, db: AsyncSession = Depends(get_db)):
+    data = await risk.for_patient(db, patient_id)
+    if data is None:
+        raise HTTPException(404, "No risk score for this patient yet")
+    return data
+
+
+# ---------------- CACHE -------------------
+@app.get("/cache/stats")
+def cache_stats():
+    return {"backend": cache.backend, "entries": len(cache), **cache.stats.as_dict()}
+
+
+# ---------------- BUS -------------------
+@app.get("/bus/stats")
+def bus_stats():
+    """This worker's view of the cross-worker bus."""
+    return bus.stats()
+
+
+# ---------------- METRICS -------------------
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+# ---------------- LIVE EVENTS -------------------
+@app.websocket("/ws/events")
+async def events_ws(
+    websocket: WebSocket,
+    patient_id: List[int] = Query([]),
+    ward: List[str] = Query([]),
+):
+    await websocket.accept()
+    sub = broker.subscribe(patient_id, ward)
+    try:
+        while not sub.closed:
+            event = await sub.next()
+            notice = sub.lag_notice()
+            if notice:
+                await websocket.send_text(notice)
+            await websocket.send_text(event.json if event else '{"type":"ping"}')
+        await websocket.close(code=1013, reason="Subscriber too slow")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(sub)
+
+
+@app.get("/events/stream")
+async def events_sse(
+    request: Request,
+    patient_id: List[int] = Query([]),
+    ward: List[str] = Query([]),
+):
+    """Server-sent events; same payloads and filters as /ws/events."""
+    sub = broker.subscribe(patient_id, ward)
+
+    async def stream():
+        try:
+            while not sub.closed and not await request.is_disconnected():
+                event = await sub.next()
+                notice = sub.lag_notice()
+                if notice:
+                    yield f"data: {notice}\n\n"
+                yield f"data: {event.json}\n\n" if event else ": ping\n\n"
+        finally:
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ---------------- ROOT ROUTES ----------------
 @app.get("/", include_in_schema=False)
 def root():
@@ -0,0 +1,272 @@
+# backend/metrics.py
+"""Prometheus metrics and per-request instrumentation.
+
+MetricsMiddleware opens a RequestStats for every HTTP request in a context
+variable; the SQLAlchemy hooks installed by instrument_engine() add each
+statement's SQL and duration to it, so at the end of the request we know
+how many statements ran, how long the database took, and whether the same
+statement was repeated enough times to look like an N+1. Commit latency,
+pool checkout wait, alert rule evaluation and the write-behind ingest
+queue are recorded globally.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR to a shared,
+empty directory so /metrics aggregates all of them.
+"""
+import logging
+import os
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Requests slower than this are logged with their queries; unset/0 = off.
+SLOW_REQUEST_MS = float(os.getenv("CAREPLUS_SLOW_REQUEST_MS") or 0)
+# One SQL string executed this many times in a request counts as an N+1.
+N_PLUS_ONE_THRESHOLD = int(os.getenv("CAREPLUS_N_PLUS_ONE_THRESHOLD", "10"))
+# Statements kept per request for the slow log; the counts cover all of them.
+MAX_CAPTURED = 200
+
+log = logging.getLogger("careplus.slow")
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+FAST_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+
+REQUEST_LATENCY = Histogram(
+    "careplus_http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_STATEMENTS = Histogram(
+    "careplus_db_statements_per_request", "SQL statements executed per HTTP request",
+    ["method", "route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+REQUEST_DB_TIME = Histogram(
+    "careplus_db_time_per_request_seconds", "Time spent in SQL per HTTP request",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+N_PLUS_ONE = Counter(
+    "careplus_db_n_plus_one_total",
+    f"Requests that ran one SQL statement {N_PLUS_ONE_THRESHOLD}+ times",
+    ["method", "route"],
+)
+SLOW_REQUESTS = Counter(
+    "careplus_http_slow_requests_total", "Requests over CAREPLUS_SLOW_REQUEST_MS",
+    ["method", "route"],
+)
+STATEMENT_LATENCY = Histogram(
+    "careplus_db_statement_duration_seconds", "SQL statement latency",
+    ["engine", "verb"], buckets=FAST_BUCKETS,
+)
+COMMIT_LATENCY = Histogram(
+    "careplus_db_commit_duration_seconds", "Session commit latency, flush included",
+    buckets=FAST_BUCKETS,
+)
+POOL_WAIT = Histogram(
+    "careplus_db_pool_checkout_wait_seconds", "Time waiting for a pooled connection",
+    ["engine"], buckets=FAST_BUCKETS,
+)
+RULE_EVAL = Histogram(
+    "careplus_rule_eval_duration_seconds", "Alert rule evaluation time",
+    ["kind"], buckets=FAST_BUCKETS,
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "careplus_ingest_queue_depth", "Samples waiting in the write-behind queue",
+    multiprocess_mode="livesum",
+)
+INGEST_BATCH_ROWS = Histogram(
+    "careplus_ingest_batch_rows", "Samples per write-behind group commit",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+INGEST_FLUSH_SECONDS = Histogram(
+    "careplus_ingest_flush_duration_seconds", "Write-behind group commit latency",
+    buckets=FAST_BUCKETS,
+)
+BUS_MESSAGES = Counter(
+    "careplus_bus_messages_total", "Messages relayed between workers over the bus",
+    ["direction", "topic"],
+)
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "rule_seconds", "captured", "tally")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rule_seconds = 0.0
+        self.captured: List[Tuple[str, float]] = []
+        self.tally: Tally = Tally()
+
+    def add_statement(self, sql: str, seconds: float) -> None:
+        self.statements += 1
+        self.db_seconds += seconds
+        self.tally[sql] += 1
+        if len(self.captured) < MAX_CAPTURED:
+            self.captured.append((sql, seconds))
+
+    def repeated(self) -> Optional[Tuple[str, int]]:
+        """The most repeated statement if it crosses the N+1 threshold."""
+        if not self.tally:
+            return None
+        sql, n = self.tally.most_common(1)[0]
+        return (sql, n) if n >= N_PLUS_ONE_THRESHOLD else None
+
+
+# Mutable, so updates made in threadpool workers (which run in a copy of
+# the request's context) are seen by the middleware.
+current: ContextVar[Optional[RequestStats]] = ContextVar("careplus_request_stats", default=None)
+
+
+# ---------------- SQLALCHEMY -------------------
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("careplus_t0", []).append(time.perf_counter())
+
+
+def _after_execute(label):
+    def hook(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("careplus_t0")
+        if not stack:
+            return
+        seconds = time.perf_counter() - stack.pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+        STATEMENT_LATENCY.labels(label, verb).observe(seconds)
+        stats = current.get()
+        if stats is not None:
+            stats.add_statement(statement, seconds)
+    return hook
+
+
+def _instrument_pool(pool, label) -> None:
+    # Pools expose no "before checkout" event; time the internal fetch that
+    # blocks when the pool is exhausted.
+    do_get = pool._do_get
+    observe = POOL_WAIT.labels(label).observe
+
+    def timed_do_get():
+        t0 = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            observe(time.perf_counter() - t0)
+
+    pool._do_get = timed_do_get
+
+
+def instrument_engine(sync_engine: Engine, label: str) -> Engine:
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute(label))
+    _instrument_pool(sync_engine.pool, label)
+    return sync_engine
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["careplus_commit_t0"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    t0 = session.info.pop("careplus_commit_t0", None)
+    if t0 is not None:
+        COMMIT_LATENCY.observe(time.perf_counter() - t0)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("careplus_commit_t0", None)
+
+
+# ---------------- RULES -------------------
+@contextmanager
+def rule_timer(kind: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        RULE_EVAL.labels(kind).observe(seconds)
+        stats = current.get()
+        if stats is not None:
+            stats.rule_seconds += seconds
+
+
+# ---------------- HTTP -------------------
+def _route(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _slow_log(method, route, path, status, seconds, stats: RequestStats, repeated) -> None:
+    lines = [
+        f"slow request {method} {path} ({route}) -> {status} in {seconds * 1000:.1f} ms; "
+        f"{stats.statements} statements, {stats.db_seconds * 1000:.1f} ms in DB, "
+        f"{stats.rule_seconds * 1000:.1f} ms in rules"
+    ]
+    if repeated:
+        lines.append(f"  possible N+1: {repeated[1]}x {' '.join(repeated[0].split())[:200]}")
+    for sql, s in stats.captured:
+        lines.append(f"  {s * 1000:8.2f} ms  {' '.join(sql.split())[:500]}")
+    if stats.statements > len(stats.captured):
+        lines.append(f"  ... {stats.statements - len(stats.captured)} more")
+    log.warning("\n".join(lines))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - t0
+            current.reset(token)
+            method, route = scope["method"], _route(scope)
+            REQUEST_LATENCY.labels(method, route, str(status[0])).observe(seconds)
+            REQUEST_STATEMENTS.labels(method, route).observe(stats.statements)
+            REQUEST_DB_TIME.labels(method, route).observe(stats.db_seconds)
+            repeated = stats.repeated()
+            if repeated:
+                N_PLUS_ONE.labels(method, route).inc()
+            if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+                SLOW_REQUESTS.labels(method, route).inc()
+                _slow_log(method, route, scope.get("path", ""), status[0], seconds, stats, repeated)
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition of all metrics, merged across workers in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
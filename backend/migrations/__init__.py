@@ -0,0 +1,145 @@
+# backend/migrations/__init__.py
+"""Versioned schema migrations.
+
+Each `vNNNN_*.py` module in this package defines VERSION, DESCRIPTION and
+`upgrade(conn)`. migrate() applies the ones newer than the highest version
+recorded in `schema_version`, each in its own transaction under a
+database-wide lock, so several workers starting at once apply every
+migration exactly once and the rest only read the version table.
+
+Run them before starting the app (`python -m backend.migrations`), or let
+the app's lifespan do it: CAREPLUS_MIGRATE is "upgrade" (default), "check"
+(refuse to start on an out-of-date schema) or "off".
+
+Each migration declares the tables, columns and indexes it touches as they
+were at its version, in its own MetaData; never through backend.models, so
+its DDL stays fixed as the models move on. It applies them through the
+idempotent helpers below, so a database created by an older release (or by
+the create_all this replaced) is brought up to date by the same steps as a
+fresh one.
+"""
+import importlib
+import os
+import pkgutil
+from datetime import datetime
+from types import ModuleType
+from typing import Callable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+ON_STARTUP = os.getenv("CAREPLUS_MIGRATE", "upgrade").lower()  # "upgrade" | "check" | "off"
+
+# Kept out of the models' metadata so create_all-style tooling never sees it.
+version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key for pg_advisory_xact_lock.
+_PG_LOCK_KEY = 0x43415245
+
+
+def load() -> List[ModuleType]:
+    """Migration modules in version order."""
+    mods = [
+        importlib.import_module(f"{__name__}.{info.name}")
+        for info in pkgutil.iter_modules(__path__)
+        if info.name.startswith("v")
+    ]
+    mods.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in mods]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"duplicate migration versions: {versions}")
+    return mods
+
+
+def head() -> int:
+    return max((m.VERSION for m in load()), default=0)
+
+
+def current(bind) -> int:
+    """Highest applied version; 0 for a database that predates migrations."""
+    if not inspect(bind).has_table(version_table.name):
+        return 0
+    with bind.connect() as conn:
+        return conn.execute(select(version_table.c.version).order_by(version_table.c.version.desc())).scalar() or 0
+
+
+def _lock(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+    elif conn.dialect.name == "sqlite":
+        # Any write takes SQLite's database lock until the transaction ends
+        # (busy_timeout makes the other workers wait for it).
+        conn.execute(version_table.delete().where(version_table.c.version < 0))
+
+
+def migrate(engine: Engine, target: Optional[int] = None, log: Callable[[str], None] = lambda msg: None) -> List[int]:
+    """Apply pending migrations up to `target` (default: all). Returns the
+    versions applied by this call."""
+    try:
+        version_table.create(engine, checkfirst=True)
+    except DBAPIError:
+        # Another worker created it between the check and the CREATE.
+        if not inspect(engine).has_table(version_table.name):
+            raise
+
+    applied: List[int] = []
+    pending = [m for m in load() if target is None or m.VERSION <= target]
+    if pending and current(engine) >= pending[-1].VERSION:
+        return applied
+    for mod in pending:
+        with engine.begin() as conn:
+            _lock(conn)
+            done = conn.execute(select(version_table.c.version).where(version_table.c.version == mod.VERSION)).first()
+            if done:
+                continue
+            mod.upgrade(conn)
+            conn.execute(version_table.insert(), {
+                "version": mod.VERSION,
+                "description": mod.DESCRIPTION,
+                "applied_at": datetime.utcnow(),
+            })
+        applied.append(mod.VERSION)
+        log(f"applied {mod.VERSION:04d} {mod.DESCRIPTION}")
+    return applied
+
+
+def check(engine: Engine) -> None:
+    have, want = current(engine), head()
+    if have < want:
+        raise RuntimeError(
+            f"database schema is at version {have}, this release needs {want}; "
+            "run `python -m backend.migrations`"
+        )
+
+
+# ---------------- HELPERS FOR MIGRATIONS -------------------
+def create_table(conn: Connection, table: Table) -> None:
+    """CREATE TABLE (with its indexes) unless it exists."""
+    table.create(conn, checkfirst=True)
+
+
+def add_column(conn: Connection, table: Table, name: str) -> None:
+    """ALTER TABLE ADD COLUMN `table.c[name]` unless it exists. Only
+    nullable columns, which every backend can add to a populated table."""
+    if name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return
+    col = table.c[name]
+    if not col.nullable:
+        raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{name}")
+    ddl = col.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {ddl}"))
+
+
+def create_index(conn: Connection, table: Table, name: str) -> None:
+    """CREATE INDEX `name` as declared on `table` unless it exists."""
+    if name in {i["name"] for i in inspect(conn).get_indexes(table.name)}:
+        return
+    index = next(i for i in table.indexes if i.name == name)
+    index.create(conn)
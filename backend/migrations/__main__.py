@@ -0,0 +1,20 @@
+# backend/migrations/__main__.py
+import argparse
+
+from backend.db import engine
+from backend.migrations import current, head, migrate
+
+parser = argparse.ArgumentParser(prog="python -m backend.migrations", description="Apply schema migrations")
+parser.add_argument("command", nargs="?", default="upgrade", choices=("upgrade", "current", "check"))
+parser.add_argument("--to", type=int, help="stop at this version (upgrade only)")
+args = parser.parse_args()
+
+if args.command == "upgrade":
+    applied = migrate(engine, args.to, log=print)
+    print(f"schema at version {current(engine)} ({len(applied)} applied)")
+elif args.command == "current":
+    print(f"schema at version {current(engine)}, head is {head()}")
+else:
+    have, want = current(engine), head()
+    print(f"schema at version {have}, head is {want}")
+    raise SystemExit(0 if have >= want else 1)
@@ -0,0 +1,74 @@
+# backend/migrations/v0001_baseline.py
+"""The tables the app started with, as they were then."""
+from sqlalchemy import JSON, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table
+
+from backend.migrations import create_table
+
+VERSION = 1
+DESCRIPTION = "patients, medications, readings, alerts, heart rate, blood pressure"
+
+meta = MetaData()
+
+patients = Table(
+    "patients", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, nullable=False),
+    Column("diabetes_type", String),
+    Column("date_of_birth", Date),
+    Column("blood_pressure", String),
+    Column("heart_rate", Integer),
+    Column("weight", Float),
+    Column("target", JSON),
+    Column("emergency", JSON),
+)
+
+medications = Table(
+    "medications", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("name", String, nullable=False),
+    Column("dosage", String),
+    Column("frequency", String),
+)
+
+readings = Table(
+    "readings", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("timestamp", DateTime),
+    Column("value_mgdl", Float),
+    Column("context", String),
+    Column("notes", String),
+)
+
+alerts = Table(
+    "alerts", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("timestamp", DateTime),
+    Column("severity", String),
+    Column("type", String),
+    Column("message", String),
+)
+
+heartrate = Table(
+    "heartrate", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("bpm", Integer),
+    Column("timestamp", DateTime),
+)
+
+bloodpressure = Table(
+    "bloodpressure", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("systolic", Integer),
+    Column("diastolic", Integer),
+    Column("timestamp", DateTime),
+)
+
+
+def upgrade(conn):
+    for table in (patients, medications, readings, alerts, heartrate, bloodpressure):
+        create_table(conn, table)
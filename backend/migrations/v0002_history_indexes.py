@@ -0,0 +1,21 @@
+# backend/migrations/v0002_history_indexes.py
+"""Composite indexes behind keyset-paginated history reads."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table
+
+from backend.migrations import create_index
+
+VERSION = 2
+DESCRIPTION = "(patient_id, timestamp) indexes on history tables"
+
+meta = MetaData()
+# Only the columns the indexes cover.
+tables = [
+    Table(name, meta, Column("patient_id", Integer), Column("timestamp", DateTime),
+          Index(f"ix_{name}_patient_timestamp", "patient_id", "timestamp"))
+    for name in ("readings", "alerts", "heartrate", "bloodpressure")
+]
+
+
+def upgrade(conn):
+    for table in tables:
+        create_index(conn, table, f"ix_{table.name}_patient_timestamp")
@@ -0,0 +1,36 @@
+# backend/migrations/v0003_glucose_rollups.py
+"""Hourly/daily glucose aggregates. Existing readings are not rolled up
+here; run `python -m backend.rollups` once after upgrading an old database."""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, UniqueConstraint
+
+from backend.migrations import create_table
+
+VERSION = 3
+DESCRIPTION = "glucose_rollups"
+
+meta = MetaData()
+# Referenced by the foreign key only; created by 0001.
+Table("patients", meta, Column("id", Integer, primary_key=True))
+
+glucose_rollups = Table(
+    "glucose_rollups", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+    Column("granularity", String, nullable=False),
+    Column("bucket_start", DateTime, nullable=False),
+    Column("count", Integer, nullable=False),
+    Column("total", Float, nullable=False),
+    Column("total_sq", Float, nullable=False),
+    Column("min_mgdl", Float),
+    Column("max_mgdl", Float),
+    Column("n_below_54", Integer, nullable=False),
+    Column("n_below_70", Integer, nullable=False),
+    Column("n_in_range", Integer, nullable=False),
+    Column("n_above_180", Integer, nullable=False),
+    Column("n_above_250", Integer, nullable=False),
+    UniqueConstraint("patient_id", "granularity", "bucket_start", name="uq_glucose_rollups_bucket"),
+)
+
+
+def upgrade(conn):
+    create_table(conn, glucose_rollups)
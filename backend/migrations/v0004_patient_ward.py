@@ -0,0 +1,15 @@
+# backend/migrations/v0004_patient_ward.py
+"""Ward, for event subscriptions by ward."""
+from sqlalchemy import Column, MetaData, String, Table
+
+from backend.migrations import add_column, create_index
+
+VERSION = 4
+DESCRIPTION = "patients.ward"
+
+patients = Table("patients", MetaData(), Column("ward", String, nullable=True, index=True))
+
+
+def upgrade(conn):
+    add_column(conn, patients, "ward")
+    create_index(conn, patients, "ix_patients_ward")
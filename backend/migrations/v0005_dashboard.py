@@ -0,0 +1,25 @@
+# backend/migrations/v0005_dashboard.py
+"""Cohorts and alert acknowledgement for the ward dashboard."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+
+from backend.migrations import add_column, create_index
+
+VERSION = 5
+DESCRIPTION = "patients.cohort, alerts.acknowledged_at, open-alerts index"
+
+meta = MetaData()
+patients = Table("patients", meta, Column("cohort", String, nullable=True, index=True))
+alerts = Table(
+    "alerts", meta,
+    Column("patient_id", Integer),
+    Column("acknowledged_at", DateTime, nullable=True),
+)
+Index("ix_alerts_open", alerts.c.patient_id,
+      sqlite_where=alerts.c.acknowledged_at.is_(None), postgresql_where=alerts.c.acknowledged_at.is_(None))
+
+
+def upgrade(conn):
+    add_column(conn, patients, "cohort")
+    create_index(conn, patients, "ix_patients_cohort")
+    add_column(conn, alerts, "acknowledged_at")
+    create_index(conn, alerts, "ix_alerts_open")
@@ -0,0 +1,33 @@
+# backend/migrations/v0006_vitals_rollups.py
+"""Aggregates the retention job keeps for archived vitals."""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, UniqueConstraint
+
+from backend.migrations import create_table
+
+VERSION = 6
+DESCRIPTION = "vitals_rollups"
+
+meta = MetaData()
+# Referenced by the foreign key only; created by 0001.
+Table("patients", meta, Column("id", Integer, primary_key=True))
+
+vitals_rollups = Table(
+    "vitals_rollups", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+    Column("kind", String, nullable=False),
+    Column("granularity", String, nullable=False),
+    Column("bucket_start", DateTime, nullable=False),
+    Column("count", Integer, nullable=False),
+    Column("total_1", Float),
+    Column("min_1", Float),
+    Column("max_1", Float),
+    Column("total_2", Float),
+    Column("min_2", Float),
+    Column("max_2", Float),
+    UniqueConstraint("patient_id", "kind", "granularity", "bucket_start", name="uq_vitals_rollups_bucket"),
+)
+
+
+def upgrade(conn):
+    create_table(conn, vitals_rollups)
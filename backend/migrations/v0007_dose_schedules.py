@@ -0,0 +1,50 @@
+# backend/migrations/v0007_dose_schedules.py
+"""Structured medication schedules and their dose events."""
+from sqlalchemy import (JSON, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table,
+                        UniqueConstraint)
+
+from backend.migrations import create_table
+
+VERSION = 7
+DESCRIPTION = "medication_schedules, dose_events"
+
+meta = MetaData()
+# Referenced by the foreign keys only; created by 0001.
+Table("patients", meta, Column("id", Integer, primary_key=True))
+Table("medications", meta, Column("id", Integer, primary_key=True))
+
+medication_schedules = Table(
+    "medication_schedules", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("medication_id", Integer, ForeignKey("medications.id"), nullable=False, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False, index=True),
+    Column("times", JSON, nullable=True),
+    Column("days", JSON, nullable=True),
+    Column("every_hours", Float, nullable=True),
+    Column("timezone", String, nullable=False),
+    Column("grace_minutes", Integer, nullable=False),
+    Column("start_at", DateTime, nullable=False),
+    Column("end_at", DateTime, nullable=True),
+    Column("materialized_until", DateTime, nullable=False, index=True),
+)
+
+dose_events = Table(
+    "dose_events", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("schedule_id", Integer, ForeignKey("medication_schedules.id"), nullable=False),
+    Column("medication_id", Integer, ForeignKey("medications.id"), nullable=False),
+    Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+    Column("scheduled_at", DateTime, nullable=False),
+    Column("late_at", DateTime, nullable=False),
+    Column("status", String, nullable=False),
+    Column("taken_at", DateTime, nullable=True),
+    UniqueConstraint("schedule_id", "scheduled_at", name="uq_dose_events_slot"),
+    Index("ix_dose_events_patient_scheduled", "patient_id", "scheduled_at"),
+)
+Index("ix_dose_events_pending", dose_events.c.scheduled_at,
+      sqlite_where=dose_events.c.status == "pending", postgresql_where=dose_events.c.status == "pending")
+
+
+def upgrade(conn):
+    create_table(conn, medication_schedules)
+    create_table(conn, dose_events)
@@ -0,0 +1,54 @@
+# backend/migrations/v0008_risk_scores.py
+"""Population risk scoring runs and their per-patient scores."""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table
+
+from backend.migrations import create_table
+
+VERSION = 8
+DESCRIPTION = "risk_runs, risk_scores"
+
+meta = MetaData()
+# Referenced by the foreign key only; created by 0001.
+Table("patients", meta, Column("id", Integer, primary_key=True))
+
+risk_runs = Table(
+    "risk_runs", meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("trigger", String, nullable=False),
+    Column("nightly_key", String, nullable=True, unique=True),
+    Column("status", String, nullable=False),
+    Column("started_at", DateTime, nullable=False),
+    Column("finished_at", DateTime, nullable=True),
+    Column("window_days", Integer, nullable=False),
+    Column("patients", Integer, nullable=True),
+    Column("readings", Integer, nullable=True),
+    Column("error", String, nullable=True),
+)
+
+risk_scores = Table(
+    "risk_scores", meta,
+    Column("patient_id", Integer, ForeignKey("patients.id"), primary_key=True),
+    Column("run_id", Integer, ForeignKey("risk_runs.id"), nullable=False),
+    Column("computed_at", DateTime, nullable=False),
+    Column("score", Float, nullable=False, index=True),
+    Column("readings", Integer, nullable=False),
+    Column("mean_mgdl", Float),
+    Column("sd_mgdl", Float),
+    Column("cv", Float),
+    Column("lbgi", Float),
+    Column("hbgi", Float),
+    Column("pct_below_70", Float),
+    Column("pct_above_180", Float),
+    Column("alerts", Integer, nullable=False),
+    Column("hr_mean", Float),
+    Column("hr_slope", Float),
+    Column("systolic_mean", Float),
+    Column("systolic_slope", Float),
+    Column("diastolic_mean", Float),
+    Column("adherence_percent", Float),
+)
+
+
+def upgrade(conn):
+    create_table(conn, risk_runs)
+    create_table(conn, risk_scores)
@@ -1,5 +1,5 @@
 # backend/models.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -12,6 +12,8 @@ class Patient(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     diabetes_type = Column(String, default="T2D")
+    ward = Column(String, nullable=True, index=True)
+    cohort = Column(String, nullable=True, index=True)
 
     date_of_birth = Column(Date, nullable=True)
     blood_pressure = Column(String, nullable=True)
@@ -30,6 +32,9 @@ class Patient(Base):
     medications = relationship("Medication", back_populates="patient", cascade="all, delete-orphan")
     heartrate = relationship("HeartRate", cascade="all, delete-orphan")
     bloodpressure = relationship("BloodPressure", cascade="all, delete-orphan")
+    glucose_rollups = relationship("GlucoseRollup", cascade="all, delete-orphan")
+    vitals_rollups = relationship("VitalsRollup", cascade="all, delete-orphan")
+    risk_score = relationship("RiskScore", cascade="all, delete-orphan", uselist=False)
 
 
 # ======================= MEDICATION =======================
@@ -45,9 +50,61 @@ class Medication(Base):
     patient = relationship("Patient", back_populates="medications")
 
 
+# ======================= MEDICATION SCHEDULE ==============
+class MedicationSchedule(Base):
+    """When a medication is due: at `times` ("HH:MM", in `timezone`) on
+    `days` (0 = Monday; all days if empty), or every `every_hours` from
+    `start_at`. Dose slots are materialized into dose_events a window at a
+    time; `materialized_until` is how far that has got.
+    """
+    __tablename__ = "medication_schedules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
+    times = Column(JSON, nullable=True)
+    days = Column(JSON, nullable=True)
+    every_hours = Column(Float, nullable=True)
+    timezone = Column(String, nullable=False, default="UTC")
+    grace_minutes = Column(Integer, nullable=False, default=60)
+    start_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    end_at = Column(DateTime, nullable=True)
+    materialized_until = Column(DateTime, nullable=False, index=True)
+
+
+# ======================= DOSE EVENT =======================
+class DoseEvent(Base):
+    """One scheduled dose. status: pending | taken | skipped | missed.
+
+    `late_at` (scheduled_at + the schedule's grace) is copied in so overdue
+    doses can be found without joining schedules.
+    """
+    __tablename__ = "dose_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    schedule_id = Column(Integer, ForeignKey("medication_schedules.id"), nullable=False)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    scheduled_at = Column(DateTime, nullable=False)
+    late_at = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    taken_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("schedule_id", "scheduled_at", name="uq_dose_events_slot"),
+        Index("ix_dose_events_patient_scheduled", "patient_id", "scheduled_at"),
+        # Only pending doses, so reminder polls don't scan the taken history.
+        Index("ix_dose_events_pending", "scheduled_at",
+              sqlite_where=status == "pending", postgresql_where=status == "pending"),
+    )
+
+
 # ======================= READING ==========================
 class Reading(Base):
     __tablename__ = "readings"
+    __table_args__ = (
+        Index("ix_readings_patient_timestamp", "patient_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -69,13 +126,24 @@ class Alert(Base):
     severity = Column(String)
     type = Column(String)
     message = Column(String)
+    acknowledged_at = Column(DateTime, nullable=True)  # NULL = open
 
     patient = relationship("Patient", back_populates="alerts")
 
+    __table_args__ = (
+        Index("ix_alerts_patient_timestamp", "patient_id", "timestamp"),
+        # Only open alerts, so dashboard counts don't scan acknowledged history.
+        Index("ix_alerts_open", "patient_id",
+              sqlite_where=acknowledged_at.is_(None), postgresql_where=acknowledged_at.is_(None)),
+    )
+
 
 # ======================= HEART RATE =======================
 class HeartRate(Base):
     __tablename__ = "heartrate"
+    __table_args__ = (
+        Index("ix_heartrate_patient_timestamp", "patient_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -86,9 +154,117 @@ class HeartRate(Base):
 # ======================= BLOOD PRESSURE ===================
 class BloodPressure(Base):
     __tablename__ = "bloodpressure"
+    __table_args__ = (
+        Index("ix_bloodpressure_patient_timestamp", "patient_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     systolic = Column(Integer)
     diastolic = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+
+# ======================= GLUCOSE ROLLUP ===================
+class GlucoseRollup(Base):
+    """Per-patient hourly/daily glucose aggregates, maintained on insert."""
+    __tablename__ = "glucose_rollups"
+    __table_args__ = (
+        UniqueConstraint("patient_id", "granularity", "bucket_start", name="uq_glucose_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    granularity = Column(String, nullable=False)  # "hour" | "day"
+    bucket_start = Column(DateTime, nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    total_sq = Column(Float, nullable=False, default=0.0)
+    min_mgdl = Column(Float)
+    max_mgdl = Column(Float)
+
+    n_below_54 = Column(Integer, nullable=False, default=0)
+    n_below_70 = Column(Integer, nullable=False, default=0)
+    n_in_range = Column(Integer, nullable=False, default=0)  # 70-180 mg/dL
+    n_above_180 = Column(Integer, nullable=False, default=0)
+    n_above_250 = Column(Integer, nullable=False, default=0)
+
+
+# ======================= VITALS ROLLUP ====================
+class VitalsRollup(Base):
+    """Hourly/daily heart rate and blood pressure aggregates, written by the
+    retention job for the samples it moves to the archive.
+
+    kind "heartrate": value_1 = bpm. kind "bloodpressure": value_1 =
+    systolic, value_2 = diastolic.
+    """
+    __tablename__ = "vitals_rollups"
+    __table_args__ = (
+        UniqueConstraint("patient_id", "kind", "granularity", "bucket_start", name="uq_vitals_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    granularity = Column(String, nullable=False)  # "hour" | "day"
+    bucket_start = Column(DateTime, nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    total_1 = Column(Float)
+    min_1 = Column(Float)
+    max_1 = Column(Float)
+    total_2 = Column(Float)
+    min_2 = Column(Float)
+    max_2 = Column(Float)
+
+
+# ======================= RISK SCORES ======================
+class RiskRun(Base):
+    """One run of the risk scoring job. status: running | done | failed.
+
+    Nightly runs carry the date in `nightly_key`; its unique constraint lets
+    exactly one worker claim each night.
+    """
+    __tablename__ = "risk_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    trigger = Column(String, nullable=False)  # "nightly" | "manual"
+    nightly_key = Column(String, nullable=True, unique=True)
+    status = Column(String, nullable=False, default="running")
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    window_days = Column(Integer, nullable=False)
+    patients = Column(Integer, nullable=True)
+    readings = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+
+
+class RiskScore(Base):
+    """Latest risk score per patient; each completed run replaces them all.
+
+    Glucose indices (Kovatchev LBGI/HBGI), variability, alert counts, vitals
+    trends and adherence cover the run's window. Null means no data.
+    """
+    __tablename__ = "risk_scores"
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    run_id = Column(Integer, ForeignKey("risk_runs.id"), nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+    score = Column(Float, nullable=False, index=True)  # 0-100
+
+    readings = Column(Integer, nullable=False, default=0)
+    mean_mgdl = Column(Float)
+    sd_mgdl = Column(Float)
+    cv = Column(Float)
+    lbgi = Column(Float)
+    hbgi = Column(Float)
+    pct_below_70 = Column(Float)
+    pct_above_180 = Column(Float)
+    alerts = Column(Integer, nullable=False, default=0)
+    hr_mean = Column(Float)
+    hr_slope = Column(Float)  # bpm per day
+    systolic_mean = Column(Float)
+    systolic_slope = Column(Float)  # mmHg per day
+    diastolic_mean = Column(Float)
+    adherence_percent = Column(Float)
@@ -0,0 +1,405 @@
+# backend/risk.py
+"""Population risk scoring: a batch job that scores every patient's
+hypo/hyperglycaemia risk over the last CAREPLUS_RISK_WINDOW_DAYS.
+
+Patients are split into id ranges of CAREPLUS_RISK_CHUNK_PATIENTS and the
+ranges are scored in a process pool. Each task streams its readings
+CAREPLUS_RISK_FETCH_ROWS at a time and folds every batch into per-patient
+accumulators with np.bincount, so memory stays bounded by the batch size,
+not the table. Vitals, alerts and doses come from the same range
+queries. The parent turns the sums into indices, scores them, and
+replaces risk_scores in one transaction.
+
+Per patient:
+
+    lbgi, hbgi        Kovatchev low/high blood glucose indices
+    mean, sd, cv      glucose variability; cv above 0.36 is "unstable"
+    pct_below_70/180  time below / above range
+    alerts            alerts raised in the window
+    hr/systolic       mean and least-squares slope per day
+    adherence         taken / (taken + skipped + missed) doses
+
+The score (0-100) is a weighted sum of those, each mapped onto 0-1 (see
+WEIGHTS and components()). It ranks patients for review and is not a
+clinical index.
+
+Runs nightly at CAREPLUS_RISK_RUN_AT (UTC, off by default) from the app
+lifespan, on demand via POST /risk/runs, or from the command line:
+
+    python -m backend.risk --processes 8
+"""
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from backend import jobs, models
+from backend.cache import cache
+from backend.db import make_engine
+
+WINDOW_DAYS = int(os.getenv("CAREPLUS_RISK_WINDOW_DAYS", "14"))
+# "HH:MM" UTC for the nightly run; off unless set. With several API workers
+# each one waits for it, and the per-night claim in risk_runs lets one run.
+RUN_AT = os.getenv("CAREPLUS_RISK_RUN_AT", "")
+# Pool size; 0 scores in the calling process. The default leaves cores for
+# the API workers sharing the host.
+PROCESSES = int(os.getenv("CAREPLUS_RISK_PROCESSES") or min(4, max((os.cpu_count() or 1) // 2, 1)))
+CHUNK_PATIENTS = int(os.getenv("CAREPLUS_RISK_CHUNK_PATIENTS", "500"))
+FETCH_ROWS = int(os.getenv("CAREPLUS_RISK_FETCH_ROWS", "200000"))
+# A run still "running" after this long is taken to have died.
+STALE_AFTER = timedelta(seconds=float(os.getenv("CAREPLUS_RISK_STALE_S", "3600")))
+
+RISK_TAG = "risk"
+SORTS = ("score", "lbgi", "hbgi", "cv", "alerts")
+
+# Share of the score per component; each component is in [0, 1].
+WEIGHTS = {
+    "hypo": 35.0,         # LBGI 5 (high risk) -> 1
+    "hyper": 20.0,        # HBGI 15 -> 1
+    "variability": 15.0,  # CV 0.2 -> 0, 0.5 -> 1
+    "alerts": 10.0,       # 4 alerts a day -> 1
+    "adherence": 10.0,    # 100% -> 0, 0% -> 1
+    "vitals": 10.0,       # systolic mean 130 -> 0, 180 -> 1, or rising 1 mmHg / 1 bpm a day
+}
+
+log = logging.getLogger("careplus.risk")
+
+# Accumulated per patient by each task.
+SUMS = ("n", "total", "total_sq", "rl", "rh", "below_70", "above_180",
+        "alerts", "taken", "counted",
+        "hr_n", "hr_t", "hr_tt", "hr_y", "hr_ty",
+        "bp_n", "bp_t", "bp_tt", "bp_y", "bp_ty", "bp_dia")
+
+
+# ---------------- TASK (runs in the pool) -------------------
+_engines: Dict[str, object] = {}
+
+
+def _engine(url: str):
+    # One engine per worker process, reused by every task it runs.
+    if url not in _engines:
+        _engines[url] = make_engine(url)
+    return _engines[url]
+
+
+def _fold(acc: Dict[str, np.ndarray], idx: np.ndarray, **values) -> None:
+    size = len(acc["n"])
+    for key, weights in values.items():
+        acc[key] += np.bincount(idx, weights, minlength=size)
+
+
+def glucose_risk(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-sample low and high risk (Kovatchev 1997, mg/dL)."""
+    f = 1.509 * (np.log(np.clip(values, 20.0, 600.0)) ** 1.084 - 5.381)
+    r = 10.0 * f * f
+    return np.where(f < 0, r, 0.0), np.where(f > 0, r, 0.0)
+
+
+def _days(timestamps: List[datetime], now: datetime) -> np.ndarray:
+    ts = np.array(timestamps, dtype="datetime64[us]")
+    return (ts - np.datetime64(now, "us")) / np.timedelta64(1, "D")
+
+
+def score_range(url: str, lo: int, hi: int, start: datetime, now: datetime,
+                fetch_rows: int = FETCH_ROWS) -> Dict[str, np.ndarray]:
+    """Sums for patient ids lo..hi (inclusive), indexed by id - lo."""
+    R, H, B, A, E = models.Reading, models.HeartRate, models.BloodPressure, models.Alert, models.DoseEvent
+    acc = {key: np.zeros(hi - lo + 1) for key in SUMS}
+    with _engine(url).connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=fetch_rows).execute(
+            select(R.patient_id, R.value_mgdl)
+            .where(R.patient_id.between(lo, hi), R.timestamp >= start, R.timestamp < now)
+        )
+        for part in result.partitions():
+            # Unzip first: np.array() over Row objects probes each one for
+            # array attributes, which costs more than the query.
+            pids, values = zip(*part)
+            idx = np.array(pids, dtype=np.intp) - lo
+            v = np.array(values, dtype=np.float64)
+            rl, rh = glucose_risk(v)
+            _fold(acc, idx, n=None, total=v, total_sq=v * v, rl=rl, rh=rh,
+                  below_70=v < 70, above_180=v > 180)
+
+        # Vitals are a few samples a day; no need to stream them.
+        for model, fields, prefix in ((H, (H.bpm,), "hr"), (B, (B.systolic, B.diastolic), "bp")):
+            rows = conn.execute(
+                select(model.patient_id, model.timestamp, *fields)
+                .where(model.patient_id.between(lo, hi), model.timestamp >= start, model.timestamp < now)
+            ).all()
+            if not rows:
+                continue
+            pids, stamps, *vals = zip(*rows)
+            idx = np.array(pids, dtype=np.intp) - lo
+            t = _days(list(stamps), now)
+            y = np.array(vals[0], dtype=np.float64)
+            _fold(acc, idx, **{f"{prefix}_n": None, f"{prefix}_t": t, f"{prefix}_tt": t * t,
+                               f"{prefix}_y": y, f"{prefix}_ty": t * y})
+            if prefix == "bp":
+                _fold(acc, idx, bp_dia=np.array(vals[1], dtype=np.float64))
+
+        for pid, n in conn.execute(
+            select(A.patient_id, func.count())
+            .where(A.patient_id.between(lo, hi), A.timestamp >= start, A.timestamp < now)
+            .group_by(A.patient_id)
+        ):
+            acc["alerts"][pid - lo] = n
+
+        # Same rule as doses.adherence: overdue pending doses count as missed.
+        missed = or_(E.status == "missed", and_(E.status == "pending", E.late_at < now))
+        for pid, taken, counted in conn.execute(
+            select(
+                E.patient_id,
+                func.sum(case((E.status == "taken", 1), else_=0)),
+                func.sum(case((or_(E.status.in_(("taken", "skipped")), missed), 1), else_=0)),
+            )
+            .where(E.patient_id.between(lo, hi), E.scheduled_at >= start, E.scheduled_at < now)
+            .group_by(E.patient_id)
+        ):
+            acc["taken"][pid - lo] = taken or 0
+            acc["counted"][pid - lo] = counted or 0
+    return acc
+
+
+# ---------------- SCORING -------------------
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """num / den, NaN where den is 0."""
+    out = np.full(len(den), np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _slope(n, t, tt, y, ty) -> np.ndarray:
+    """Least-squares slope from running sums; NaN under two distinct times."""
+    den = n * tt - t * t
+    out = np.full(len(n), np.nan)
+    np.divide(n * ty - t * y, den, out=out, where=(n >= 2) & (den > 1e-9))
+    return out
+
+
+def indices(acc: Dict[str, np.ndarray], window_days: int) -> Dict[str, np.ndarray]:
+    """Turn task sums into per-patient indices (NaN = no data)."""
+    n = acc["n"]
+    mean = _ratio(acc["total"], n)
+    var = np.maximum(_ratio(acc["total_sq"], n) - mean * mean, 0.0)
+    sd = np.sqrt(var)
+    return {
+        "readings": n,
+        "mean_mgdl": mean,
+        "sd_mgdl": sd,
+        "cv": _ratio(sd, mean),
+        "lbgi": _ratio(acc["rl"], n),
+        "hbgi": _ratio(acc["rh"], n),
+        "pct_below_70": 100.0 * _ratio(acc["below_70"], n),
+        "pct_above_180": 100.0 * _ratio(acc["above_180"], n),
+        "alerts": acc["alerts"],
+        "alerts_per_day": acc["alerts"] / max(window_days, 1),
+        "hr_mean": _ratio(acc["hr_y"], acc["hr_n"]),
+        "hr_slope": _slope(acc["hr_n"], acc["hr_t"], acc["hr_tt"], acc["hr_y"], acc["hr_ty"]),
+        "systolic_mean": _ratio(acc["bp_y"], acc["bp_n"]),
+        "systolic_slope": _slope(acc["bp_n"], acc["bp_t"], acc["bp_tt"], acc["bp_y"], acc["bp_ty"]),
+        "diastolic_mean": _ratio(acc["bp_dia"], acc["bp_n"]),
+        "adherence_percent": 100.0 * _ratio(acc["taken"], acc["counted"]),
+    }
+
+
+def components(ix: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Each WEIGHTS component in [0, 1]; missing data contributes 0."""
+    def unit(x):
+        return np.nan_to_num(np.clip(x, 0.0, 1.0), nan=0.0)
+
+    return {
+        "hypo": unit(ix["lbgi"] / 5.0),
+        "hyper": unit(ix["hbgi"] / 15.0),
+        "variability": unit((ix["cv"] - 0.2) / 0.3),
+        "alerts": unit(ix["alerts_per_day"] / 4.0),
+        "adherence": unit(1.0 - ix["adherence_percent"] / 100.0),
+        "vitals": np.maximum.reduce([
+            unit((ix["systolic_mean"] - 130.0) / 50.0),
+            unit(ix["systolic_slope"]),
+            unit(ix["hr_slope"]),
+        ]),
+    }
+
+
+def score(ix: Dict[str, np.ndarray]) -> np.ndarray:
+    parts = components(ix)
+    return sum(WEIGHTS[k] * parts[k] for k in WEIGHTS)
+
+
+def _rows(patient_ids: np.ndarray, ix: Dict[str, np.ndarray], scores: np.ndarray,
+          run_id: int, now: datetime) -> List[dict]:
+    columns = [c.key for c in models.RiskScore.__table__.columns
+               if c.key not in ("patient_id", "run_id", "computed_at", "score")]
+    values = {}
+    for key in columns:
+        arr = ix[key]
+        if key in ("readings", "alerts"):
+            values[key] = arr.astype(np.int64).tolist()
+        else:
+            values[key] = [None if math.isnan(x) else round(x, 4) for x in arr.tolist()]
+    out = []
+    for i, pid in enumerate(patient_ids.tolist()):
+        row = {"patient_id": pid, "run_id": run_id, "computed_at": now, "score": round(float(scores[i]), 2)}
+        for key in columns:
+            row[key] = values[key][i]
+        out.append(row)
+    return out
+
+
+# ---------------- RUNS -------------------
+def claim(session_factory, trigger: str, now: datetime, nightly_key: Optional[str] = None) -> Optional[int]:
+    """Record a new run and return its id; None if another worker already
+    claimed this night or a run is in progress."""
+    with session_factory() as db:
+        busy = db.scalar(
+            select(models.RiskRun.id)
+            .where(models.RiskRun.status == "running", models.RiskRun.started_at > now - STALE_AFTER)
+            .limit(1)
+        )
+        if busy is not None:
+            return None
+        run = models.RiskRun(trigger=trigger, nightly_key=nightly_key, status="running",
+                             started_at=now, window_days=WINDOW_DAYS)
+        db.add(run)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return None
+        return run.id
+
+
+def compute(session_factory, run_id: int, now: datetime, processes: int = PROCESSES,
+            chunk: int = CHUNK_PATIENTS) -> dict:
+    """Score every patient for a claimed run and swap in the results."""
+    t0 = time.perf_counter()
+    start = now - timedelta(days=WINDOW_DAYS)
+    try:
+        with session_factory() as db:
+            url = db.get_bind().url.render_as_string(hide_password=False)
+            patient_ids = np.array(db.scalars(select(models.Patient.id).order_by(models.Patient.id)).all(),
+                                   dtype=np.int64)
+        groups = np.array_split(patient_ids, max(1, math.ceil(len(patient_ids) / max(chunk, 1))))
+        ranges = [(int(g[0]), int(g[-1])) for g in groups if len(g)]
+
+        if processes > 0 and len(ranges) > 1:
+            # spawn, not fork: the parent has threads and open connections.
+            with ProcessPoolExecutor(min(processes, len(ranges)), mp_context=get_context("spawn")) as pool:
+                parts = list(pool.map(score_range, *zip(*((url, lo, hi, start, now) for lo, hi in ranges))))
+        else:
+            parts = [score_range(url, lo, hi, start, now) for lo, hi in ranges]
+
+        rows: List[dict] = []
+        readings = 0
+        for group, (lo, _), acc in zip((g for g in groups if len(g)), ranges, parts):
+            sel = {key: arr[group - lo] for key, arr in acc.items()}
+            ix = indices(sel, WINDOW_DAYS)
+            rows.extend(_rows(group, ix, score(ix), run_id, now))
+            readings += int(sel["n"].sum())
+
+        with session_factory() as db:
+            db.execute(delete(models.RiskScore))
+            if rows:
+                db.execute(insert(models.RiskScore.__table__), rows)
+            run = db.get(models.RiskRun, run_id)
+            run.status, run.finished_at = "done", datetime.utcnow()
+            run.patients, run.readings = len(rows), readings
+            db.commit()
+    except Exception as exc:
+        with session_factory() as db:
+            run = db.get(models.RiskRun, run_id)
+            run.status, run.finished_at, run.error = "failed", datetime.utcnow(), str(exc)[:500]
+            db.commit()
+        raise
+    log.info("risk run %d: %d patients, %d readings in %.1fs",
+             run_id, len(rows), readings, time.perf_counter() - t0)
+    return {"run_id": run_id, "patients": len(rows), "readings": readings}
+
+
+def run_once(session_factory, trigger: str = "manual", now: Optional[datetime] = None,
+             nightly_key: Optional[str] = None, processes: int = PROCESSES) -> Optional[dict]:
+    now = now or datetime.utcnow()
+    run_id = claim(session_factory, trigger, now, nightly_key)
+    if run_id is None:
+        return None
+    return compute(session_factory, run_id, now, processes)
+
+
+async def risk_loop(session_factory, at: str = RUN_AT) -> None:
+    """Background task started from the app lifespan. Every worker waits
+    for the same minute; the nightly_key claim lets one of them run."""
+    def nightly(due: datetime) -> Optional[dict]:
+        return run_once(session_factory, "nightly", due, due.date().isoformat())
+
+    def report(done: Optional[dict], seconds: float) -> None:
+        if done is not None:
+            cache.invalidate(RISK_TAG)
+
+    await jobs.loop(log, "nightly risk run", nightly, jobs.daily(at), report)
+
+
+# ---------------- QUERIES -------------------
+def run_dict(run: models.RiskRun) -> dict:
+    return {c.key: getattr(run, c.key) for c in models.RiskRun.__table__.columns if c.key != "nightly_key"}
+
+
+async def runs(db, limit: int) -> List[dict]:
+    result = await db.scalars(select(models.RiskRun).order_by(models.RiskRun.id.desc()).limit(limit))
+    return [run_dict(r) for r in result.all()]
+
+
+async def ranking(db, ward: Optional[str], cohort: Optional[str], sort: str,
+                  limit: int, offset: int) -> dict:
+    if sort not in SORTS:
+        raise HTTPException(400, f"sort must be one of {', '.join(SORTS)}")
+    S, P = models.RiskScore, models.Patient
+    key = getattr(S, sort)
+    stmt = select(S, P.name, P.ward, P.cohort).join(P, P.id == S.patient_id)
+    count = select(func.count()).select_from(S).join(P, P.id == S.patient_id)
+    if ward is not None:
+        stmt, count = stmt.where(P.ward == ward), count.where(P.ward == ward)
+    if cohort is not None:
+        stmt, count = stmt.where(P.cohort == cohort), count.where(P.cohort == cohort)
+    # NULLs (no data for that index) last on either backend.
+    stmt = stmt.order_by(key.is_(None), key.desc(), S.patient_id).limit(limit).offset(offset)
+    rows = (await db.execute(stmt)).all()
+    total = await db.scalar(count)
+    columns = [c.key for c in S.__table__.columns]
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "sort": sort,
+        "results": [
+            {**{k: getattr(s, k) for k in columns}, "name": name, "ward": w, "cohort": c}
+            for s, name, w, c in rows
+        ],
+    }
+
+
+async def for_patient(db, patient_id: int) -> Optional[dict]:
+    s = await db.get(models.RiskScore, patient_id)
+    return None if s is None else {c.key: getattr(s, c.key) for c in models.RiskScore.__table__.columns}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from backend.db import SessionLocal, engine
+    from backend.migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Score every patient's glycaemic risk now")
+    parser.add_argument("--processes", type=int, default=PROCESSES)
+    args = parser.parse_args()
+    migrate(engine)
+    t0 = time.perf_counter()
+    print(run_once(SessionLocal, processes=args.processes), f"{time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,300 @@
+# backend/rollups.py
+import math
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import case, delete, select, tuple_
+from sqlalchemy.orm import Session
+
+from backend import models
+
+GRANULARITIES = ("hour", "day")
+
+# Consensus time-in-range bands (mg/dL).
+VERY_LOW, LOW, HIGH, VERY_HIGH = 54, 70, 180, 250
+
+COUNTERS = ("n_below_54", "n_below_70", "n_in_range", "n_above_180", "n_above_250")
+
+MAX_WINDOW = timedelta(days=366)
+
+_WINDOW_RE = re.compile(r"^(\d+)([hdw])$")
+_WINDOW_UNITS = {"h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_window(window: str) -> timedelta:
+    m = _WINDOW_RE.match(window.strip().lower())
+    if not m:
+        raise HTTPException(400, "window must look like 24h, 14d or 4w")
+    delta = timedelta(**{_WINDOW_UNITS[m.group(2)]: int(m.group(1))})
+    if not timedelta(0) < delta <= MAX_WINDOW:
+        raise HTTPException(400, "window out of range")
+    return delta
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _band_counts(v: float) -> Tuple[int, int, int, int, int]:
+    return (
+        int(v < VERY_LOW),
+        int(v < LOW),
+        int(LOW <= v <= HIGH),
+        int(v > HIGH),
+        int(v > VERY_HIGH),
+    )
+
+
+def aggregate(rows: Iterable[dict]) -> List[dict]:
+    """Fold reading rows into one partial rollup per (patient, granularity, bucket)."""
+    acc: Dict[Tuple[int, str, datetime], dict] = {}
+    for row in rows:
+        v = row["value_mgdl"]
+        bands = _band_counts(v)
+        for gran in GRANULARITIES:
+            key = (row["patient_id"], gran, bucket_start(row["timestamp"], gran))
+            a = acc.get(key)
+            if a is None:
+                a = acc[key] = {
+                    "patient_id": key[0], "granularity": gran, "bucket_start": key[2],
+                    "count": 0, "total": 0.0, "total_sq": 0.0,
+                    "min_mgdl": v, "max_mgdl": v,
+                    **{c: 0 for c in COUNTERS},
+                }
+            a["count"] += 1
+            a["total"] += v
+            a["total_sq"] += v * v
+            if v < a["min_mgdl"]:
+                a["min_mgdl"] = v
+            if v > a["max_mgdl"]:
+                a["max_mgdl"] = v
+            for c, n in zip(COUNTERS, bands):
+                a[c] += n
+    return list(acc.values())
+
+
+def aggregate_vitals(kind: str, rows: Iterable[dict], fields: Tuple[str, ...]) -> List[dict]:
+    """Fold heart rate / blood pressure rows into VitalsRollup rows; the
+    first field maps to the *_1 columns and the second (if any) to *_2."""
+    acc: Dict[Tuple[int, str, datetime], dict] = {}
+    for row in rows:
+        for gran in GRANULARITIES:
+            key = (row["patient_id"], gran, bucket_start(row["timestamp"], gran))
+            a = acc.get(key)
+            if a is None:
+                a = acc[key] = {
+                    "patient_id": key[0], "kind": kind, "granularity": gran,
+                    "bucket_start": key[2], "count": 0,
+                }
+            a["count"] += 1
+            for n, f in enumerate(fields, start=1):
+                v = row[f]
+                if v is None:
+                    continue
+                a[f"total_{n}"] = a.get(f"total_{n}", 0.0) + v
+                a[f"min_{n}"] = v if a.get(f"min_{n}") is None else min(a[f"min_{n}"], v)
+                a[f"max_{n}"] = v if a.get(f"max_{n}") is None else max(a[f"max_{n}"], v)
+    cols = ("total_1", "min_1", "max_1", "total_2", "min_2", "max_2")
+    return [{**{c: None for c in cols}, **a} for a in acc.values()]
+
+
+def _merge_into(existing: models.GlucoseRollup, part: dict) -> None:
+    for col in ("count", "total", "total_sq", *COUNTERS):
+        setattr(existing, col, getattr(existing, col) + part[col])
+    existing.min_mgdl = min(existing.min_mgdl, part["min_mgdl"])
+    existing.max_mgdl = max(existing.max_mgdl, part["max_mgdl"])
+
+
+def apply(db: Session, rows: List[dict]) -> None:
+    """Add freshly inserted reading rows to their hourly and daily rollups.
+
+    Runs inside the caller's transaction. SQLite and PostgreSQL get a single
+    ON CONFLICT upsert executemany; other backends merge row by row.
+    """
+    parts = aggregate(rows)
+    if not parts:
+        return
+
+    table = models.GlucoseRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+
+        stmt = upsert(table)
+        ex = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["patient_id", "granularity", "bucket_start"],
+            set_={
+                **{c: table.c[c] + ex[c] for c in ("count", "total", "total_sq", *COUNTERS)},
+                "min_mgdl": case((ex.min_mgdl < table.c.min_mgdl, ex.min_mgdl), else_=table.c.min_mgdl),
+                "max_mgdl": case((ex.max_mgdl > table.c.max_mgdl, ex.max_mgdl), else_=table.c.max_mgdl),
+            },
+        )
+        db.execute(stmt, parts)
+        return
+
+    keys = [(p["patient_id"], p["granularity"], p["bucket_start"]) for p in parts]
+    R = models.GlucoseRollup
+    existing = {
+        (r.patient_id, r.granularity, r.bucket_start): r
+        for r in db.scalars(
+            select(R).where(tuple_(R.patient_id, R.granularity, R.bucket_start).in_(keys))
+        )
+    }
+    for key, part in zip(keys, parts):
+        if key in existing:
+            _merge_into(existing[key], part)
+        else:
+            db.add(R(**part))
+    db.flush()
+
+
+def rebuild(db: Session, patient_id: Optional[int] = None, chunk_size: int = 50000) -> int:
+    """Recompute rollups from raw readings (backfill / repair). Returns rows read."""
+    R, Rd = models.GlucoseRollup, models.Reading
+    clear = delete(R)
+    stmt = select(Rd.patient_id, Rd.timestamp, Rd.value_mgdl).where(Rd.value_mgdl.is_not(None))
+    if patient_id is not None:
+        clear = clear.where(R.patient_id == patient_id)
+        stmt = stmt.where(Rd.patient_id == patient_id)
+    db.execute(clear)
+
+    seen = 0
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    for chunk in result.partitions(chunk_size):
+        apply(db, [r._asdict() for r in chunk])
+        seen += len(chunk)
+    return seen
+
+
+# ---------------- SUMMARY -------------------
+def _stats(count: int, total: float, total_sq: float, vmin, vmax, bands: Dict[str, int]) -> dict:
+    if count == 0:
+        return {"readings": 0}
+    mean = total / count
+    var = max(total_sq / count - mean * mean, 0.0)
+    sd = math.sqrt(var)
+    pct = lambda n: round(100.0 * n / count, 1)  # noqa: E731
+    return {
+        "readings": count,
+        "mean_mgdl": round(mean, 1),
+        "sd_mgdl": round(sd, 1),
+        "cv_percent": round(100.0 * sd / mean, 1) if mean else None,
+        "min_mgdl": vmin,
+        "max_mgdl": vmax,
+        # Bergenstal et al. 2018
+        "gmi_percent": round(3.31 + 0.02392 * mean, 2),
+        # ADAG (Nathan et al. 2008)
+        "estimated_a1c_percent": round((mean + 46.7) / 28.7, 2),
+        "time_very_low_percent": pct(bands["n_below_54"]),
+        "time_low_percent": pct(bands["n_below_70"] - bands["n_below_54"]),
+        "time_in_range_percent": pct(bands["n_in_range"]),
+        "time_high_percent": pct(bands["n_above_180"] - bands["n_above_250"]),
+        "time_very_high_percent": pct(bands["n_above_250"]),
+    }
+
+
+def summarize_values(values: np.ndarray) -> dict:
+    """Vectorised stats over raw readings (used when rollups are missing)."""
+    if values.size == 0:
+        return _stats(0, 0.0, 0.0, None, None, {})
+    bands = {
+        "n_below_54": int(np.count_nonzero(values < VERY_LOW)),
+        "n_below_70": int(np.count_nonzero(values < LOW)),
+        "n_in_range": int(np.count_nonzero((values >= LOW) & (values <= HIGH))),
+        "n_above_180": int(np.count_nonzero(values > HIGH)),
+        "n_above_250": int(np.count_nonzero(values > VERY_HIGH)),
+    }
+    return _stats(
+        int(values.size), float(values.sum()), float(np.dot(values, values)),
+        float(values.min()), float(values.max()), bands,
+    )
+
+
+def summarize_rollups(rows: List[models.GlucoseRollup]) -> dict:
+    rows = [r for r in rows if r.count]
+    if not rows:
+        return _stats(0, 0.0, 0.0, None, None, {})
+    return _stats(
+        sum(r.count for r in rows),
+        sum(r.total for r in rows),
+        sum(r.total_sq for r in rows),
+        min(r.min_mgdl for r in rows),
+        max(r.max_mgdl for r in rows),
+        {c: sum(getattr(r, c) for r in rows) for c in COUNTERS},
+    )
+
+
+def rollup_query(patient_id: int, start: datetime, end: datetime):
+    """Rollup rows covering [start, end): whole days as daily buckets and
+    the partial days at either edge as hourly buckets.
+
+    The window is aligned to the hour, so a 14 day summary reads at most
+    15 daily rows plus 48 hourly rows, however dense the raw data is.
+    """
+    R = models.GlucoseRollup
+    start = bucket_start(start, "hour")
+    first_day = bucket_start(start, "day")
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = bucket_start(end, "day")
+
+    if first_day >= last_day:
+        cond = (R.granularity == "hour") & (R.bucket_start >= start) & (R.bucket_start < end)
+    else:
+        cond = (
+            ((R.granularity == "day") & (R.bucket_start >= first_day) & (R.bucket_start < last_day))
+            | ((R.granularity == "hour") & (R.bucket_start >= start) & (R.bucket_start < first_day))
+            | ((R.granularity == "hour") & (R.bucket_start >= last_day) & (R.bucket_start < end))
+        )
+    return select(R).where(R.patient_id == patient_id, cond)
+
+
+def raw_values_query(patient_id: int, start: datetime, end: datetime):
+    Rd = models.Reading
+    return select(Rd.value_mgdl).where(
+        Rd.patient_id == patient_id,
+        Rd.timestamp >= start,
+        Rd.timestamp < end,
+        Rd.value_mgdl.is_not(None),
+    )
+
+
+async def summary(db, patient_id: int, window: timedelta, source: str = "auto") -> dict:
+    end = datetime.utcnow()
+    start = end - window
+    out = {"patient_id": patient_id, "start": start, "end": end}
+
+    if source != "raw":
+        rows = (await db.scalars(rollup_query(patient_id, start, end))).all()
+        stats = summarize_rollups(rows)
+        if stats["readings"] or source == "rollup":
+            return {**out, "source": "rollup", **stats}
+
+    # No rollups in range (history predating them, or source=raw requested).
+    from backend import archive
+
+    values = (await db.scalars(raw_values_query(patient_id, start, end))).all()
+    hot = np.fromiter(values, dtype=np.float64, count=len(values))
+    cold = archive.series("readings", patient_id, start, end, ("value_mgdl",))[1]["value_mgdl"]
+    stats = summarize_values(np.concatenate([cold[~np.isnan(cold)], hot]))
+    return {**out, "source": "raw", **stats}
+
+
+if __name__ == "__main__":
+    from backend.db import SessionLocal, engine
+    from backend.migrations import migrate
+
+    migrate(engine)
+    with SessionLocal() as session:
+        n = rebuild(session)
+        session.commit()
+    print(f"Rebuilt glucose rollups from {n} readings.")
@@ -1,30 +1,49 @@
-from typing import List
-from .models import Patient, Reading, Alert
-from datetime import datetime
-
-def evaluate_reading(patient: Patient, reading: Reading) -> List[Alert]:
-    alerts: List[Alert] = []
-    t = patient.target or {
-        "fasting": {"min": 80, "max": 130},
-        "post_meal": {"min": 80, "max": 180},
-        "random": {"min": 80, "max": 180}
-    }
-    ctx = reading.context or 'random'
-    target = t.get(ctx, t["random"])  # type: ignore
-    low, high = target["min"], target["max"]
-
-    if reading.value_mgdl < low or reading.value_mgdl > high:
-        severe = reading.value_mgdl < 54 or reading.value_mgdl > 300
-        alerts.append(
-            Alert(
-                patient_id=patient.id,
-                timestamp=datetime.utcnow(),
-                severity='high' if severe else 'medium',
-                type='reading_range',
-                message=(
-                    f"Dangerous glucose {reading.value_mgdl} mg/dL" if severe
-                    else f"Out-of-range glucose {reading.value_mgdl} mg/dL"
-                )
-            )
-        )
-    return alerts
+from typing import Optional, Tuple
+
+DEFAULT_TARGET = {
+    "fasting": {"min": 80, "max": 130},
+    "post_meal": {"min": 80, "max": 180},
+    "random": {"min": 80, "max": 180}
+}
+
+
+def target_range(target: Optional[dict], context: Optional[str]) -> Tuple[float, float]:
+    t = target or DEFAULT_TARGET
+    ctx = context or 'random'
+    rng = t.get(ctx, t.get("random", DEFAULT_TARGET["random"]))  # type: ignore
+    return rng["min"], rng["max"]
+
+
+# The classifiers return (severity, message, direction) for an abnormal
+# value, or None. direction ("low" | "high") keeps lows and highs on
+# separate alert cooldowns.
+def classify_glucose(value: float, low: float, high: float) -> Optional[Tuple[str, str, str]]:
+    if low <= value <= high:
+        return None
+    direction = 'low' if value < low else 'high'
+    severe = value < 54 or value > 300
+    if severe:
+        return 'high', f"Dangerous glucose {value} mg/dL", direction
+    return 'medium', f"Out-of-range glucose {value} mg/dL", direction
+
+
+def classify_heart_rate(bpm: int) -> Optional[Tuple[str, str, str]]:
+    direction = 'low' if bpm < 50 else 'high'
+    if bpm < 40 or bpm > 150:
+        return 'high', f"Dangerous heart rate {bpm} bpm", direction
+    if bpm < 50:
+        return 'medium', f"Low heart rate {bpm} bpm", direction
+    if bpm > 120:
+        return 'medium', f"High heart rate {bpm} bpm", direction
+    return None
+
+
+def classify_blood_pressure(systolic: int, diastolic: int) -> Optional[Tuple[str, str, str]]:
+    reading = f"{systolic}/{diastolic} mmHg"
+    if systolic >= 180 or diastolic >= 120:
+        return 'high', f"Hypertensive crisis {reading}", 'high'
+    if systolic < 90 or diastolic < 60:
+        return 'medium', f"Low blood pressure {reading}", 'low'
+    if systolic >= 140 or diastolic >= 90:
+        return 'medium', f"High blood pressure {reading}", 'high'
+    return None
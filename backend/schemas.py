@@ -1,6 +1,6 @@
 # backend/schemas.py
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Any
 from datetime import datetime, date
 
 
@@ -8,6 +8,8 @@ from datetime import datetime, date
 class PatientCreate(BaseModel):
     name: str
     diabetes_type: str = "T2D"
+    ward: Optional[str] = None
+    cohort: Optional[str] = None
     date_of_birth: Optional[date] = None
     blood_pressure: Optional[str] = None
     heart_rate: Optional[int] = None
@@ -24,12 +26,24 @@ class PatientOut(PatientCreate):
         orm_mode = True
 
 
+class PatientSearchHit(PatientOut):
+    score: float
+
+
+class PatientSearchOut(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    results: List[PatientSearchHit]
+
+
 # ==================== READINGS =====================
 class ReadingCreate(BaseModel):
     patient_id: int
     value_mgdl: float
     context: str = "random"
     notes: Optional[str] = None
+    timestamp: Optional[datetime] = None
 
 
 class ReadingOut(BaseModel):
@@ -43,6 +57,52 @@ class ReadingOut(BaseModel):
         orm_mode = True
 
 
+# ==================== READING BATCHES =====================
+class ReadingBatchCreate(BaseModel):
+    # Items are validated one by one so a bad sample rejects only itself.
+    readings: List[Any]
+
+
+class ReadingBatchItemResult(BaseModel):
+    index: int
+    status: str  # "accepted" | "rejected"
+    error: Optional[str] = None
+
+
+class ReadingBatchResult(BaseModel):
+    accepted: int
+    rejected: int
+    alerts: int
+    results: List[ReadingBatchItemResult]
+
+
+# ==================== WRITE-BEHIND INGEST =====================
+class IngestStatusOut(BaseModel):
+    ingest_id: str
+    status: str  # "queued" | "committed" | "failed"
+
+
+# ==================== GLUCOSE SUMMARY =====================
+class GlucoseSummaryOut(BaseModel):
+    patient_id: int
+    start: datetime
+    end: datetime
+    source: str  # "rollup" | "raw"
+    readings: int
+    mean_mgdl: Optional[float] = None
+    sd_mgdl: Optional[float] = None
+    cv_percent: Optional[float] = None
+    min_mgdl: Optional[float] = None
+    max_mgdl: Optional[float] = None
+    gmi_percent: Optional[float] = None
+    estimated_a1c_percent: Optional[float] = None
+    time_very_low_percent: Optional[float] = None
+    time_low_percent: Optional[float] = None
+    time_in_range_percent: Optional[float] = None
+    time_high_percent: Optional[float] = None
+    time_very_high_percent: Optional[float] = None
+
+
 # ==================== ALERTS =====================
 class AlertOut(BaseModel):
     id: int
@@ -50,11 +110,58 @@ class AlertOut(BaseModel):
     severity: str
     type: str
     message: str
+    acknowledged_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
 
+# ==================== WARD DASHBOARD =====================
+class DashboardReading(BaseModel):
+    timestamp: datetime
+    value_mgdl: float
+    context: Optional[str] = None
+
+
+class DashboardHeartRate(BaseModel):
+    timestamp: datetime
+    bpm: int
+
+
+class DashboardBloodPressure(BaseModel):
+    timestamp: datetime
+    systolic: int
+    diastolic: int
+
+
+class DashboardMedication(BaseModel):
+    id: int
+    name: str
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+
+
+class DashboardPatient(BaseModel):
+    id: int
+    name: str
+    diabetes_type: Optional[str] = None
+    ward: Optional[str] = None
+    cohort: Optional[str] = None
+    latest_reading: Optional[DashboardReading] = None
+    latest_heart_rate: Optional[DashboardHeartRate] = None
+    latest_blood_pressure: Optional[DashboardBloodPressure] = None
+    open_alerts: int
+    open_high_alerts: int
+    medications: List[DashboardMedication]
+
+
+class DashboardOut(BaseModel):
+    ward: Optional[str] = None
+    cohort: Optional[str] = None
+    count: int
+    patients: List[DashboardPatient]
+
+
 # ==================== HEART RATE =====================
 class HeartRateCreate(BaseModel):
     bpm: int
@@ -101,3 +208,120 @@ class MedicationOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+# ==================== SCHEDULES & DOSES =====================
+class ScheduleCreate(BaseModel):
+    times: Optional[List[str]] = None  # "HH:MM" in `timezone`
+    days: Optional[List[int]] = None  # 0 = Monday; every day if omitted
+    every_hours: Optional[float] = None
+    timezone: str = "UTC"
+    grace_minutes: int = 60
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+
+
+class ScheduleOut(BaseModel):
+    id: int
+    medication_id: int
+    patient_id: int
+    times: Optional[List[str]] = None
+    days: Optional[List[int]] = None
+    every_hours: Optional[float] = None
+    timezone: str
+    grace_minutes: int
+    start_at: datetime
+    end_at: Optional[datetime] = None
+    materialized_until: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class DoseUpdate(BaseModel):
+    status: str  # "taken" | "skipped"
+    taken_at: Optional[datetime] = None
+
+
+class DoseOut(BaseModel):
+    id: Optional[int] = None  # None for slots not materialized yet
+    patient_id: int
+    patient_name: Optional[str] = None
+    ward: Optional[str] = None
+    medication_id: int
+    medication: str
+    dosage: Optional[str] = None
+    schedule_id: int
+    scheduled_at: datetime
+    late_at: datetime
+    status: str  # "scheduled" | "pending" | "taken" | "skipped" | "missed"
+    taken_at: Optional[datetime] = None
+
+
+class AdherenceEntry(BaseModel):
+    patient_id: int
+    medication_id: Optional[int] = None
+    taken: int
+    skipped: int
+    missed: int
+    pending: int
+    adherence_percent: Optional[float] = None
+
+
+class AdherenceOut(BaseModel):
+    start: datetime
+    end: datetime
+    taken: int
+    skipped: int
+    missed: int
+    pending: int
+    adherence_percent: Optional[float] = None
+    entries: List[AdherenceEntry]
+
+
+class RiskRunOut(BaseModel):
+    id: int
+    trigger: str  # "nightly" | "manual"
+    status: str  # "running" | "done" | "failed"
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    window_days: int
+    patients: Optional[int] = None
+    readings: Optional[int] = None
+    error: Optional[str] = None
+
+
+class RiskScoreOut(BaseModel):
+    patient_id: int
+    run_id: int
+    computed_at: datetime
+    score: float
+    readings: int
+    mean_mgdl: Optional[float] = None
+    sd_mgdl: Optional[float] = None
+    cv: Optional[float] = None
+    lbgi: Optional[float] = None
+    hbgi: Optional[float] = None
+    pct_below_70: Optional[float] = None
+    pct_above_180: Optional[float] = None
+    alerts: int
+    hr_mean: Optional[float] = None
+    hr_slope: Optional[float] = None
+    systolic_mean: Optional[float] = None
+    systolic_slope: Optional[float] = None
+    diastolic_mean: Optional[float] = None
+    adherence_percent: Optional[float] = None
+
+
+class RiskRankEntry(RiskScoreOut):
+    name: str
+    ward: Optional[str] = None
+    cohort: Optional[str] = None
+
+
+class RiskRankOut(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    sort: str
+    results: List[RiskRankEntry]
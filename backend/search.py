@@ -0,0 +1,330 @@
+# backend/search.py
+"""In-memory patient name index for /patients/search.
+
+Names are split into words. Every distinct word gets a postings list of
+patient slots, a place in a sorted vocabulary (prefix lookups are a bisect)
+and its trigrams (typo lookups: candidate words sharing trigrams with the
+query word, confirmed by edit distance). A query matches a patient when
+each query word matches one of the patient's words exactly, as a prefix,
+or within 1-2 edits, and patients are ranked by how good those matches
+are. Filters work on per-slot arrays, so a query touches postings and
+arrays, never the database; only the returned page is read from it.
+
+The index is per process. The patient handlers keep it in sync with their
+own writes, and it is rebuilt from the database every
+CAREPLUS_SEARCH_REFRESH_S so writes made elsewhere (other workers, seed
+scripts, bulk loads) show up too.
+"""
+import asyncio
+import bisect
+import os
+import re
+import time
+import unicodedata
+from array import array
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from backend import models
+
+# Full rebuild interval, to pick up writes made by other processes.
+REFRESH_S = float(os.getenv("CAREPLUS_SEARCH_REFRESH_S", "300"))
+# Build the index in the background at startup rather than on first search.
+WARM_ON_STARTUP = os.getenv("CAREPLUS_SEARCH_WARM", "1").lower() in ("1", "true", "yes", "on")
+# Most vocabulary words one query word may expand to (prefix + fuzzy).
+MAX_EXPANSIONS = 2000
+# Fuzzy candidates checked with edit distance per query word.
+MAX_FUZZY_CANDIDATES = 200
+MAX_QUERY_WORDS = 6
+
+SCORE_EXACT, SCORE_PREFIX, SCORE_FUZZY = 3.0, 2.0, 1.0
+
+_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: Optional[str]) -> List[str]:
+    """Lowercase, accent-free words."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [w for w in _SPLIT.split(text) if w]
+
+
+def trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(word: str) -> int:
+    if word.isdigit() or len(word) < 3:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it's exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        best = i
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            best = min(best, cur[j])
+        if best > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class PatientIndex:
+    def __init__(self):
+        self._reset()
+        self.built_at: Optional[float] = None
+        self._rebuilding: Optional[asyncio.Task] = None
+        # Writes made while a build is reading the table, replayed onto it.
+        self._replay: Optional[list] = None
+        # Set by backend.bus so other workers index the same writes.
+        self.relay: Optional[Callable[[int, Optional[tuple]], None]] = None
+
+    def _reset(self) -> None:
+        # Per slot. A patient update retires its slot and appends a new one.
+        self.ids = array("q")
+        self.alive = bytearray()
+        self.dtypes = array("h")  # index into self.dtype_names
+        self.dobs = array("i")  # date ordinal, 0 = unknown
+        self.slot_of: Dict[int, int] = {}
+        self.dtype_names: List[Optional[str]] = []
+        self.dtype_codes: Dict[Optional[str], int] = {}
+        # Vocabulary.
+        self.words: Dict[str, int] = {}
+        self.word_text: List[str] = []
+        self.postings: List[array] = []
+        self.sorted_words: List[str] = []
+        self.sorted_ids: List[int] = []  # word ids in sorted_words order
+        self.word_trigrams: Dict[str, array] = {}
+        self.live = 0
+
+    def __len__(self) -> int:
+        return self.live
+
+    # ---------------- WRITES -------------------
+    def _word_id(self, word: str, sort: bool = True) -> int:
+        wid = self.words.get(word)
+        if wid is None:
+            wid = len(self.word_text)
+            self.words[word] = wid
+            self.word_text.append(word)
+            self.postings.append(array("i"))
+            if sort:
+                at = bisect.bisect_left(self.sorted_words, word)
+                self.sorted_words.insert(at, word)
+                self.sorted_ids.insert(at, wid)
+            for tg in trigrams(word):
+                self.word_trigrams.setdefault(tg, array("i")).append(wid)
+        return wid
+
+    def _add(self, patient_id: int, name: Optional[str], diabetes_type: Optional[str],
+             date_of_birth: Optional[date], sort: bool = True) -> None:
+        slot = len(self.ids)
+        self.ids.append(patient_id)
+        self.alive.append(1)
+        code = self.dtype_codes.get(diabetes_type)
+        if code is None:
+            code = self.dtype_codes[diabetes_type] = len(self.dtype_names)
+            self.dtype_names.append(diabetes_type)
+        self.dtypes.append(code)
+        self.dobs.append(date_of_birth.toordinal() if date_of_birth else 0)
+        for word in set(normalize(name)):
+            self.postings[self._word_id(word, sort)].append(slot)
+        self.slot_of[patient_id] = slot
+        self.live += 1
+
+    def add(self, patient) -> None:
+        """Index (or re-index) a Patient after it has been committed."""
+        row = (patient.id, patient.name, patient.diabetes_type, patient.date_of_birth)
+        self.index_row(row)
+        if self.relay is not None:
+            self.relay(patient.id, row)
+
+    def index_row(self, row: Tuple[int, Optional[str], Optional[str], Optional[date]]) -> None:
+        if self._replay is not None:
+            self._replay.append(row)
+        self._drop(row[0])
+        self._add(*row)
+
+    def remove(self, patient_id: int) -> None:
+        self.unindex(patient_id)
+        if self.relay is not None:
+            self.relay(patient_id, None)
+
+    def unindex(self, patient_id: int) -> None:
+        if self._replay is not None:
+            self._replay.append(patient_id)
+        self._drop(patient_id)
+
+    def _drop(self, patient_id: int) -> None:
+        slot = self.slot_of.pop(patient_id, None)
+        if slot is not None:
+            self.alive[slot] = 0
+            self.live -= 1
+
+    # ---------------- BUILD -------------------
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, Optional[str], Optional[str], Optional[date]]]) -> "PatientIndex":
+        index = cls()
+        for pid, name, dtype, dob in rows:
+            index._add(pid, name, dtype, dob, sort=False)
+        index.sorted_words = sorted(index.words)
+        index.sorted_ids = [index.words[w] for w in index.sorted_words]
+        index.built_at = time.monotonic()
+        return index
+
+    @staticmethod
+    def load_rows(session_factory) -> list:
+        P = models.Patient
+        with session_factory() as db:
+            return db.execute(select(P.id, P.name, P.diabetes_type, P.date_of_birth).order_by(P.id)).all()
+
+    async def ensure_fresh(self, session_factory) -> None:
+        """Build on first use; afterwards rebuild in the background when
+        older than REFRESH_S, answering from the current index meanwhile."""
+        if self.built_at is None:
+            if self._rebuilding is None:
+                self._rebuilding = asyncio.create_task(self._rebuild(session_factory))
+            await asyncio.shield(self._rebuilding)
+            return
+        stale = REFRESH_S and time.monotonic() - self.built_at > REFRESH_S
+        if stale and self._rebuilding is None:
+            self._rebuilding = asyncio.create_task(self._rebuild(session_factory))
+
+    async def _rebuild(self, session_factory) -> None:
+        self._replay = []
+        try:
+            rows = await run_in_threadpool(self.load_rows, session_factory)
+            fresh = await run_in_threadpool(self.build, rows)
+            for item in self._replay:
+                if isinstance(item, tuple):
+                    fresh._drop(item[0])
+                    fresh._add(*item)
+                else:
+                    fresh._drop(item)
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items()
+                                  if k not in ("_rebuilding", "_replay", "relay")})
+        finally:
+            self._replay = None
+            self._rebuilding = None
+
+    # ---------------- QUERY -------------------
+    def _expand(self, word: str, prefix: bool) -> Dict[int, float]:
+        """Vocabulary words matching one query word, with their scores."""
+        out: Dict[int, float] = {}
+        if prefix:
+            lo = bisect.bisect_left(self.sorted_words, word)
+            # "{" sorts right after "z", and words are [0-9a-z] only.
+            hi = bisect.bisect_left(self.sorted_words, word + "{", lo)
+            out = dict.fromkeys(self.sorted_ids[lo:min(hi, lo + MAX_EXPANSIONS)], SCORE_PREFIX)
+        limit = max_edits(word)
+        if limit:
+            grams = [self.word_trigrams[t] for t in trigrams(word) if t in self.word_trigrams]
+            if grams:
+                shared = np.bincount(
+                    np.concatenate([np.frombuffer(g, dtype=np.int32) for g in grams]),
+                    minlength=len(self.word_text),
+                )
+                # A word within k edits (a transposition spoils up to four
+                # of its len + 1 trigrams) shares at least this many.
+                need = max(1, len(word) + 1 - 4 * limit)
+                candidates = np.flatnonzero(shared >= need)
+                if len(candidates) > MAX_FUZZY_CANDIDATES:
+                    top = np.argpartition(-shared[candidates], MAX_FUZZY_CANDIDATES)[:MAX_FUZZY_CANDIDATES]
+                    candidates = candidates[top]
+                for wid in candidates.tolist():
+                    if wid in out:
+                        continue
+                    d = edit_distance(word, self.word_text[wid], limit)
+                    if d <= limit:
+                        out[wid] = SCORE_FUZZY - 0.25 * d
+        wid = self.words.get(word)
+        if wid is not None:
+            out[wid] = SCORE_EXACT
+        return out
+
+    def search(self, q: str = "", diabetes_type: Optional[str] = None,
+               dob_min: Optional[date] = None, dob_max: Optional[date] = None,
+               include: Optional[Iterable[int]] = None, exclude: Optional[Iterable[int]] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[int, List[Tuple[int, float]]]:
+        """(total matches, [(patient_id, score)] for the page), best first.
+
+        Every word of `q` must match; the last one also matches as a prefix
+        (the user is probably still typing it). `include`/`exclude` restrict
+        to / drop patient ids. Without `q`, matches are ordered by id.
+        """
+        n = len(self.ids)
+        mask = np.frombuffer(self.alive, dtype=np.uint8).astype(bool) if n else np.zeros(0, bool)
+        score = np.zeros(n, dtype=np.float32)
+
+        words = normalize(q)[:MAX_QUERY_WORDS]
+        for i, word in enumerate(words):
+            by_score: Dict[float, list] = {}
+            for wid, s in self._expand(word, prefix=(i == len(words) - 1)).items():
+                by_score.setdefault(s, []).append(np.frombuffer(self.postings[wid], dtype=np.int32))
+            best = np.zeros(n, dtype=np.float32)
+            for s in sorted(by_score):  # ascending, so the best score per slot wins
+                best[np.concatenate(by_score[s])] = s
+            mask &= best > 0
+            score += best
+
+        if diabetes_type is not None:
+            code = self.dtype_codes.get(diabetes_type)
+            if code is None:
+                return 0, []
+            mask &= np.frombuffer(self.dtypes, dtype=np.int16) == code
+        if dob_min is not None or dob_max is not None:
+            dobs = np.frombuffer(self.dobs, dtype=np.int32)
+            mask &= dobs > 0
+            if dob_min is not None:
+                mask &= dobs >= dob_min.toordinal()
+            if dob_max is not None:
+                mask &= dobs <= dob_max.toordinal()
+        if include is not None:
+            keep = np.zeros(n, dtype=bool)
+            keep[[s for s in (self.slot_of.get(pid) for pid in include) if s is not None]] = True
+            mask &= keep
+        if exclude is not None:
+            drop = [s for s in (self.slot_of.get(pid) for pid in exclude) if s is not None]
+            mask[drop] = False
+
+        hits = np.flatnonzero(mask)
+        ids = np.frombuffer(self.ids, dtype=np.int64)[hits] if n else np.zeros(0, np.int64)
+        order = np.lexsort((ids, -score[hits])) if words else np.argsort(ids, kind="stable")
+        page = order[offset:offset + limit]
+        return len(hits), list(zip(ids[page].tolist(), score[hits][page].tolist()))
+
+
+patient_index = PatientIndex()
+
+
+def age_bounds(age_min: Optional[int], age_max: Optional[int], today: date) -> Tuple[Optional[date], Optional[date]]:
+    """date_of_birth range for people aged age_min..age_max (inclusive) today."""
+    def years_ago(years: int) -> date:
+        try:
+            return today.replace(year=today.year - years)
+        except ValueError:  # 29 February
+            return today.replace(year=today.year - years, day=28)
+
+    dob_max = years_ago(age_min) if age_min is not None else None
+    dob_min = None
+    if age_max is not None:
+        dob_min = date.fromordinal(years_ago(age_max + 1).toordinal() + 1)
+    return dob_min, dob_max
@@ -1,17 +1,22 @@
 # backend/seed.py
 from datetime import date, datetime, timedelta
 
-from backend.db import SessionLocal, engine, Base
-from backend import models
+from backend.db import SessionLocal, engine
+from backend.migrations import migrate
+from backend import models, rollups
 
 def run():
     print("🌱 Seeding Care+ database...")
 
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
     db = SessionLocal()
 
     # Clear existing data
+    db.query(models.DoseEvent).delete()
+    db.query(models.MedicationSchedule).delete()
     db.query(models.Alert).delete()
+    db.query(models.GlucoseRollup).delete()
+    db.query(models.VitalsRollup).delete()
     db.query(models.Reading).delete()
     db.query(models.Patient).delete()
     db.commit()
@@ -61,6 +66,8 @@ def run():
             ))
         db.add_all(readings)
     db.commit()
+    rollups.rebuild(db)
+    db.commit()
 
     # --- Create example alerts ---
     alerts = [
@@ -0,0 +1,53 @@
+# backend/serialization.py
+import json
+from datetime import date, datetime
+from typing import Any, List, Sequence
+
+from sqlalchemy import null
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+FORMATS = ("rows", "columnar")
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def schema_columns(model, schema) -> List:
+    """Table columns for each field of an output schema, in field order.
+
+    Fields the table doesn't have come back as NULL, matching the schema's
+    None default.
+    """
+    cols = []
+    for name in schema.model_fields:
+        attr = getattr(model, name, None)
+        cols.append(attr if attr is not None else null().label(name))
+    return cols
+
+
+def encode_rows(names: Sequence[str], rows: Sequence[Sequence], format: str = "rows") -> bytes:
+    """Encode plain result tuples without building ORM or Pydantic objects.
+
+    "rows" gives the usual list of objects. "columnar" gives one array per
+    column plus a count, e.g. {"count": 2, "timestamp": [...], "value_mgdl":
+    [...]}, which charting libraries can take as-is.
+    """
+    if format == "columnar":
+        arrays = list(zip(*rows)) if rows else [()] * len(names)
+        out = {"count": len(rows)}
+        out.update((n, list(a)) for n, a in zip(names, arrays))
+        return dumps(out)
+    return dumps([dict(zip(names, r)) for r in rows])
@@ -0,0 +1,21 @@
+# backend/timeutil.py
+"""Datetime helpers shared by the API and the engines.
+
+The database stores naive UTC datetimes. Clients may send an offset, and
+comparing aware with naive datetimes raises TypeError, so everything is
+converted with to_utc() where it comes in.
+"""
+from datetime import datetime, timezone, tzinfo
+from typing import Optional
+
+
+def to_utc(value: Optional[datetime], zone: tzinfo = timezone.utc) -> Optional[datetime]:
+    """`value` as naive UTC. Aware values are converted; naive ones are taken
+    to be wall-clock time in `zone` (UTC unless given)."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        if zone is timezone.utc:
+            return value
+        value = value.replace(tzinfo=zone)
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
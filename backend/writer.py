@@ -0,0 +1,284 @@
+# backend/writer.py
+"""Write-behind ingestion for single readings and vitals.
+
+With CAREPLUS_INGEST_MODE=queued, POST /readings, /patients/{id}/heartrate
+and /patients/{id}/bloodpressure validate the sample, run the alert engine
+and publish any alert straight away, then put the row on a bounded queue
+and answer 202 with an ingest id. A single background task drains the
+queue and group-commits whatever has arrived every CAREPLUS_INGEST_FLUSH_MS
+or CAREPLUS_INGEST_BATCH_ROWS rows, whichever comes first: one transaction
+and one fsync for many samples instead of one each.
+
+CAREPLUS_INGEST_DURABILITY picks when the client is answered:
+
+    accepted   on enqueue (fastest; a crash loses what is still queued)
+    committed  after the group commit containing the sample (still one
+               fsync per batch, since concurrent requests share it)
+
+A full queue answers 503 with Retry-After. On shutdown new samples are
+refused and the queue is drained before the process exits. If the drain
+times out, samples not yet handed to a write are marked failed, and a
+write already running is waited for and reported as it ends. Any sample
+whose insert fails is marked failed too. Callers waiting on a committed
+sample get WriteFailed (a 503) instead of waiting forever.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from starlette.concurrency import run_in_threadpool
+
+from backend import metrics, models, rollups
+from backend.cache import invalidate_patient
+from backend.events import broker
+
+MODE = os.getenv("CAREPLUS_INGEST_MODE", "direct").lower()  # "direct" | "queued"
+DURABILITY = os.getenv("CAREPLUS_INGEST_DURABILITY", "accepted").lower()  # "accepted" | "committed"
+QUEUE_SIZE = int(os.getenv("CAREPLUS_INGEST_QUEUE_SIZE", "10000"))
+FLUSH_MS = float(os.getenv("CAREPLUS_INGEST_FLUSH_MS", "5"))
+BATCH_ROWS = int(os.getenv("CAREPLUS_INGEST_BATCH_ROWS", "500"))
+DRAIN_TIMEOUT_S = float(os.getenv("CAREPLUS_INGEST_DRAIN_TIMEOUT_S", "30"))
+# Patient target/ward lookups are cached this long (per process).
+META_TTL_S = float(os.getenv("CAREPLUS_INGEST_META_TTL_S", "60"))
+# How many ingest ids keep a queryable status.
+STATUS_KEEP = 100_000
+
+log = logging.getLogger("careplus.writer")
+
+# kind -> (table, cache kind, event type)
+KINDS = {
+    "reading": (models.Reading.__table__, "readings", "reading"),
+    "heart_rate": (models.HeartRate.__table__, "heartrate", "heart_rate"),
+    "blood_pressure": (models.BloodPressure.__table__, "bloodpressure", "blood_pressure"),
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteFailed(Exception):
+    pass
+
+
+class PatientMeta:
+    """Per-process cache of (target, ward) so enqueueing needs no query."""
+
+    def __init__(self, ttl: float = META_TTL_S):
+        self.ttl = ttl
+        self._data: Dict[int, Tuple[float, Optional[dict], Optional[str]]] = {}
+
+    async def get(self, db, patient_id: int) -> Optional[Tuple[Optional[dict], Optional[str]]]:
+        hit = self._data.get(patient_id)
+        if hit is not None and hit[0] > time.monotonic():
+            return hit[1], hit[2]
+        row = (await db.execute(
+            select(models.Patient.target, models.Patient.ward).where(models.Patient.id == patient_id)
+        )).first()
+        if row is None:
+            self._data.pop(patient_id, None)
+            return None
+        self._data[patient_id] = (time.monotonic() + self.ttl, row[0], row[1])
+        return row[0], row[1]
+
+    def forget(self, patient_id: int) -> None:
+        self._data.pop(patient_id, None)
+
+
+class Item:
+    __slots__ = ("ingest_id", "kind", "row", "alert_rows", "ward", "done")
+
+    def __init__(self, kind: str, row: dict, alert_rows: List[dict], ward: Optional[str],
+                 done: Optional[asyncio.Future]):
+        self.ingest_id = uuid.uuid4().hex
+        self.kind = kind
+        self.row = row
+        self.alert_rows = alert_rows
+        self.ward = ward
+        self.done = done
+
+
+def _write(items: List[Item]) -> None:
+    """One transaction for a whole batch (runs in the threadpool)."""
+    from backend.db import SessionLocal
+
+    by_kind: Dict[str, List[dict]] = {}
+    alert_rows: List[dict] = []
+    for it in items:
+        by_kind.setdefault(it.kind, []).append(it.row)
+        alert_rows.extend(it.alert_rows)
+
+    with SessionLocal() as db:
+        for kind, rows in by_kind.items():
+            db.execute(insert(KINDS[kind][0]), rows)
+            if kind == "reading":
+                rollups.apply(db, rows)
+        if alert_rows:
+            db.execute(insert(models.Alert.__table__), alert_rows)
+        db.commit()
+
+
+class WriteBehindQueue:
+    def __init__(self, maxsize: int = QUEUE_SIZE, flush_ms: float = FLUSH_MS,
+                 batch_rows: int = BATCH_ROWS, durability: str = DURABILITY):
+        self.maxsize = maxsize
+        self.flush_s = flush_ms / 1000.0
+        self.batch_rows = batch_rows
+        self.durability = durability
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.accepting = False
+        self.statuses: "OrderedDict[str, str]" = OrderedDict()
+        # Taken off the queue but not yet handed to _write.
+        self._batching: List[Item] = []
+        self._flushing: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(self.maxsize)
+        self.accepting = True
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT_S) -> None:
+        """Refuse new samples, flush what's queued, then stop the writer."""
+        if self.task is None:
+            return
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.error("ingest queue not drained after %.0fs; %d samples not written",
+                      timeout, self.queue.qsize() + len(self._batching))
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.task = None
+        # Nothing will write these now; fail them so no caller waits forever.
+        lost = self._batching
+        while not self.queue.empty():
+            lost.append(self.queue.get_nowait())
+            self.queue.task_done()
+        for it in lost:
+            self._failed(it, "ingest queue stopped before it was written")
+        self._batching = []
+        # A write already in the threadpool runs to the end regardless, so
+        # wait for it and let its samples report what really happened.
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+
+    def _set_status(self, ingest_id: str, status: str) -> None:
+        self.statuses[ingest_id] = status
+        self.statuses.move_to_end(ingest_id)
+        while len(self.statuses) > STATUS_KEEP:
+            self.statuses.popitem(last=False)
+
+    def status(self, ingest_id: str) -> Optional[str]:
+        return self.statuses.get(ingest_id)
+
+    async def submit(self, kind: str, row: dict, alert_rows: List[dict], ward: Optional[str]) -> str:
+        """Queue one sample. Its alerts were evaluated by the caller and are
+        published here, before anything touches the database."""
+        if not self.accepting:
+            raise QueueFull("ingest queue is shutting down")
+        done = asyncio.get_running_loop().create_future() if self.durability == "committed" else None
+        item = Item(kind, row, alert_rows, ward, done)
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            raise QueueFull("ingest queue is full")
+        self._set_status(item.ingest_id, "queued")
+        metrics.INGEST_QUEUE_DEPTH.set(self.queue.qsize())
+        broker.publish_alerts(alert_rows, {row["patient_id"]: ward})
+        if done is not None:
+            await done
+        return item.ingest_id
+
+    async def _batch(self) -> List[Item]:
+        items = self._batching = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_s
+        while len(items) < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            items = await self._batch()
+            self._batching = []
+            self._flushing = asyncio.create_task(self._flush(items))
+            try:
+                # Shielded: stop() cancels this loop, never a running write.
+                await asyncio.shield(self._flushing)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+                metrics.INGEST_QUEUE_DEPTH.set(self.queue.qsize())
+            self._flushing = None
+
+    async def _flush(self, items: List[Item]) -> None:
+        t0 = time.perf_counter()
+        try:
+            await run_in_threadpool(_write, items)
+        except Exception as exc:
+            if len(items) == 1:
+                log.exception("write-behind insert failed")
+                self._failed(items[0], str(exc))
+                return
+            # One bad sample (say, its patient was deleted meanwhile) must
+            # not sink the batch: retry them one transaction each.
+            log.warning("group commit of %d samples failed (%s); retrying one by one", len(items), exc)
+            for it in items:
+                await self._flush([it])
+            return
+        metrics.INGEST_BATCH_ROWS.observe(len(items))
+        metrics.INGEST_FLUSH_SECONDS.observe(time.perf_counter() - t0)
+        self._committed(items)
+
+    def _failed(self, item: Item, reason: str) -> None:
+        self._set_status(item.ingest_id, "failed")
+        if item.done is not None and not item.done.done():
+            item.done.set_exception(WriteFailed(f"sample {item.ingest_id} was not written: {reason}"))
+
+    def _committed(self, items: List[Item]) -> None:
+        touched: Dict[int, set] = {}
+        for it in items:
+            pid = it.row["patient_id"]
+            kinds = touched.setdefault(pid, set())
+            kinds.add(KINDS[it.kind][1])
+            if it.alert_rows:
+                kinds.add("alerts")
+        for pid, kinds in touched.items():
+            invalidate_patient(pid, *kinds)
+        for it in items:
+            self._set_status(it.ingest_id, "committed")
+            broker.publish(KINDS[it.kind][2], it.row["patient_id"], it.ward, it.row)
+            if it.done is not None and not it.done.done():
+                it.done.set_result(None)
+
+
+patient_meta = PatientMeta()
+write_queue = WriteBehindQueue()
+
+
+def enabled() -> bool:
+    return MODE == "queued" and write_queue.running
+
+
+def status(ingest_id: str) -> Optional[dict]:
+    state = write_queue.status(ingest_id)
+    return None if state is None else {"ingest_id": ingest_id, "status": state}
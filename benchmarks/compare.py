@@ -0,0 +1,77 @@
+# benchmarks/compare.py
+"""Compare two benchmarks.run result files and flag regressions.
+
+    python -m benchmarks.compare results/base.json results/head.json \\
+        --max-p99-regression 20 --max-throughput-regression 10
+
+Exits 1 if any endpoint present in both runs got slower at p99 or lost
+throughput by more than the given percentages, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+
+def pct_change(base: float, head: float) -> float:
+    if not base:
+        return 0.0
+    return (head - base) / base * 100
+
+
+def compare(base: dict, head: dict, max_p99: float, max_rps: float, min_count: int = 20):
+    rows, failures = [], []
+    labels = sorted(set(base["endpoints"]) | set(head["endpoints"]))
+    for label in labels + ["TOTAL"]:
+        b = base["total"] if label == "TOTAL" else base["endpoints"].get(label)
+        h = head["total"] if label == "TOTAL" else head["endpoints"].get(label)
+        if b is None or h is None:
+            rows.append((label, b, h, None, None, "only in " + ("head" if b is None else "base")))
+            continue
+        d_p99 = pct_change(b["p99_ms"], h["p99_ms"])
+        d_rps = pct_change(b["rps"], h["rps"])
+        verdict = ""
+        # Too few samples make p99 meaningless; report but don't gate on them.
+        if min(b["count"], h["count"]) >= min_count:
+            if d_p99 > max_p99:
+                verdict = "p99 regression"
+            elif -d_rps > max_rps:
+                verdict = "throughput regression"
+            if h["errors"] > b["errors"]:
+                verdict = (verdict + ", " if verdict else "") + "more errors"
+        if verdict:
+            failures.append(label)
+        rows.append((label, b, h, d_p99, d_rps, verdict))
+    return rows, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--max-p99-regression", type=float, default=20, help="percent")
+    parser.add_argument("--max-throughput-regression", type=float, default=10, help="percent")
+    parser.add_argument("--min-count", type=int, default=20, help="samples needed to gate an endpoint")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    rows, failures = compare(base, head, args.max_p99_regression,
+                             args.max_throughput_regression, args.min_count)
+    print(f"base {base['meta']['commit']}  head {head['meta']['commit']}")
+    print(f"{'endpoint':<40} {'p99 base':>9} {'p99 head':>9} {'Δp99':>8} {'rps base':>9} {'rps head':>9} {'Δrps':>8}")
+    for label, b, h, d_p99, d_rps, verdict in rows:
+        if d_p99 is None:
+            print(f"{label:<40} {verdict}")
+            continue
+        print(f"{label:<40} {b['p99_ms']:>9} {h['p99_ms']:>9} {d_p99:>+7.1f}% "
+              f"{b['rps']:>9} {h['rps']:>9} {d_rps:>+7.1f}%  {verdict}")
+    if failures:
+        print(f"\n{len(failures)} endpoint(s) regressed: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
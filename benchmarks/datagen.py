@@ -0,0 +1,138 @@
+# benchmarks/datagen.py
+"""Synthetic Care+ datasets, from the seed fixtures up to 10k patients /
+100M readings.
+
+    python -m benchmarks.datagen --url sqlite:///./bench.db --patients 10000 --readings 100000000
+
+Patients follow the shape of backend/seed.py; each gets a CGM-like trace
+(5 minute spacing, daily cycle and meal peaks around a per-patient mean) ending
+now, plus sparse heart rate, blood pressure and medication rows. Rows are
+written with chunked Core executemany inserts, so memory stays flat.
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert, text
+
+from backend.db import make_engine
+from backend.migrations import migrate
+from backend import models, rollups
+
+FIRST_NAMES = ["Ama", "Kwame", "Akua", "Kofi", "Yaa", "Kojo", "Esi", "Yaw", "Abena", "Kwesi"]
+LAST_NAMES = ["Mensah", "Asare", "Baah", "Owusu", "Boateng", "Appiah", "Darko", "Osei"]
+WARDS = ["A", "B", "C", "D", "ICU", "Outpatient"]
+CONTEXTS = ["random", "fasting", "post_meal"]
+
+CGM_INTERVAL = timedelta(minutes=5)
+
+
+def patient_rows(n: int, rng: np.random.Generator, start_id: int = 1):
+    for i in range(n):
+        yield {
+            "id": start_id + i,
+            "name": f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]} {start_id + i}",
+            "diabetes_type": "T1D" if rng.random() < 0.3 else "T2D",
+            "ward": WARDS[i % len(WARDS)],
+            "date_of_birth": date(1940, 1, 1) + timedelta(days=int(rng.integers(0, 365 * 70))),
+            "blood_pressure": "120/80 mmHg",
+            "heart_rate": int(rng.integers(60, 90)),
+            "weight": round(float(rng.normal(75, 12)), 1),
+        }
+
+
+def glucose_trace(n: int, rng: np.random.Generator) -> np.ndarray:
+    """Daily cycle + meal bumps + sensor noise around a per-patient mean."""
+    minutes = np.arange(n) * (CGM_INTERVAL.total_seconds() / 60)
+    day = 2 * np.pi * minutes / 1440
+    mean = rng.normal(150, 25)
+    trace = (
+        mean
+        + 30 * np.sin(day + rng.uniform(0, 2 * np.pi))
+        + 25 * np.maximum(np.sin(3 * day), 0)
+        + rng.normal(0, 10, n)
+    )
+    return np.clip(trace, 40, 400).round(1)
+
+
+def generate(url: str, patients: int, readings: int, chunk: int = 100_000,
+             seed: int = 42, with_rollups: bool = False, log=print) -> dict:
+    rng = np.random.default_rng(seed)
+    engine = make_engine(url)
+    migrate(engine)
+    per_patient = max(readings // max(patients, 1), 0)
+    end = datetime.utcnow().replace(microsecond=0)
+    t0 = time.perf_counter()
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient.__table__), list(patient_rows(patients, rng)))
+        if engine.dialect.name == "postgresql":
+            # Explicit ids don't advance the serial; the API's inserts would collide.
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('patients', 'id'), max(id)) FROM patients"))
+
+    written = 0
+    buf: list = []
+
+    def flush(conn):
+        nonlocal buf, written
+        if not buf:
+            return
+        conn.execute(insert(models.Reading.__table__), buf)
+        if with_rollups:
+            from sqlalchemy.orm import Session
+            with Session(bind=conn) as s:
+                rollups.apply(s, buf)
+        written += len(buf)
+        buf = []
+
+    with engine.begin() as conn:
+        for pid in range(1, patients + 1):
+            values = glucose_trace(per_patient, rng)
+            start = end - CGM_INTERVAL * per_patient
+            contexts = rng.integers(0, len(CONTEXTS), per_patient)
+            for i in range(per_patient):
+                buf.append({
+                    "patient_id": pid,
+                    "timestamp": start + CGM_INTERVAL * i,
+                    "value_mgdl": float(values[i]),
+                    "context": CONTEXTS[contexts[i]],
+                })
+                if len(buf) >= chunk:
+                    flush(conn)
+                    log(f"  readings {written:>12,}  ({written / (time.perf_counter() - t0):,.0f}/s)")
+        flush(conn)
+
+        # Vitals and meds are sparse next to CGM data: a few per patient-day.
+        days = max(per_patient * CGM_INTERVAL // timedelta(days=1), 1)
+        hr, bp, meds = [], [], []
+        for pid in range(1, patients + 1):
+            for d in range(0, days, max(days // 30, 1)):
+                ts = end - timedelta(days=d, hours=int(rng.integers(0, 24)))
+                hr.append({"patient_id": pid, "bpm": int(rng.normal(75, 10)), "timestamp": ts})
+                bp.append({"patient_id": pid, "systolic": int(rng.normal(125, 12)),
+                           "diastolic": int(rng.normal(80, 8)), "timestamp": ts})
+            meds.append({"patient_id": pid, "name": "Metformin", "dosage": "500 mg", "frequency": "twice daily"})
+        conn.execute(insert(models.HeartRate.__table__), hr)
+        conn.execute(insert(models.BloodPressure.__table__), bp)
+        conn.execute(insert(models.Medication.__table__), meds)
+
+    engine.dispose()
+    elapsed = time.perf_counter() - t0
+    return {"patients": patients, "readings": written, "seconds": round(elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Care+ dataset")
+    parser.add_argument("--url", default="sqlite:///./bench.db")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--readings", type=int, default=1_000_000, help="total glucose readings")
+    parser.add_argument("--chunk", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--with-rollups", action="store_true", help="maintain glucose rollups while loading")
+    args = parser.parse_args()
+    print(generate(args.url, args.patients, args.readings, args.chunk, args.seed, args.with_rollups))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# benchmarks/run.py
+"""Load-test the Care+ API with a mixed workload and report per-endpoint
+throughput and latency percentiles as JSON.
+
+In-process (ASGI transport, no network; the app is imported against --db):
+
+    python -m benchmarks.run --db sqlite:///./bench.db --patients 1000 --readings 1000000 \\
+        --duration 30 --concurrency 32 --out results/head.json
+
+Against uvicorn, either one already running or spawned here:
+
+    python -m benchmarks.run --target http://127.0.0.1:8000 --duration 30
+    python -m benchmarks.run --spawn-uvicorn --workers 4 --db sqlite:///./bench.db
+
+The dataset is generated with benchmarks.datagen the first time --db has no
+patients; later runs reuse it. Compare two result files with
+benchmarks.compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import httpx
+
+from benchmarks import workloads
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(recorder: workloads.Recorder, elapsed: float) -> dict:
+    def stats(lat, errors):
+        return {
+            "count": len(lat),
+            "errors": errors,
+            "rps": round(len(lat) / elapsed, 2),
+            "mean_ms": round(sum(lat) / len(lat) * 1000, 3) if lat else 0.0,
+            "p50_ms": round(percentile(lat, 50) * 1000, 3),
+            "p95_ms": round(percentile(lat, 95) * 1000, 3),
+            "p99_ms": round(percentile(lat, 99) * 1000, 3),
+            "max_ms": round(max(lat) * 1000, 3) if lat else 0.0,
+        }
+
+    endpoints = {
+        label: stats(lat, recorder.errors.get(label, 0))
+        for label, lat in sorted(recorder.latency.items())
+    }
+    everything = [s for lat in recorder.latency.values() for s in lat]
+    return {"endpoints": endpoints, "total": stats(everything, sum(recorder.errors.values()))}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def ensure_dataset(url: str, patients: int, readings: int) -> None:
+    from sqlalchemy import func, inspect, select
+
+    from backend import models
+    from backend.db import make_engine
+    from benchmarks import datagen
+
+    engine = make_engine(url)
+    try:
+        if inspect(engine).has_table(models.Patient.__tablename__):
+            with engine.connect() as conn:
+                if conn.execute(select(func.count()).select_from(models.Patient)).scalar():
+                    return
+    finally:
+        engine.dispose()
+    print(f"generating dataset: {patients:,} patients, {readings:,} readings", file=sys.stderr)
+    datagen.generate(url, patients, readings, log=lambda msg: print(msg, file=sys.stderr))
+
+
+async def drive(client: httpx.AsyncClient, args) -> dict:
+    resp = await client.get("/patients?format=columnar")
+    resp.raise_for_status()
+    patient_ids = resp.json()["id"]
+    if not patient_ids:
+        raise SystemExit("target has no patients; point --db at a generated dataset")
+
+    mix = workloads.parse_mix(args.mix)
+    names = list(mix)
+    weights = [mix[n][1] for n in names]
+    recorder = workloads.Recorder()
+
+    async def user(i: int, deadline: float):
+        rng = random.Random(args.seed + i)
+        ctx = workloads.Context(patient_ids, recorder, rng)
+        while time.perf_counter() < deadline:
+            await mix[rng.choices(names, weights)[0]][0](client, ctx)
+
+    if args.warmup:
+        await asyncio.gather(*(user(i, time.perf_counter() + args.warmup) for i in range(args.concurrency)))
+        recorder = workloads.Recorder()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(i, t0 + args.duration) for i in range(args.concurrency)))
+    return summarize(recorder, time.perf_counter() - t0)
+
+
+@asynccontextmanager
+async def inprocess_client(args):
+    # The backend reads its configuration at import time.
+    os.environ["CAREPLUS_DATABASE_URL"] = args.db
+    from backend.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            yield client
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def uvicorn_server(args):
+    port = free_port()
+    env = {**os.environ, "CAREPLUS_DATABASE_URL": args.db}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(args.workers), "--log-level", "warning",
+         "--no-access-log"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url) as probe:
+            for _ in range(300):
+                if proc.poll() is not None:
+                    raise SystemExit(f"uvicorn exited with {proc.returncode}")
+                try:
+                    if (await probe.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("uvicorn did not become healthy within 30s")
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+async def run(args) -> dict:
+    if args.target == "inprocess":
+        async with inprocess_client(args) as client:
+            return await drive(client, args)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.spawn_uvicorn:
+        async with uvicorn_server(args) as url:
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=None) as client:
+                return await drive(client, args)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=None) as client:
+        return await drive(client, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="inprocess",
+                        help='"inprocess" (default) or the base URL of a running server')
+    parser.add_argument("--spawn-uvicorn", action="store_true",
+                        help="start uvicorn against --db on a free port and target it")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --spawn-uvicorn")
+    parser.add_argument("--db", default="sqlite:///./bench.db", help="database URL for the app under test")
+    parser.add_argument("--patients", type=int, default=1000, help="dataset size if --db is empty")
+    parser.add_argument("--readings", type=int, default=1_000_000, help="dataset size if --db is empty")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=16, help="simulated users")
+    parser.add_argument("--mix", default="", help='workload weights, e.g. "dashboard_poll=80,ingest_burst=20"')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    if args.spawn_uvicorn:
+        args.target = "uvicorn"
+    if args.target in ("inprocess", "uvicorn"):
+        ensure_dataset(args.db, args.patients, args.readings)
+
+    results = asyncio.run(run(args))
+    results["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "target": args.target,
+        "workers": args.workers if args.spawn_uvicorn else None,
+        "db": args.db,
+        "db_mode": os.getenv("CAREPLUS_DB_MODE", "async"),
+        "duration_s": args.duration,
+        "concurrency": args.concurrency,
+        "mix": {name: weight for name, (_, weight) in workloads.parse_mix(args.mix).items()},
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    print(f"{'endpoint':<40} {'count':>8} {'err':>5} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8}", file=sys.stderr)
+    for label, s in {**results["endpoints"], "TOTAL": results["total"]}.items():
+        print(f"{label:<40} {s['count']:>8} {s['errors']:>5} {s['rps']:>9} "
+              f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
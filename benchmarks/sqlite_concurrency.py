@@ -0,0 +1,131 @@
+# benchmarks/sqlite_concurrency.py
+"""Concurrent read/write throughput on SQLite, default vs tuned profile.
+
+Writers mimic POST /readings (insert one reading, commit); readers mimic a
+dashboard poll (latest page of a patient's readings). Run from the repo root:
+
+    python -m benchmarks.sqlite_concurrency --seconds 10 --readers 4 --writers 2
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from backend.db import make_engine
+from backend.migrations import migrate
+from backend import models
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def prepare(url, profile, history):
+    engine = make_engine(url, profile)
+    migrate(engine)
+    start = datetime.utcnow() - timedelta(minutes=5 * history)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient.__table__), [{"id": 1, "name": "Bench"}])
+        conn.execute(insert(models.Reading.__table__), [
+            {"patient_id": 1, "timestamp": start + timedelta(minutes=5 * i),
+             "value_mgdl": 80 + i % 120, "context": "random"}
+            for i in range(history)
+        ])
+    return engine
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = prepare(url, profile, args.history)
+        stop = threading.Event()
+        stats = {"read": [], "write": [], "errors": 0}
+        lock = threading.Lock()
+
+        readings = models.Reading.__table__
+        page = (
+            select(readings)
+            .where(readings.c.patient_id == 1)
+            .order_by(readings.c.timestamp.desc())
+            .limit(100)
+        )
+
+        def writer():
+            lat = []
+            while not stop.is_set():
+                t = time.perf_counter()
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(readings), {
+                            "patient_id": 1, "timestamp": datetime.utcnow(),
+                            "value_mgdl": 110.0, "context": "random",
+                        })
+                    lat.append(time.perf_counter() - t)
+                except Exception:
+                    with lock:
+                        stats["errors"] += 1
+            with lock:
+                stats["write"].extend(lat)
+
+        def reader():
+            lat = []
+            while not stop.is_set():
+                t = time.perf_counter()
+                with engine.connect() as conn:
+                    conn.execute(page).fetchall()
+                lat.append(time.perf_counter() - t)
+            with lock:
+                stats["read"].extend(lat)
+
+        threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+        threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+        for th in threads:
+            th.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for th in threads:
+            th.join()
+        engine.dispose()
+
+    result = {"profile": profile, "errors": stats["errors"]}
+    for kind in ("read", "write"):
+        lat = stats[kind]
+        result[f"{kind}s_per_s"] = round(len(lat) / args.seconds, 1)
+        result[f"{kind}_p50_ms"] = round(percentile(lat, 50) * 1000, 3)
+        result[f"{kind}_p99_ms"] = round(percentile(lat, 99) * 1000, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--history", type=int, default=50000)
+    parser.add_argument("--profile", choices=["default", "tuned", "both"], default="both")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    profiles = ["default", "tuned"] if args.profile == "both" else [args.profile]
+    results = [run_profile(p, args) for p in profiles]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    cols = ["profile", "reads_per_s", "read_p50_ms", "read_p99_ms",
+            "writes_per_s", "write_p50_ms", "write_p99_ms", "errors"]
+    print(" | ".join(cols))
+    for r in results:
+        print(" | ".join(str(r[c]) for c in cols))
+
+
+if __name__ == "__main__":
+    main()
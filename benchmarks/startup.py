@@ -0,0 +1,138 @@
+# benchmarks/startup.py
+"""Measure how fast a fresh API worker becomes useful, against a budget.
+
+    python -m benchmarks.startup --db sqlite:///./bench.db --runs 5
+
+For each run:
+
+    import_ms          `import backend.main` in a fresh interpreter
+    ready_ms           uvicorn spawned until GET /health answers 200
+                       (interpreter start, imports, lifespan: schema check,
+                       pool warm-up)
+    first_request_ms   the first real read after that (GET /patients/{id})
+
+Medians are compared with --budget-import-ms and --budget-ready-ms; the
+exit status is 1 if either is exceeded, so CI can hold the line on
+autoscaling latency. The schema is migrated once up front and the workers
+start with CAREPLUS_MIGRATE=check, as they would in production.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.run import ensure_dataset, free_port, git_commit
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import backend.main; print(time.perf_counter() - t)"
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], env=env, text=True)
+    return float(out.strip().splitlines()[-1]) * 1000
+
+
+def measure_server(env: dict, workers: int, patient_id: int, timeout: float = 60) -> dict:
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                if proc.poll() is not None:
+                    raise SystemExit(f"uvicorn exited with {proc.returncode}")
+                if time.perf_counter() - t0 > timeout:
+                    raise SystemExit(f"uvicorn not ready after {timeout:.0f}s")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready = time.perf_counter() - t0
+            t1 = time.perf_counter()
+            client.get(f"/patients/{patient_id}").raise_for_status()
+            first = time.perf_counter() - t1
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {"ready_ms": ready * 1000, "first_request_ms": first * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="sqlite:///./bench.db", help="database URL for the app under test")
+    parser.add_argument("--patients", type=int, default=1000, help="dataset size if --db is empty")
+    parser.add_argument("--readings", type=int, default=100_000, help="dataset size if --db is empty")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers per run")
+    parser.add_argument("--budget-import-ms", type=float, default=1500)
+    parser.add_argument("--budget-ready-ms", type=float, default=3000)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    ensure_dataset(args.db, args.patients, args.readings)
+    from sqlalchemy import func, select
+
+    from backend import models
+    from backend.db import make_engine
+    from backend.migrations import migrate
+
+    engine = make_engine(args.db)
+    try:
+        migrate(engine)
+        with engine.connect() as conn:
+            patient_id = conn.execute(select(func.min(models.Patient.id))).scalar()
+    finally:
+        engine.dispose()
+
+    env = {**os.environ, "CAREPLUS_DATABASE_URL": args.db, "CAREPLUS_MIGRATE": "check"}
+    samples = []
+    for i in range(args.runs):
+        sample = {"import_ms": measure_import(env), **measure_server(env, args.workers, patient_id)}
+        samples.append({k: round(v, 1) for k, v in sample.items()})
+        print(f"run {i + 1}: " + ", ".join(f"{k} {v}" for k, v in samples[-1].items()), file=sys.stderr)
+
+    medians = {k: round(statistics.median(s[k] for s in samples), 1) for k in samples[0]}
+    budget = {"import_ms": args.budget_import_ms, "ready_ms": args.budget_ready_ms}
+    over = {k: medians[k] for k, limit in budget.items() if medians[k] > limit}
+    results = {
+        "median": medians,
+        "budget": budget,
+        "over_budget": over,
+        "runs": samples,
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "db": args.db,
+            "db_mode": os.getenv("CAREPLUS_DB_MODE", "async"),
+            "workers": args.workers,
+            "python": sys.version.split()[0],
+        },
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for key, limit in budget.items():
+        verdict = "OVER" if key in over else "ok"
+        print(f"{key:<18} median {medians[key]:>8} ms   budget {limit:>8} ms   {verdict}", file=sys.stderr)
+    print(f"{'first_request_ms':<18} median {medians['first_request_ms']:>8} ms", file=sys.stderr)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
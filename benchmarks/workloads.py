@@ -0,0 +1,155 @@
+# benchmarks/workloads.py
+"""Mixed API workloads for the load-test runner.
+
+Each workload is an async function (client, ctx) that issues one logical
+user action - possibly several requests - and records the latency of each
+request under its route template via ctx.timed(). The mix below is what a
+ward deployment looks like: mostly dashboards polling with ETags, CGM
+uploads in bursts, occasional history scrolling and patient admin.
+"""
+import random
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+CONTEXTS = ["random", "fasting", "post_meal"]
+BURST_SIZE = 500
+# One application/vnd.careplus.records record, as a device would pack it:
+# patient_id, ts_ms, kind, context, reserved, v1, v2.
+RECORD = struct.Struct("<IqBBHff")
+
+
+class Recorder:
+    """Per-endpoint latency samples and error counts for one run."""
+
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, label: str, seconds: float, ok: bool) -> None:
+        self.latency.setdefault(label, []).append(seconds)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+
+class Context:
+    def __init__(self, patient_ids: List[int], recorder: Recorder, rng: random.Random):
+        self.patient_ids = patient_ids
+        self.recorder = recorder
+        self.rng = rng
+        self.etags: Dict[str, str] = {}
+
+    def patient(self) -> int:
+        return self.rng.choice(self.patient_ids)
+
+    async def timed(self, label: str, call: Awaitable, ok=(200,)):
+        t = time.perf_counter()
+        try:
+            resp = await call
+        except Exception:
+            self.recorder.add(label, time.perf_counter() - t, False)
+            return None
+        self.recorder.add(label, time.perf_counter() - t, resp.status_code in ok)
+        return resp
+
+
+def _reading(pid: int, rng: random.Random, ts: datetime) -> dict:
+    return {
+        "patient_id": pid,
+        "value_mgdl": round(rng.gauss(150, 45), 1),
+        "context": rng.choice(CONTEXTS),
+        "timestamp": ts.isoformat(),
+    }
+
+
+async def ingest_burst(client, ctx: Context) -> None:
+    """A CGM bridge uploading a backlog: one batch of readings for a patient."""
+    pid = ctx.patient()
+    start = datetime.utcnow() - timedelta(minutes=5 * BURST_SIZE)
+    items = [_reading(pid, ctx.rng, start + timedelta(minutes=5 * i)) for i in range(BURST_SIZE)]
+    await ctx.timed("POST /readings/batch", client.post("/readings/batch", json={"readings": items}))
+
+
+async def ingest_binary(client, ctx: Context) -> None:
+    """ingest_burst's upload in the binary record format."""
+    pid = ctx.patient()
+    start_ms = int(time.time() * 1000) - 5 * 60_000 * BURST_SIZE
+    body = b"".join(
+        RECORD.pack(pid, start_ms + 5 * 60_000 * i, 0, ctx.rng.randrange(len(CONTEXTS)), 0,
+                    round(ctx.rng.gauss(150, 45), 1), 0.0)
+        for i in range(BURST_SIZE)
+    )
+    headers = {"content-type": "application/vnd.careplus.records"}
+    await ctx.timed("POST /ingest/records", client.post("/ingest/records", content=body, headers=headers))
+
+
+async def ingest_single(client, ctx: Context) -> None:
+    pid = ctx.patient()
+    await ctx.timed("POST /readings", client.post("/readings", json=_reading(pid, ctx.rng, datetime.utcnow())))
+
+
+async def dashboard_poll(client, ctx: Context) -> None:
+    """What the patient page fetches on each refresh, sending the last ETags."""
+    pid = ctx.patient()
+    for label, url in (
+        ("GET /patients/{id}", f"/patients/{pid}"),
+        ("GET /patients/{id}/readings", f"/patients/{pid}/readings?limit=100"),
+        ("GET /patients/{id}/alerts", f"/patients/{pid}/alerts?limit=50"),
+        ("GET /patients/{id}/glucose/summary", f"/patients/{pid}/glucose/summary?window=14d"),
+    ):
+        headers = {"If-None-Match": ctx.etags[url]} if url in ctx.etags else {}
+        resp = await ctx.timed(label, client.get(url, headers=headers), ok=(200, 304))
+        if resp is not None and "etag" in resp.headers:
+            ctx.etags[url] = resp.headers["etag"]
+
+
+async def history_scroll(client, ctx: Context, pages: int = 5) -> None:
+    """Walk back through a patient's readings with the keyset cursor."""
+    pid = ctx.patient()
+    cursor = None
+    for _ in range(pages):
+        url = f"/patients/{pid}/readings?limit=1000" + (f"&cursor={cursor}" if cursor else "")
+        resp = await ctx.timed("GET /patients/{id}/readings?cursor", client.get(url))
+        cursor = resp.headers.get("x-next-cursor") if resp is not None else None
+        if not cursor:
+            break
+
+
+async def patient_crud(client, ctx: Context) -> None:
+    body = {"name": f"Load Test {ctx.rng.randrange(10**9)}", "diabetes_type": "T2D", "ward": "A"}
+    resp = await ctx.timed("POST /patients", client.post("/patients", json=body))
+    if resp is None or resp.status_code != 200:
+        return
+    pid = resp.json()["id"]
+    await ctx.timed("GET /patients/{id}", client.get(f"/patients/{pid}"))
+    await ctx.timed("PUT /patients/{id}", client.put(f"/patients/{pid}", json={**body, "weight": 70.0}))
+    await ctx.timed("DELETE /patients/{id}", client.delete(f"/patients/{pid}"))
+
+
+Workload = Callable[..., Awaitable[None]]
+
+# name -> (workload, relative weight)
+MIX: Dict[str, tuple] = {
+    "dashboard_poll": (dashboard_poll, 60),
+    "ingest_single": (ingest_single, 20),
+    "history_scroll": (history_scroll, 10),
+    "ingest_burst": (ingest_burst, 5),
+    "patient_crud": (patient_crud, 5),
+    # Off by default; compare with e.g. --mix ingest_burst=50,ingest_binary=50
+    "ingest_binary": (ingest_binary, 0),
+}
+
+
+def parse_mix(spec: str) -> Dict[str, tuple]:
+    """"dashboard_poll=80,ingest_burst=20" -> subset of MIX with new weights."""
+    if not spec:
+        return MIX
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in MIX:
+            raise ValueError(f"unknown workload {name!r}; choose from {', '.join(MIX)}")
+        mix[name] = (MIX[name][0], float(weight or MIX[name][1]))
+    return mix
@@ -15,3 +15,15 @@ async function api(path, options = {}) {
 
   return res.json();
 }
+
+// Live readings, vitals and alerts over server-sent events.
+// filters: { patients: [ids], wards: [names] }; empty means everything.
+function subscribe(filters = {}, onEvent) {
+  const qs = new URLSearchParams();
+  (filters.patients || []).forEach(id => qs.append("patient_id", id));
+  (filters.wards || []).forEach(w => qs.append("ward", w));
+
+  const source = new EventSource(`${API_BASE}/events/stream?${qs}`);
+  source.onmessage = e => onEvent(JSON.parse(e.data));
+  return source;
+}
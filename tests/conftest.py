@@ -0,0 +1,53 @@
+# tests/conftest.py
+"""Shared fixtures: a throwaway SQLite database and the app driven in-process.
+
+The backend reads its configuration at import time, so the environment is
+set here before anything imports it. Tests are plain functions; coroutines
+run on one session-wide event loop via the `run` fixture, because the
+async engine's pooled connections belong to the loop that opened them.
+"""
+import asyncio
+import os
+import tempfile
+
+import httpx
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="careplus-tests-")
+os.environ["CAREPLUS_DATABASE_URL"] = f"sqlite:///{_tmp}/careplus.db"
+os.environ["CAREPLUS_ARCHIVE_DIR"] = f"{_tmp}/archive"
+os.environ.setdefault("CAREPLUS_CACHE_URL", "memory://")
+os.environ.setdefault("CAREPLUS_BUS_URL", "memory://")
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def client(loop):
+    from backend.main import app
+
+    lifespan = app.router.lifespan_context(app)
+    loop.run_until_complete(lifespan.__aenter__())
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield client
+    loop.run_until_complete(client.aclose())
+    loop.run_until_complete(lifespan.__aexit__(None, None, None))
+
+
+@pytest.fixture
+def run(loop):
+    """run(coro) -> its result, on the session loop."""
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def patient(client, run):
+    """A fresh patient id per test."""
+    response = run(client.post("/patients", json={"name": "Test Patient", "ward": "T"}))
+    response.raise_for_status()
+    return response.json()["id"]
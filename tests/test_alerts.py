@@ -0,0 +1,91 @@
+# tests/test_alerts.py
+from datetime import datetime, timedelta, timezone
+
+from backend.alerts import COOLDOWN, AlertEngine
+
+T0 = datetime(2026, 1, 1, 8, 0)
+
+
+def _types(alerts):
+    return [(a["type"], a["severity"]) for a in alerts]
+
+
+def test_high_after_low_is_not_held_by_the_low_cooldown():
+    engine = AlertEngine()
+    fired = []
+    for i, value in enumerate([50, 60, 200, 320]):
+        fired += engine.reading(1, None, "random", value, T0 + timedelta(milliseconds=18 * i))
+    assert [a["message"] for a in fired] == [
+        "Dangerous glucose 50 mg/dL",
+        "Out-of-range glucose 200 mg/dL",
+        "Dangerous glucose 320 mg/dL",
+    ]
+
+
+def test_same_direction_is_held_until_cooldown_ends():
+    engine = AlertEngine()
+    assert _types(engine.reading(1, None, "random", 60, T0)) == [("reading_range", "medium")]
+    assert engine.reading(1, None, "random", 62, T0 + timedelta(minutes=1)) == []
+    later = T0 + COOLDOWN + timedelta(minutes=1)
+    assert _types(engine.reading(1, None, "random", 61, later)) == [("reading_range", "medium")]
+
+
+def test_higher_severity_breaks_through_cooldown():
+    engine = AlertEngine()
+    engine.reading(1, None, "random", 65, T0)
+    assert _types(engine.reading(1, None, "random", 45, T0 + timedelta(minutes=1))) == [("reading_range", "high")]
+
+
+def test_vitals_cooldown_is_per_direction():
+    engine = AlertEngine()
+    assert engine.heart_rate(1, 45, T0)
+    assert engine.heart_rate(1, 130, T0 + timedelta(minutes=1))
+    assert engine.heart_rate(1, 125, T0 + timedelta(minutes=2)) == []
+    assert engine.blood_pressure(1, 85, 55, T0)
+    assert engine.blood_pressure(1, 150, 95, T0 + timedelta(minutes=1))
+    assert engine.blood_pressure(1, 190, 100, T0 + timedelta(minutes=2))  # crisis escalates
+
+
+def test_rate_of_change_needs_a_minimum_span():
+    engine = AlertEngine()
+    engine.reading(1, None, "random", 100, T0)
+    # 18 ms later: a slope here is noise, not +1000s of mg/dL/min.
+    assert engine.reading(1, None, "random", 109, T0 + timedelta(milliseconds=18)) == []
+    # Two minutes on, the base is still too close.
+    assert engine.reading(1, None, "random", 110, T0 + timedelta(minutes=2)) == []
+
+
+def test_rate_of_change_fires_over_a_real_span():
+    engine = AlertEngine()
+    engine.reading(1, None, "random", 100, T0)
+    alerts = engine.reading(1, None, "random", 140, T0 + timedelta(minutes=10))
+    assert _types(alerts) == [("glucose_rate", "medium")]
+    assert "+4.0 mg/dL/min" in alerts[0]["message"]
+
+
+def test_predicted_hypo_uses_the_same_span_rule():
+    engine = AlertEngine()
+    engine.reading(1, None, "random", 120, T0)
+    assert engine.reading(1, None, "random", 90, T0 + timedelta(seconds=30)) == []
+    engine = AlertEngine()
+    engine.reading(1, None, "random", 120, T0)
+    alerts = engine.reading(1, None, "random", 95, T0 + timedelta(minutes=10))
+    assert ("predicted_hypo", "high") in _types(alerts)
+
+
+def test_back_filled_sample_does_not_rewind_the_cooldown():
+    engine = AlertEngine()
+    late = T0 + 2 * COOLDOWN
+    assert _types(engine.reading(1, None, "random", 60, late)) == [("reading_range", "medium")]
+    assert _types(engine.reading(1, None, "random", 61, T0)) == [("reading_range", "medium")]
+    assert engine.reading(1, None, "random", 62, late + timedelta(minutes=1)) == []
+
+
+def test_aware_timestamps_are_compared_in_utc():
+    engine = AlertEngine()
+    engine.reading(1, None, "random", 120, T0)
+    plus_two = timezone(timedelta(hours=2))
+    fired = engine.reading(1, None, "random", 60, (T0 + timedelta(minutes=5)).replace(tzinfo=timezone.utc)
+                           .astimezone(plus_two))
+    assert fired and {a["timestamp"] for a in fired} == {T0 + timedelta(minutes=5)}
+    assert engine.heart_rate(1, 200, T0.replace(tzinfo=plus_two))[0]["timestamp"] == T0 - timedelta(hours=2)
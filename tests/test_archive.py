@@ -0,0 +1,30 @@
+# tests/test_archive.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from backend import archive, models
+from backend.db import SessionLocal
+
+T0 = datetime(2025, 1, 10, 8, 0)
+
+
+def test_month_rollups_count_rows_kept_in_the_database(client, run, patient, tmp_path):
+    values = [100, 150, 200, 250]
+    response = run(client.post("/readings/batch", json={"readings": [
+        {"patient_id": patient, "value_mgdl": v, "timestamp": (T0 + timedelta(hours=i)).isoformat()}
+        for i, v in enumerate(values)]}))
+    assert response.json()["accepted"] == len(values)
+
+    R = models.GlucoseRollup
+    with SessionLocal() as db:
+        # The newest row holds the table's highest id, so it stays behind.
+        assert archive.archive_patient(db, "readings", patient, datetime(2025, 2, 1), str(tmp_path)) == 3
+        db.commit()
+        left = db.scalar(select(func.count()).where(models.Reading.patient_id == patient))
+        count, total = db.execute(
+            select(func.sum(R.count), func.sum(R.total)).where(R.patient_id == patient, R.granularity == "day")
+        ).one()
+    assert left == 1
+    assert (count, total) == (len(values), sum(values))
+    assert len(archive.load_month("readings", patient, datetime(2025, 1, 1), str(tmp_path))) == 3
@@ -0,0 +1,76 @@
+# tests/test_cache.py
+from starlette.requests import Request
+
+from backend import cache as cache_module
+from backend.cache import MemoryCache, cached, patient_tag
+
+
+def _request(path="/thing"):
+    return Request({"type": "http", "method": "GET", "scheme": "http", "server": ("test", 80),
+                    "path": path, "query_string": b"", "headers": []})
+
+
+def test_get_after_write_sees_the_write(client, run, patient):
+    url = f"/patients/{patient}/readings"
+    first = run(client.get(url))
+    assert first.json() == []
+    etag = first.headers["etag"]
+    assert run(client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+    run(client.post("/readings", json={"patient_id": patient, "value_mgdl": 110})).raise_for_status()
+
+    second = run(client.get(url, headers={"If-None-Match": etag}))
+    assert second.status_code == 200
+    assert [r["value_mgdl"] for r in second.json()] == [110]
+
+
+def test_profile_update_invalidates_profile_and_list(client, run, patient):
+    run(client.get(f"/patients/{patient}"))
+    run(client.get("/patients"))
+    run(client.put(f"/patients/{patient}", json={"name": "Renamed"})).raise_for_status()
+    assert run(client.get(f"/patients/{patient}")).json()["name"] == "Renamed"
+    names = {p["id"]: p["name"] for p in run(client.get("/patients")).json()}
+    assert names[patient] == "Renamed"
+
+
+def test_response_built_across_an_invalidation_is_not_stored(run, monkeypatch):
+    store = MemoryCache()
+    monkeypatch.setattr(cache_module, "cache", store)
+    tag = patient_tag(1, "readings")
+    bodies = iter([b'["old"]', b'["new"]'])
+
+    async def produce():
+        body = next(bodies)
+        if body == b'["old"]':
+            store.invalidate(tag)  # a write commits while this read is running
+        return body, {}
+
+    assert run(cached(_request(), (tag,), produce)).body == b'["old"]'
+    assert store.stats.stale == 1 and len(store) == 0
+    assert run(cached(_request(), (tag,), produce)).body == b'["new"]'
+    assert run(cached(_request(), (tag,), produce)).body == b'["new"]'  # now served from cache
+    assert store.stats.hits == 1
+
+
+def test_callable_tags_are_checked_too(run, monkeypatch):
+    store = MemoryCache()
+    monkeypatch.setattr(cache_module, "cache", store)
+
+    async def produce():
+        store.invalidate("late")
+        return b"{}", {}
+
+    run(cached(_request(), lambda: ("late",), produce))
+    assert len(store) == 0
+
+
+def test_unrelated_invalidation_does_not_block_storing(run, monkeypatch):
+    store = MemoryCache()
+    monkeypatch.setattr(cache_module, "cache", store)
+
+    async def produce():
+        store.invalidate(patient_tag(2))
+        return b"{}", {}
+
+    run(cached(_request(), (patient_tag(1),), produce))
+    assert len(store) == 1
@@ -0,0 +1,48 @@
+# tests/test_dashboard.py
+from backend import dashboard, metrics
+from backend.db import get_db
+
+
+def _add_patient(client, run, n):
+    pid = run(client.post("/patients", json={"name": f"Dash {n}", "ward": "Dash", "cohort": "C"})).json()["id"]
+    for path, body in ((f"/patients/{pid}/medications", {"name": "Insulin", "dosage": "10 u"}),
+                       (f"/patients/{pid}/heartrate", {"bpm": 70 + n}),
+                       (f"/patients/{pid}/bloodpressure", {"systolic": 120, "diastolic": 80})):
+        run(client.post(path, json=body)).raise_for_status()
+    for value in (100, 45 + n):  # the second opens a high alert
+        run(client.post("/readings", json={"patient_id": pid, "value_mgdl": value})).raise_for_status()
+    return pid
+
+
+def _counted(run, **kwargs):
+    async def go():
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        try:
+            async for db in get_db():
+                return await dashboard.ward_dashboard(db, **kwargs), stats.statements
+        finally:
+            metrics.current.reset(token)
+
+    return run(go())
+
+
+def test_query_count_does_not_grow_with_patients(client, run):
+    ids = [_add_patient(client, run, 1)]
+    small, small_queries = _counted(run, ward="Dash")
+    ids += [_add_patient(client, run, n) for n in range(2, 7)]
+    large, large_queries = _counted(run, ward="Dash", cohort="C")
+
+    assert small["count"] == 1 and large["count"] == 6
+    assert small_queries == large_queries == 3
+    first = large["patients"][0]
+    assert first["id"] == ids[0]
+    assert first["latest_reading"]["value_mgdl"] == 46
+    assert first["latest_heart_rate"]["bpm"] == 71
+    assert (first["open_alerts"], first["open_high_alerts"]) == (1, 1)
+    assert [m["name"] for m in first["medications"]] == ["Insulin"]
+
+
+def test_empty_ward_takes_one_query(run):
+    data, queries = _counted(run, ward="Nowhere")
+    assert (data["count"], queries) == (0, 1)
@@ -0,0 +1,61 @@
+# tests/test_history.py
+from datetime import datetime, timedelta
+
+from backend.history import NEXT_CURSOR_HEADER
+
+
+def _load(client, run, patient, n, start=datetime(2026, 1, 1)):
+    # Three readings share every timestamp, so pages must split ties on id.
+    readings = [
+        {"patient_id": patient, "value_mgdl": 100 + i % 50, "timestamp": (start + timedelta(minutes=i // 3)).isoformat()}
+        for i in range(n)
+    ]
+    run(client.post("/readings/batch", json={"readings": readings})).raise_for_status()
+
+
+def _pages(client, run, patient, limit, **params):
+    ids, pages, cursor = [], 0, None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = run(client.get(f"/patients/{patient}/readings", params=query))
+        response.raise_for_status()
+        ids.extend(r["id"] for r in response.json())
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return ids, pages
+
+
+def test_pages_cover_history_without_duplicates_or_gaps(client, run, patient):
+    _load(client, run, patient, 250)
+    everything = run(client.get(f"/patients/{patient}/readings", params={"limit": 1000})).json()
+    assert len(everything) == 250
+
+    ids, pages = _pages(client, run, patient, limit=7)
+    assert ids == [r["id"] for r in everything]
+    assert len(set(ids)) == 250
+    assert pages == 36
+
+
+def test_pages_are_newest_first(client, run, patient):
+    _load(client, run, patient, 40)
+    rows = run(client.get(f"/patients/{patient}/readings", params={"limit": 1000})).json()
+    keys = [(r["timestamp"], r["id"]) for r in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_window_and_cursor_combine(client, run, patient):
+    _load(client, run, patient, 90)  # 30 minutes, three per minute
+    since, until = "2026-01-01T00:10:00", "2026-01-01T00:20:00"
+    ids, _ = _pages(client, run, patient, limit=4, since=since, until=until)
+    rows = run(client.get(f"/patients/{patient}/readings",
+                          params={"limit": 1000, "since": since, "until": until})).json()
+    assert ids == [r["id"] for r in rows]
+    assert len(ids) == len(set(ids)) == 30
+
+
+def test_page_past_the_end_has_no_cursor(client, run, patient):
+    _load(client, run, patient, 5)
+    response = run(client.get(f"/patients/{patient}/readings", params={"limit": 5}))
+    assert len(response.json()) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
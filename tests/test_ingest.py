@@ -0,0 +1,55 @@
+# tests/test_ingest.py
+from backend import ingest
+
+
+def _outcomes(result):
+    return [(r["index"], r["status"], r.get("error")) for r in result["results"]]
+
+
+def test_batch_accepts_good_items_and_rejects_bad_ones(client, run, patient):
+    response = run(client.post("/readings/batch", json={"readings": [
+        {"patient_id": patient, "value_mgdl": 110},
+        {"patient_id": patient},
+        {"patient_id": patient, "value_mgdl": 5000},
+        "120",
+        {"patient_id": 2**31 - 1, "value_mgdl": 120},
+        {"patient_id": patient, "value_mgdl": 45, "context": "fasting"},
+    ]}))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["accepted"], result["rejected"], result["alerts"]) == (2, 4, 1)
+    outcomes = _outcomes(result)
+    assert [o[:2] for o in outcomes] == [
+        (0, "accepted"), (1, "rejected"), (2, "rejected"), (3, "rejected"), (4, "rejected"), (5, "accepted"),
+    ]
+    assert outcomes[1][2].startswith("value_mgdl:")
+    assert outcomes[2][2] == "implausible glucose value 5000.0"
+    assert outcomes[3][2] == "item must be a JSON object"
+    assert outcomes[4][2] == "Patient not found"
+
+    stored = run(client.get(f"/patients/{patient}/readings")).json()
+    assert sorted(r["value_mgdl"] for r in stored) == [45, 110]
+    assert len(run(client.get(f"/patients/{patient}/alerts")).json()) == 1
+
+
+def test_stream_numbers_items_across_chunks(client, run, patient, monkeypatch):
+    monkeypatch.setattr(ingest, "STREAM_CHUNK_SIZE", 2)
+    lines = [
+        f'{{"patient_id": {patient}, "value_mgdl": 100}}',
+        "{not json",
+        "",
+        f'{{"patient_id": {patient}, "value_mgdl": 0}}',
+        f'{{"patient_id": {patient}, "value_mgdl": 101}}',
+        f'{{"patient_id": {patient}, "value_mgdl": 102}}',
+    ]
+    response = run(client.post("/readings/stream", content="\n".join(lines).encode(),
+                               headers={"Content-Type": "application/x-ndjson"}))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (3, 2)
+    outcomes = _outcomes(result)
+    assert [o[:2] for o in outcomes] == [
+        (0, "accepted"), (1, "rejected"), (2, "rejected"), (3, "accepted"), (4, "accepted"),
+    ]
+    assert outcomes[1][2].startswith("invalid JSON")
+    assert len(run(client.get(f"/patients/{patient}/readings")).json()) == 3
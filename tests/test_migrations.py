@@ -0,0 +1,76 @@
+# tests/test_migrations.py
+from sqlalchemy import create_engine, inspect, text
+
+from backend import models
+from backend.migrations import current, head, migrate
+
+# What the app's create_all made before migrations existed.
+BASELINE = """
+CREATE TABLE patients (id INTEGER NOT NULL, name VARCHAR NOT NULL, diabetes_type VARCHAR, date_of_birth DATE,
+    blood_pressure VARCHAR, heart_rate INTEGER, weight FLOAT, target JSON, emergency JSON, PRIMARY KEY (id));
+CREATE INDEX ix_patients_id ON patients (id);
+CREATE TABLE medications (id INTEGER NOT NULL, patient_id INTEGER, name VARCHAR NOT NULL, dosage VARCHAR,
+    frequency VARCHAR, PRIMARY KEY (id), FOREIGN KEY(patient_id) REFERENCES patients (id));
+CREATE INDEX ix_medications_id ON medications (id);
+CREATE TABLE readings (id INTEGER NOT NULL, patient_id INTEGER, timestamp DATETIME, value_mgdl FLOAT,
+    context VARCHAR, notes VARCHAR, PRIMARY KEY (id), FOREIGN KEY(patient_id) REFERENCES patients (id));
+CREATE INDEX ix_readings_id ON readings (id);
+CREATE TABLE alerts (id INTEGER NOT NULL, patient_id INTEGER, timestamp DATETIME, severity VARCHAR, type VARCHAR,
+    message VARCHAR, PRIMARY KEY (id), FOREIGN KEY(patient_id) REFERENCES patients (id));
+CREATE INDEX ix_alerts_id ON alerts (id);
+CREATE TABLE heartrate (id INTEGER NOT NULL, patient_id INTEGER, bpm INTEGER, timestamp DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(patient_id) REFERENCES patients (id));
+CREATE INDEX ix_heartrate_id ON heartrate (id);
+CREATE TABLE bloodpressure (id INTEGER NOT NULL, patient_id INTEGER, systolic INTEGER, diastolic INTEGER,
+    timestamp DATETIME, PRIMARY KEY (id), FOREIGN KEY(patient_id) REFERENCES patients (id));
+CREATE INDEX ix_bloodpressure_id ON bloodpressure (id);
+INSERT INTO patients (id, name) VALUES (1, 'Old Patient');
+INSERT INTO readings (patient_id, timestamp, value_mgdl) VALUES (1, '2024-05-01 08:00:00', 142.0);
+"""
+
+
+def _schema(engine):
+    """{table: (columns, index names, unique constraint names)} as on disk."""
+    insp = inspect(engine)
+    return {
+        name: (
+            {c["name"]: c["nullable"] for c in insp.get_columns(name)},
+            {i["name"] for i in insp.get_indexes(name)},
+            {u["name"] for u in insp.get_unique_constraints(name) if u["name"]},
+        )
+        for name in insp.get_table_names() if name != "schema_version"
+    }
+
+
+def _model_schema():
+    return {
+        t.name: (
+            {c.name: c.nullable for c in t.columns},
+            {i.name for i in t.indexes},
+            {u.name for u in t.constraints if u.__class__.__name__ == "UniqueConstraint" and u.name},
+        )
+        for t in models.Base.metadata.sorted_tables
+    }
+
+
+def test_baseline_database_upgrades_to_the_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/baseline.db")
+    with engine.begin() as conn:
+        for statement in BASELINE.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+    assert current(engine) == 0
+
+    assert migrate(engine) == list(range(1, head() + 1))
+    assert current(engine) == head()
+    assert migrate(engine) == []
+    assert _schema(engine) == _model_schema()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name, ward FROM patients")).all() == [("Old Patient", None)]
+        assert conn.scalar(text("SELECT count(*) FROM readings")) == 1
+
+
+def test_fresh_database_matches_the_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    migrate(engine)
+    assert _schema(engine) == _model_schema()
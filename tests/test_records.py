@@ -0,0 +1,73 @@
+# tests/test_records.py
+import struct
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backend import ingest
+
+TS = datetime(2026, 1, 2, 3, 4, 5, 678000)
+TS_MS = int((TS - datetime(1970, 1, 1)).total_seconds() * 1000)
+HEADERS = {"Content-Type": ingest.RECORDS_MEDIA_TYPE}
+
+
+def _pack(pid, ts_ms, kind, context, v1, v2=0.0, reserved=0):
+    return struct.pack("<IqBBHff", pid, ts_ms, kind, context, reserved, v1, v2)
+
+
+def test_layout_is_24_little_endian_bytes():
+    assert ingest.RECORD.itemsize == 24
+    body = ingest.encode_records([(7, TS_MS, ingest.KIND_GLUCOSE, 2, 123.5, 0.0)])
+    assert body == _pack(7, TS_MS, 0, 2, 123.5)
+    rec = ingest.parse_records(body)[0]
+    assert (rec["patient_id"], rec["ts_ms"], rec["context"], rec["v1"]) == (7, TS_MS, 2, np.float32(123.5))
+
+
+def test_mixed_upload_accepts_valid_records_and_names_each_rejection(client, run, patient):
+    body = b"".join([
+        _pack(patient, TS_MS, ingest.KIND_GLUCOSE, 1, 142.04),
+        _pack(patient, TS_MS, ingest.KIND_HEART_RATE, 0, 71.6),
+        _pack(patient, TS_MS, ingest.KIND_BLOOD_PRESSURE, 0, 121, 79),
+        _pack(patient, TS_MS, 9, 0, 100),
+        _pack(patient, TS_MS, ingest.KIND_GLUCOSE, 0, 100, reserved=1),
+        _pack(patient, -1, ingest.KIND_GLUCOSE, 0, 100),
+        _pack(patient, TS_MS, ingest.KIND_GLUCOSE, 5, 100),
+        _pack(patient, TS_MS, ingest.KIND_GLUCOSE, 0, float("nan")),
+        _pack(patient, TS_MS, ingest.KIND_HEART_RATE, 0, 400),
+        _pack(patient, TS_MS, ingest.KIND_BLOOD_PRESSURE, 0, 80, 120),
+        _pack(2**31, TS_MS, ingest.KIND_GLUCOSE, 0, 100),
+    ])
+    response = run(client.post("/ingest/records", content=body, headers=HEADERS))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (3, 8)
+    assert [(r["index"], r["error"]) for r in result["results"]] == [
+        (3, "unknown kind"),
+        (4, "reserved bytes must be zero"),
+        (5, "timestamp out of range"),
+        (6, "unknown context"),
+        (7, "implausible glucose value"),
+        (8, "implausible heart rate"),
+        (9, "implausible blood pressure"),
+        (10, "Patient not found"),
+    ]
+
+    reading, = run(client.get(f"/patients/{patient}/readings")).json()
+    assert (reading["value_mgdl"], reading["context"], reading["timestamp"]) == (
+        142.0, "fasting", TS.isoformat())
+    hr, = run(client.get(f"/patients/{patient}/heartrate")).json()
+    assert hr["bpm"] == 72
+    bp, = run(client.get(f"/patients/{patient}/bloodpressure")).json()
+    assert (bp["systolic"], bp["diastolic"]) == (121, 79)
+
+
+@pytest.mark.parametrize("body, headers, status", [
+    (b"\0" * 24, {"Content-Type": "application/octet-stream"}, 415),
+    (b"\0" * 25, HEADERS, 400),
+    (b"\0" * 24 * 3, HEADERS, 413),
+])
+def test_rejects_bad_uploads_whole(client, run, monkeypatch, body, headers, status):
+    monkeypatch.setattr(ingest, "MAX_RECORDS", 2)
+    response = run(client.post("/ingest/records", content=body, headers=headers))
+    assert response.status_code == status, response.text
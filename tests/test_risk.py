@@ -0,0 +1,75 @@
+# tests/test_risk.py
+import asyncio
+from datetime import datetime, timedelta
+
+from backend import models, risk
+from backend.db import SessionLocal
+
+
+def _patient_with(client, run, ward, values):
+    pid = run(client.post("/patients", json={"name": "Risk Patient", "ward": ward})).json()["id"]
+    now = datetime.utcnow()
+    response = run(client.post("/readings/batch", json={"readings": [
+        {"patient_id": pid, "value_mgdl": v, "timestamp": (now - timedelta(minutes=30 * i)).isoformat()}
+        for i, v in enumerate(values)]}))
+    assert response.json()["accepted"] == len(values)
+    return pid
+
+
+def _wait_done(client, run, run_id):
+    async def poll():
+        for _ in range(200):
+            body = (await client.get(f"/risk/runs/{run_id}")).json()
+            if body["status"] != "running":
+                return body
+            await asyncio.sleep(0.02)
+        raise AssertionError("risk run did not finish")
+
+    return run(poll())
+
+
+def test_manual_run_scores_and_ranks_patients(client, run):
+    low = _patient_with(client, run, "Risk", [55, 60, 65, 58, 62, 150])
+    steady = _patient_with(client, run, "Risk", [110, 115, 120, 118, 112, 116])
+    quiet = run(client.post("/patients", json={"name": "No Data", "ward": "Risk"})).json()["id"]
+
+    response = run(client.post("/risk/runs"))
+    assert response.status_code == 202, response.text
+    body = _wait_done(client, run, response.json()["id"])
+    assert body["status"] == "done", body
+    assert body["readings"] >= 12
+
+    ranked = run(client.get("/risk/scores", params={"ward": "Risk", "sort": "lbgi"})).json()
+    assert ranked["total"] == 3
+    assert [r["patient_id"] for r in ranked["results"]] == [low, steady, quiet]
+    assert ranked["results"][2]["lbgi"] is None
+
+    by_score = run(client.get("/risk/scores", params={"ward": "Risk"})).json()["results"]
+    assert by_score[0]["patient_id"] == low and by_score[0]["score"] > by_score[1]["score"]
+    assert run(client.get(f"/patients/{steady}/risk")).json()["readings"] == 6
+    assert run(client.get("/risk/scores", params={"sort": "name"})).status_code == 400
+
+
+def test_claim_is_exclusive():
+    now = datetime.utcnow()
+    first = risk.claim(SessionLocal, "nightly", now, nightly_key="2026-01-01")
+    assert first is not None
+    try:
+        assert risk.claim(SessionLocal, "manual", now) is None
+    finally:
+        with SessionLocal() as db:
+            db.get(models.RiskRun, first).status = "done"
+            db.commit()
+    # The night is taken even once its run is over; a manual run is not.
+    assert risk.claim(SessionLocal, "nightly", now, nightly_key="2026-01-01") is None
+    second = risk.claim(SessionLocal, "manual", now)
+    assert second is not None
+    assert risk.compute(SessionLocal, second, now, processes=0)["run_id"] == second
+    # A run left "running" past STALE_AFTER (its worker died) stops blocking.
+    stuck = risk.claim(SessionLocal, "manual", now)
+    later = risk.claim(SessionLocal, "manual", now + risk.STALE_AFTER + timedelta(seconds=1))
+    assert later is not None
+    with SessionLocal() as db:
+        for run_id in (stuck, later):
+            db.get(models.RiskRun, run_id).status = "done"
+        db.commit()
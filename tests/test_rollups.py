@@ -0,0 +1,39 @@
+# tests/test_rollups.py
+from datetime import datetime, timedelta
+
+from backend import archive
+from backend.db import SessionLocal
+
+VALUES = [40, 52, 65, 80, 100, 120, 150, 179, 180, 181, 220, 251, 320]
+
+
+def _summary(client, run, patient, source):
+    response = run(client.get(f"/patients/{patient}/glucose/summary", params={"window": "14d", "source": source}))
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body.pop("source") == source
+    for key in ("start", "end"):
+        body.pop(key)
+    return body
+
+
+def test_rollup_summary_matches_raw_readings(client, run, patient):
+    now = datetime.utcnow()
+    first = now - timedelta(days=10)
+    readings = [
+        {"patient_id": patient, "value_mgdl": v, "timestamp": (first + timedelta(hours=5 * i)).isoformat()}
+        for i, v in enumerate(VALUES * 3)
+    ]
+    assert run(client.post("/readings/batch", json={"readings": readings})).json()["accepted"] == len(readings)
+    run(client.post("/readings", json={"patient_id": patient, "value_mgdl": 135})).raise_for_status()
+
+    rollup = _summary(client, run, patient, "rollup")
+    assert rollup["readings"] == len(readings) + 1
+    assert rollup == _summary(client, run, patient, "raw")
+
+    # Moving the older half to the archive keeps both sides in step.
+    with SessionLocal() as db:
+        assert archive.archive_patient(db, "readings", patient, now - timedelta(days=5)) > 0
+        db.commit()
+    assert _summary(client, run, patient, "rollup") == rollup
+    assert _summary(client, run, patient, "raw") == rollup
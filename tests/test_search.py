@@ -0,0 +1,51 @@
+# tests/test_search.py
+import pytest
+
+
+@pytest.fixture(scope="module")
+def people(client, loop):
+    def create(**body):
+        response = loop.run_until_complete(client.post("/patients", json=body))
+        response.raise_for_status()
+        return response.json()["id"]
+
+    exact = create(name="Zephyr Quintanilla", diabetes_type="T1D", date_of_birth="1950-01-01")
+    prefix = create(name="Zephyrine Quintero", diabetes_type="T2D", date_of_birth="2000-01-01")
+    typo = create(name="Zefyr Quist")
+    # A dangerous reading opens a high-severity alert.
+    loop.run_until_complete(client.post("/readings", json={"patient_id": typo, "value_mgdl": 40})).raise_for_status()
+    return exact, prefix, typo
+
+
+def _ids(client, run, **params):
+    response = run(client.get("/patients/search", params=params))
+    assert response.status_code == 200, response.text
+    return [r["id"] for r in response.json()["results"]]
+
+
+def test_exact_beats_prefix_beats_typo(client, run, people):
+    exact, prefix, typo = people
+    assert _ids(client, run, q="zephyr") == [exact, prefix, typo]
+    assert _ids(client, run, q="ZÉPHYR quintanila") == [exact]
+    assert _ids(client, run, q="zephyrine quint") == [prefix]
+    assert _ids(client, run, q="zephyr", limit=1, offset=1) == [prefix]
+
+
+def test_filters(client, run, people):
+    exact, prefix, typo = people
+    assert _ids(client, run, q="zephyr", diabetes_type="T1D") == [exact]
+    assert _ids(client, run, q="zephyr", age_min=60) == [exact]
+    assert _ids(client, run, q="zephyr", age_max=40) == [prefix]
+    assert _ids(client, run, q="zephyr", alerts="high") == [typo]
+    assert _ids(client, run, q="zephyr", alerts="none") == [exact, prefix]
+
+
+def test_index_follows_updates_and_deletes(client, run, people):
+    exact, prefix, typo = people
+    patient = run(client.post("/patients", json={"name": "Xanthe Vale"})).json()
+    assert _ids(client, run, q="xanthe") == [patient["id"]]
+    run(client.put(f"/patients/{patient['id']}", json={**patient, "name": "Xenia Vale"})).raise_for_status()
+    assert _ids(client, run, q="xanthe") == []
+    assert _ids(client, run, q="xenia") == [patient["id"]]
+    run(client.delete(f"/patients/{patient['id']}")).raise_for_status()
+    assert _ids(client, run, q="vale") == []
@@ -0,0 +1,61 @@
+# tests/test_serialization.py
+import json
+from datetime import date, datetime
+
+import pytest
+
+from backend import serialization
+from backend.serialization import encode_rows
+
+NAMES = ("id", "timestamp", "value_mgdl", "context", "notes")
+ROWS = [
+    (1, datetime(2026, 1, 1, 8, 0), 101.5, "fasting", None),
+    (2, datetime(2026, 1, 1, 8, 5, 0, 250000), 99.0, "random", "after walk"),
+    (3, datetime(2026, 1, 1, 8, 10), None, "random", None),
+]
+
+
+def _from_columnar(body: bytes) -> list:
+    data = json.loads(body)
+    columns = [data[n] for n in NAMES]
+    assert all(len(c) == data["count"] for c in columns)
+    return [dict(zip(NAMES, values)) for values in zip(*columns)]
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+
+
+def test_columnar_round_trips_to_rows(encoder):
+    rows = json.loads(encode_rows(NAMES, ROWS))
+    assert rows[1] == {"id": 2, "timestamp": "2026-01-01T08:05:00.250000", "value_mgdl": 99.0,
+                       "context": "random", "notes": "after walk"}
+    assert _from_columnar(encode_rows(NAMES, ROWS, "columnar")) == rows
+
+
+def test_empty_columnar_keeps_every_column(encoder):
+    assert json.loads(encode_rows(NAMES, [], "columnar")) == {"count": 0, **{n: [] for n in NAMES}}
+
+
+def test_encoders_agree(monkeypatch):
+    value = {"d": date(2026, 1, 1), "t": datetime(2026, 1, 1, 8, 0, 0, 1), "n": None, "f": 1.5}
+    fast = serialization.dumps(value)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(fast) == json.loads(serialization.dumps(value))
+
+
+def test_history_endpoint_formats_match(client, run, patient):
+    for value in (110, 120, 130):
+        run(client.post("/readings", json={"patient_id": patient, "value_mgdl": value})).raise_for_status()
+    url = f"/patients/{patient}/readings"
+    rows = run(client.get(url)).json()
+    columnar = run(client.get(url, params={"format": "columnar"}))
+    assert columnar.status_code == 200
+    data = columnar.json()
+    assert data["count"] == 3
+    assert [dict(zip(rows[0], values)) for values in zip(*(data[k] for k in rows[0]))] == rows
+    assert run(client.get(url, params={"format": "csv"})).status_code == 422
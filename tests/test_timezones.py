@@ -0,0 +1,64 @@
+# tests/test_timezones.py
+from datetime import datetime, timedelta, timezone
+
+from backend.timeutil import to_utc
+
+
+def test_to_utc():
+    assert to_utc(None) is None
+    naive = datetime(2026, 1, 1, 12)
+    assert to_utc(naive) is naive
+    assert to_utc(datetime(2026, 1, 1, 14, tzinfo=timezone(timedelta(hours=2)))) == naive
+    assert to_utc(datetime(2026, 1, 1, 7), timezone(timedelta(hours=-5))) == naive
+
+
+def test_series_accepts_aware_bounds(client, run, patient):
+    run(client.post("/readings", json={"patient_id": patient, "value_mgdl": 120})).raise_for_status()
+    now = datetime.now(timezone.utc)
+    for params in ({"since": "2026-01-01T00:00:00+00:00"},
+                   {"since": (now - timedelta(days=1)).isoformat(), "until": (now + timedelta(hours=1)).isoformat()}):
+        response = run(client.get(f"/patients/{patient}/series/readings", params=params))
+        assert response.status_code == 200, response.text
+    assert response.json()["raw_count"] == 1
+
+
+def test_schedules_and_doses_accept_aware_datetimes(client, run, patient):
+    med = run(client.post(f"/patients/{patient}/medications",
+                          json={"name": "Metformin", "dosage": "500 mg", "frequency": "8-hourly"})).json()
+    for start_at in ("2026-01-01T00:00:00+00:00", "2099-01-01T08:00:00+02:00"):
+        response = run(client.post(f"/medications/{med['id']}/schedules",
+                                   json={"every_hours": 8, "start_at": start_at}))
+        assert response.status_code == 200, response.text
+    assert response.json()["start_at"] == "2099-01-01T06:00:00"
+
+    now = datetime.now(timezone.utc)
+    response = run(client.get(f"/patients/{patient}/doses", params={
+        "since": (now - timedelta(hours=12)).isoformat(), "until": (now + timedelta(hours=12)).isoformat()}))
+    assert response.status_code == 200, response.text
+    dose = next(d for d in response.json() if d["id"] is not None)
+
+    taken_at = datetime.fromisoformat(dose["scheduled_at"]).replace(tzinfo=timezone.utc).astimezone(
+        timezone(timedelta(hours=3)))
+    response = run(client.post(f"/doses/{dose['id']}", json={"status": "taken", "taken_at": taken_at.isoformat()}))
+    assert response.status_code == 200, response.text
+    assert response.json()["taken_at"] == dose["scheduled_at"]
+
+
+def test_readings_accept_aware_timestamps(client, run, patient):
+    run(client.post("/readings", json={"patient_id": patient, "value_mgdl": 120,
+                                       "timestamp": "2026-01-01T10:00:00"})).raise_for_status()
+    # Aware after naive used to reach the alert engine unconverted and 500.
+    response = run(client.post("/readings", json={"patient_id": patient, "value_mgdl": 130,
+                                                  "timestamp": "2026-01-01T12:00:00+02:00"}))
+    assert response.status_code == 200, response.text
+    assert response.json()["timestamp"] == "2026-01-01T10:00:00"
+
+    response = run(client.post("/readings/batch", json={"readings": [
+        {"patient_id": patient, "value_mgdl": 140, "timestamp": "2026-01-01T06:30:00-05:00"}]}))
+    assert response.status_code == 200, response.text
+    assert response.json()["accepted"] == 1
+
+    response = run(client.get(f"/patients/{patient}/readings", params={
+        "since": "2026-01-01T11:15:00+01:00", "until": "2026-01-01T13:00:00+01:00"}))
+    assert response.status_code == 200, response.text
+    assert [r["timestamp"] for r in response.json()] == ["2026-01-01T11:30:00"]
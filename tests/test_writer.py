@@ -0,0 +1,85 @@
+# tests/test_writer.py
+import asyncio
+import threading
+
+import pytest
+
+from backend import writer
+
+
+def _submit(q, n):
+    return [asyncio.ensure_future(q.submit("reading", {"patient_id": 1, "value_mgdl": 100.0}, [], None))
+            for _ in range(n)]
+
+
+def test_stop_fails_queued_samples_and_waits_for_the_running_write(run, monkeypatch):
+    release = threading.Event()
+    written = []
+    monkeypatch.setattr(writer, "_write", lambda items: release.wait(5) and written.extend(items))
+
+    async def scenario():
+        q = writer.WriteBehindQueue(durability="committed", flush_ms=1, batch_rows=2)
+        q.start()
+        pending = _submit(q, 5)
+        await asyncio.sleep(0.05)  # first batch is now stuck in _write
+        stopping = asyncio.ensure_future(q.stop(timeout=0.1))
+        await asyncio.sleep(0.2)
+        # The queued samples fail as soon as the drain gives up...
+        assert [p.done() for p in pending] == [False, False, True, True, True]
+        assert not stopping.done()
+        # ...but the running write is waited for, not abandoned.
+        release.set()
+        await asyncio.wait_for(stopping, 2)
+        return q, await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), 2)
+
+    q, results = run(scenario())
+    assert len(written) == 2
+    assert [q.status(i) for i in results[:2]] == ["committed", "committed"]
+    assert all(isinstance(r, writer.WriteFailed) for r in results[2:])
+    assert q.queue.empty()
+
+
+def test_stop_drains_when_it_can(run, monkeypatch):
+    written = []
+    monkeypatch.setattr(writer, "_write", lambda items: written.extend(items))
+
+    async def scenario():
+        q = writer.WriteBehindQueue(durability="committed", flush_ms=1, batch_rows=3)
+        q.start()
+        pending = _submit(q, 7)
+        await asyncio.sleep(0)
+        await q.stop(timeout=2)
+        return q, await asyncio.gather(*pending)
+
+    q, ids = run(scenario())
+    assert len(written) == 7
+    assert all(q.status(i) == "committed" for i in ids)
+
+
+def test_failed_insert_raises_write_failed(run, monkeypatch):
+    def boom(items):
+        raise RuntimeError("patient is gone")
+
+    monkeypatch.setattr(writer, "_write", boom)
+
+    async def scenario():
+        q = writer.WriteBehindQueue(durability="committed", flush_ms=1)
+        q.start()
+        try:
+            with pytest.raises(writer.WriteFailed, match="patient is gone"):
+                await q.submit("reading", {"patient_id": 1, "value_mgdl": 100.0}, [], None)
+        finally:
+            await q.stop(timeout=1)
+
+    run(scenario())
+
+
+def test_stopped_queue_refuses_new_samples(run):
+    async def scenario():
+        q = writer.WriteBehindQueue()
+        q.start()
+        await q.stop(timeout=1)
+        with pytest.raises(writer.QueueFull):
+            await q.submit("reading", {"patient_id": 1}, [], None)
+
+    run(scenario())